@@ -0,0 +1,50 @@
+"""
+    Compare the indexed service resolution with the linear scan on a large synthetic catalog.
+
+    Run from the root directory: python benchmarks/characteristics_benchmark.py
+"""
+import sys
+import os
+import random
+import timeit
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from camp2docker.config import Config, ServiceConfig, NoServiceException
+from camp2docker.plan import CharacteristicSpecification
+
+def synthetic_services(number):
+    services = []
+    for i in range(number):
+        characteristics = [{'characteristic_type': 'Type{0}'.format(t), 'version': str(i % 5)} for t in range(i % 7, i % 7 + 6)]
+        characteristics.append({'characteristic_type': 'Service{0}'.format(i)})
+        services.append(ServiceConfig('service{0}'.format(i), 'Service {0}'.format(i), 'base{0}'.format(i), characteristics))
+    return services
+
+def synthetic_requirements(number, services):
+    random.seed(42)
+    requirements = []
+    for _ in range(number):
+        i = random.randrange(services)
+        requirements.append([
+            CharacteristicSpecification(**{'characteristic_type': 'Type{0}'.format(i % 7 + 2), 'version': str(i % 5)}),
+            CharacteristicSpecification(characteristic_type='Service{0}'.format(i))
+        ])
+    return requirements
+
+def resolve(find, requirements):
+    services = []
+    for characteristics in requirements:
+        try:
+            services.append(find(characteristics))
+        except NoServiceException:
+            services.append(None)
+    return services
+
+if __name__ == "__main__":
+    for services_number in (100, 500, 2000):
+        config = Config('config', synthetic_services(services_number), [])
+        requirements = synthetic_requirements(50, services_number)
+        assert resolve(config._scan_service_by_characteristics, requirements) == resolve(config.find_service_by_characteristics, requirements)
+        scan = min(timeit.repeat(lambda: resolve(config._scan_service_by_characteristics, requirements), number=1, repeat=3))
+        indexed = min(timeit.repeat(lambda: resolve(config.find_service_by_characteristics, requirements), number=1, repeat=3))
+        print "{0:5d} services, {1} requirements: scan {2:.4f}s, index {3:.4f}s ({4:.0f}x)".format(services_number, len(requirements), scan, indexed, scan / indexed)
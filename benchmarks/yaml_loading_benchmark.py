@@ -0,0 +1,75 @@
+"""
+    Compare the YAML backends on a generated configuration tree.
+
+    Run from the root directory: python benchmarks/yaml_loading_benchmark.py [number of files]
+"""
+import sys
+import os
+import shutil
+import tempfile
+import time
+import multiprocessing
+import yaml
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from camp2docker import utils
+from camp2docker.config import Config
+
+SERVICE = """-
+  name: service{i}
+  description: generated service {i}
+  base: base{i}
+  characteristics:
+    -
+      characteristic_type: Type{i}
+      Type:version: latest
+    -
+      characteristic_type: Database
+"""
+
+ARTIFACT = """-
+  name: Artifact{i}
+  default_requirement: Run
+  requirements:
+    -
+      requirement_type: Run
+      parameters: {{ Port: integer }}
+      default_service: service{i}
+      actions:
+        -
+          service: service{i}
+          instructions:
+            - target: .
+              do:
+                - ["ADD", "{{{{artifact}}}} /src/app/"]
+                - ["RUN", "make install"]
+                - ["EXPOSE", "{{{{Port}}}}", true]
+"""
+
+def generate_tree(path, number):
+    for directory, template in (('services', SERVICE), ('artifacts', ARTIFACT)):
+        os.makedirs(os.path.join(path, directory))
+        for i in range(number):
+            with open(os.path.join(path, directory, '{0:05d}.yaml'.format(i)), 'w') as f:
+                f.write(template.format(i=i))
+
+def measure(loader, threshold, path):
+    utils.YamlLoader = loader
+    utils.PARALLEL_LOADING_THRESHOLD = threshold
+    start = time.time()
+    Config.from_path(path, use_cache=False)
+    return time.time() - start
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    path = tempfile.mkdtemp()
+    try:
+        generate_tree(path, number)
+        print "{0} processors".format(multiprocessing.cpu_count())
+        backends = [('pure Python', yaml.SafeLoader, sys.maxint), ('pure Python, process pool', yaml.SafeLoader, 1)]
+        if getattr(yaml, '__with_libyaml__', False):
+            backends += [('libyaml', yaml.CSafeLoader, sys.maxint), ('libyaml, process pool', yaml.CSafeLoader, 1)]
+        for name, loader, threshold in backends:
+            print "{0:>26}: {1:.3f}s for {2} files".format(name, measure(loader, threshold, path), 2 * number)
+    finally:
+        shutil.rmtree(path)
@@ -2,20 +2,38 @@ from output import Container
 from config import Config
 from plan import Plan
 from fig.project import Project
+from manifest import GenerationManifest
+from hashindex import HashIndex, INDEX_FILENAME, tree_files
+from layers import LayerCount, optimize_instructions
+from dockerignore import ContextFilter, ContextSize, DOCKERIGNORE_FILENAME
+from context import build_streamed, build_image, inspect_image, image_labels, supports_labels, BUILD_KEY_LABEL, BASE_ID_LABEL
+from pull import Puller
+from orchestrate import Orchestrator
+from baseimages import BaseImagePlanner, BASES_SCRIPT_FILENAME, bases_script
+from StringIO import StringIO
+import hashlib
 import os
 import utils
-import shutil
-import errno
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
 
 class LinkException(Exception):
     pass
 
 class PlanProcessor(object):
     def __init__(self, plan, config='config'):
+        """
+            config is either a Config or the path of the configuration directory
+        """
         self.plan = plan
-        self.config = Config.from_path(config)
+        self.config = config if isinstance(config, Config) else Config.from_path(config, lazy=True)
         self.assembly = Assembly(plan)
-        self._temp_artifact_components = set()
+        self._temp_artifact_components = OrderedDict()
+        self._temp_components_by_service = {}
         self._temp_actions = []
 
     def process_plan(self):
@@ -25,6 +43,7 @@ class PlanProcessor(object):
         for artifact in self.plan.artifacts:
             artifact_config = self.config.find_artifact_config_by_type(artifact.artifact_type)
             self._temp_artifact_components.clear()
+            self._temp_components_by_service.clear()
             del self._temp_actions[:]
             if hasattr(artifact, 'requirements'):
                 for requirement in artifact.requirements:
@@ -36,8 +55,8 @@ class PlanProcessor(object):
                     else:
                         service = self.config.find_service_by_name(requirement_config.default_service)
                     component = self.assembly.add_component(service_specification, service)
-                    component.artifacts.add(artifact.content)
-                    self._temp_artifact_components.add(component)
+                    component.add_artifact(artifact.content, artifact_config.ignore, artifact_config.dependencies, artifact_config.install)
+                    self._add_temp_component(component)
                     action = requirement_config.find_action_by_service_name(service.name)
                     parameters = utils.mustach_dict(requirement.parameters)
                     parameters.update({'artifact': str(artifact.content)})
@@ -46,21 +65,25 @@ class PlanProcessor(object):
                 requirement_config = artifact_config.get_default_requirement()
                 service = self.config.find_service_by_name(requirement_config.default_service)
                 component = self.assembly.add_component(None, service)
-                component.artifacts.add(artifact.content)
-                self._temp_artifact_components.add(component)
+                component.add_artifact(artifact.content, artifact_config.ignore, artifact_config.dependencies, artifact_config.install)
+                self._add_temp_component(component)
                 action = requirement_config.find_action_by_service_name(service.name)
                 parameters = {'artifact': str(artifact.content)}
                 self._temp_actions.append({'action_config': action, 'parameters': parameters, 'component': component})
             self._process_actions()
 
+        self.assembly.changed()
         return self.assembly
 
+    def _add_temp_component(self, component):
+        self._temp_artifact_components[component] = True
+        self._temp_components_by_service.setdefault(component.service_config.name, component)
+
     def _find_component_in_temp(self, specification):
         if specification.has_key('service'):
-            for c in self._temp_artifact_components:
-                if c.service_config.name == specification["service"]:
-                    return c
-            else:
+            try:
+                return self._temp_components_by_service[specification["service"]]
+            except KeyError:
                 raise LinkException("Can't find service {service}".format(service=specification["service"]))
 
     
@@ -78,10 +101,10 @@ class PlanProcessor(object):
         for action in self._temp_actions:
             for instruction_list in action["action_config"].instructions:
                 if instruction_list.target == ".":
-                    action["component"].container.process_instructions(instruction_list.do, action["parameters"], action["component"].container)
+                    action["component"].container.process_instructions(instruction_list.program, action["parameters"], action["component"].container)
                 else:
                     c = self._find_component_in_temp(instruction_list.target)
-                    c.container.process_instructions(instruction_list.do, action["parameters"], action["component"].container)
+                    c.container.process_instructions(instruction_list.program, action["parameters"], action["component"].container)
         self._resolve_links()
 
 class Component(object):
@@ -96,8 +119,80 @@ class Component(object):
             self.artifacts = set(artifacts)
         else:
             self.artifacts = set()
+        self.ignore = set()
+        self.dependencies = {}
+        self.installs = {}
         self.related_components = set()
 
+    def add_artifact(self, content, ignore=(), dependencies=(), install=()):
+        """
+            Add an artifact, with the ignore rules and dependency files of its type, relative
+            to the artifact directory, and the commands installing its dependencies
+        """
+        self.artifacts.add(content)
+        self.ignore.update('/'.join([content.href.rstrip('/'), pattern]) for pattern in ignore)
+        if dependencies:
+            self.dependencies[os.path.normpath(content.href)] = list(dependencies)
+        if install:
+            self.installs[os.path.normpath(content.href)] = list(install)
+
+    def dependency_files(self, plan_directory):
+        """
+            The dependency files of the artifacts which exist, by artifact path
+        """
+        files = {}
+        for href, dependencies in self.dependencies.items():
+            existing = [d for d in dependencies if os.path.isfile(os.path.join(plan_directory, href, d))]
+            if existing:
+                files[href] = existing
+        return files
+
+    def context_files(self, plan_directory):
+        """
+            (name in the build context, artifact file) of all the artifacts files
+        """
+        files = []
+        for href in sorted(artifact.href for artifact in self.artifacts):
+            source = os.path.join(plan_directory, href)
+            if os.path.isdir(source):
+                files.extend((os.path.join(href, f), os.path.join(source, f)) for f in tree_files(source))
+            else:
+                files.append((os.path.basename(href), source))
+        return files
+
+    @property
+    def context_filter(self):
+        return ContextFilter.from_component(self)
+
+    def artifacts_digest(self, plan_directory, hash_index):
+        """
+            Digest of the content of all the artifacts of the component
+        """
+        sha = hashlib.sha1()
+        for href in sorted(artifact.href for artifact in self.artifacts):
+            sha.update("{href}\0{digest}\n".format(href=href, digest=hash_index.tree_digest(os.path.join(plan_directory, href))))
+        return sha.hexdigest()
+
+    def context_digest(self, plan_directory, hash_index):
+        """
+            Digest of the artifacts files in the build context of the component
+        """
+        files = self.context_filter.filter(self.context_files(plan_directory))
+        sha = hashlib.sha1()
+        for (name, source), digest in zip(files, hash_index.files_digests([source for name, source in files])):
+            sha.update("{name}\0{digest}\n".format(name=name, digest=digest))
+        return sha.hexdigest()
+
+    def build_key(self, plan_directory, hash_index, base_id):
+        """
+            Digest of what the image of the component is built from: the instructions of its
+            Dockerfile, the id of its base image and the artifacts files it adds
+        """
+        sha = hashlib.sha1()
+        sha.update(self.container.dockerfile)
+        sha.update("\0{base}\0{context}".format(base=base_id, context=self.context_digest(plan_directory, hash_index)))
+        return sha.hexdigest()
+
     @property
     def service_dict(self):
         service = {'name': self.container.name }
@@ -133,7 +228,21 @@ class Assembly(object):
     """
     def __init__(self, plan):
         self.plan = plan
-        self.components = set()
+        self.components = []
+        self._components_by_specification = {}
+        self.shared_bases = []
+        # incremented by changed, invalidating what is computed from the components
+        self.revision = 0
+        self._service_dicts = None
+        self._project = None
+
+    def changed(self):
+        """
+            To call after changing the components or their containers
+        """
+        self.revision += 1
+        self._service_dicts = None
+        self._project = None
 
     @classmethod
     def from_plan(cls, planfile, config='config'):
@@ -145,13 +254,15 @@ class Assembly(object):
         component = None if service_specification is None else self.search_component(service_specification)
         if component is None:
             component = Component(service_specification, service_config, container, artifact)
-            self.components.add(component)
+            self.components.append(component)
+            if service_specification is not None:
+                self._components_by_specification[service_specification] = component
+            self.changed()
         return component
 
     def search_component(self, service_specification):
-        for component in self.components:
-            if component.service_specification is service_specification:
-                return component
+        return self._components_by_specification.get(service_specification)
+
     def to_fig(self):
         rep = ""
         for c in self.components:
@@ -173,54 +284,213 @@ class Assembly(object):
     
     @property
     def to_service_dicts(self):
-        service_dicts = []
+        if self._service_dicts is None:
+            service_dicts = []
+            for c in self.components:
+                service_dicts.append(c.service_dict)
+            self._service_dicts = service_dicts
+        return self._service_dicts
+
+    def image_name(self, component):
+        """
+            Name of the image fig builds for a component
+        """
+        return '{project}_{name}'.format(project=self.plan.name, name=component.container.name)
+
+    def image_build_key(self, client, component, plan_directory, hash_index, pull=True):
+        """
+            The build key of the image of a component, and whether its image is labelled with it.
+            A missing base image is pulled first, unless not pull, so that the key has its id
+        """
+        base = inspect_image(client, component.container.base)
+        if base is None and pull:
+            Puller(client).pull(component.container.base)
+            base = inspect_image(client, component.container.base)
+        key = component.build_key(plan_directory, hash_index, base['Id'] if base is not None else component.container.base)
+        image = inspect_image(client, self.image_name(component))
+        return key, image is not None and image_labels(image).get(BUILD_KEY_LABEL) == key
+
+    def _build_component(self, client, component, plan_directory, hash_index, force, output, build_keys):
+        labels = None
+        if build_keys:
+            key, up_to_date = self.image_build_key(client, component, plan_directory, hash_index)
+            if not force and up_to_date:
+                log.info("%s is up to date", component.container.name)
+                return False
+            labels = {BUILD_KEY_LABEL: key}
+        files = component.context_files(plan_directory)
+        log.info("Building %s, build context: %s", component.container.name, ContextSize(files, component.context_filter.filter(files)))
+        build_streamed(client, component, plan_directory, self.image_name(component), output, labels=labels)
+        return True
+
+    def build(self, client, plan_directory, hash_index=None, force=False, workers=1, output=sys.stdout, build_keys=None):
+        """
+            Build the images of the components from their build contexts streamed to the Docker
+            daemon, without writing the component directories; fig then uses these images.
+            With build_keys, by default when the Docker daemon supports labels, the images are
+            labelled with the build key of their component, and a component whose image has
+            the same key is not built again unless force.
+            The artifacts are hashed with hash_index, by default the HashIndex of the plan
+            directory.
+            Up to workers images are built at the same time, the output of each build being
+            written once it is done. Return the names of the built components
+        """
+        if hash_index is None:
+            hash_index = HashIndex(os.path.join(plan_directory, INDEX_FILENAME))
+        if build_keys is None:
+            build_keys = supports_labels(client)
+            if not build_keys:
+                log.warning("The Docker daemon can't label images (Docker 1.6 needed), all the images are built")
+        self.build_shared_bases(client, output, build_keys)
+        components = [c for c in self.components if c.container.needs_build]
+        output_lock = threading.Lock()
+
+        def build(component):
+            if workers <= 1:
+                return self._build_component(client, component, plan_directory, hash_index, force, output, build_keys)
+            buffer = StringIO()
+            try:
+                return self._build_component(client, component, plan_directory, hash_index, force, buffer, build_keys)
+            finally:
+                with output_lock:
+                    output.write(buffer.getvalue())
+
+        built = utils.thread_map(build, components, workers)
+        hash_index.save()
+        return [c.container.name for c, was_built in zip(components, built) if was_built]
+
+    def optimize_layers(self, plan_directory):
+        """
+            Rewrite the Dockerfiles of the components to create fewer layers, and to build the
+            dependencies of the artifacts, with their install commands, before adding the rest of them.
+            Return the LayerCount of each component before and after
+        """
+        counts = OrderedDict()
         for c in self.components:
-            service_dicts.append(c.service_dict)
-        return service_dicts
+            dependencies = c.dependency_files(plan_directory)
+            before = LayerCount(c.container)
+            c.container.instructions = optimize_instructions(c.container.instructions, dependencies, c.installs)
+            counts[c.container.name] = (before, LayerCount(c.container, dependencies))
+            log.info("%s: %s -> %s", c.container.name, *counts[c.container.name])
+        self.changed()
+        return counts
+
+    def share_base_images(self, planner=None):
+        """
+            Move the first instructions that containers built on the same base have in common
+            to shared base images, and make the containers start FROM them.
+            The prefixes are counted by the BaseImagePlanner planner, by default one counting
+            the containers of this assembly. Return the SharedBase list
+        """
+        containers = [c.container for c in self.components if c.container.needs_build]
+        if planner is None:
+            planner = BaseImagePlanner()
+            for container in containers:
+                planner.add_container(container)
+        shared_bases = OrderedDict()
+        for container in containers:
+            shared = planner.rewrite(container)
+            if shared is not None:
+                shared_bases[shared] = True
+                log.info("%s: FROM %s", container.name, shared)
+        self.shared_bases = list(shared_bases)
+        self.changed()
+        return self.shared_bases
+
+    def build_shared_bases(self, client, output=sys.stdout, labels=None):
+        """
+            Build the shared base images which don't exist yet. With labels, by default when
+            the Docker daemon supports them, the images are labelled with the id of their base
+            image, and rebuilt once it is updated
+        """
+        if labels is None:
+            labels = supports_labels(client)
+        for shared in self.shared_bases:
+            image = inspect_image(client, shared.name)
+            dockerfile = shared.dockerfile
+            if labels:
+                base = inspect_image(client, shared.base)
+                base_id = base['Id'] if base is not None else shared.base
+                if image is not None and image_labels(image).get(BASE_ID_LABEL) == base_id:
+                    continue
+                dockerfile += 'LABEL {label}="{value}"\n'.format(label=BASE_ID_LABEL, value=base_id)
+            elif image is not None:
+                continue
+            log.info("Building %s...", shared.name)
+            build_image(client, shared.name, output, fileobj=StringIO(dockerfile), tag=shared.name)
 
     def to_fig_project(self, client):
-        return Project.from_dicts(self.plan.name, self.to_service_dicts, client)
+        """
+            The fig project of the assembly, kept for the same client until the assembly changes
+        """
+        if self._project is None or self._project.client is not client:
+            self._project = Project.from_dicts(self.plan.name, self.to_service_dicts, client)
+        return self._project
     
     def run(self, client):
-        self.to_fig_project(client).up()
+        Orchestrator(self, client).up()
 
     def stop(self, client):
-        self.to_fig_project(client).stop()
+        Orchestrator(self, client).stop()
 
     def start(self, client):
-        self.to_fig_project(client).start()
+        Orchestrator(self, client).start()
 
     def rm(self, client):
-        self.to_fig_project(client).remove_stopped()
+        Orchestrator(self, client).rm()
 
-    def generate_files(self, plan_directory, output_directory):
+    def generate_files(self, plan_directory, output_directory, materializer=None, store=None, hash_index=None):
+        """
+            Write the fig file, a directory per shared base image with its Dockerfile and
+            the script building them before fig up, and a directory per component with its Dockerfile and artifacts
+            put in place by the materializer (a Materializer with the default strategy if None),
+            or linked from the ArtifactStore store.
+            Artifacts are hashed with hash_index, by default the HashIndex of the output directory.
+            Only the artifacts files the Dockerfile adds, minus the ignore rules of the artifacts
+            types, are put in a component directory, with a .dockerignore excluding the others.
+            Only the files whose content changed since the previous generation are written,
+            and what is not generated anymore is removed. Return the GenerationReport
+        """
         dir = os.path.join(output_directory, self.plan.name)
         try:
             os.mkdir(dir)
         except OSError:
             if not os.path.isdir(dir):
                 raise
-        with open(os.path.join(dir, 'fig.yml'), 'w') as fig:
-            fig.write(self.to_fig())
+        if hash_index is None:
+            hash_index = HashIndex(os.path.join(output_directory, INDEX_FILENAME))
+        manifest = GenerationManifest.load(dir, materializer, store, hash_index)
+        manifest.write_file('fig.yml', self.to_fig())
 
+        for shared in self.shared_bases:
+            manifest.write_file(os.path.join(shared.name, 'Dockerfile'), shared.dockerfile)
+        if self.shared_bases:
+            manifest.write_file(BASES_SCRIPT_FILENAME, bases_script(self.shared_bases))
+        contexts = OrderedDict()
         for c in self.components:
-            dirname = os.path.join(dir, c.container.name)
-            try:
-                os.mkdir(dirname)
-            except OSError:
-                if not os.path.isdir(dirname):
-                    raise
-            with open(os.path.join(dirname, 'Dockerfile'), 'w') as Dockerfile:
-                Dockerfile.write(str(c.container))
-            for artifact in c.artifacts:
-                try :
-                    target = os.path.join(dirname, artifact.href)
-                    if not os.path.exists(target):
-                        shutil.copytree(os.path.join(plan_directory, artifact.href), target)
-                except OSError as e:
-                    if e.errno == errno.ENOTDIR:
-                        shutil.copy(os.path.join(plan_directory, artifact.href), dirname)
-                    else: raise
+            dirname = c.container.name
+            manifest.write_file(os.path.join(dirname, 'Dockerfile'), str(c.container))
+            files = c.context_files(plan_directory)
+            context_filter = c.context_filter
+            kept = context_filter.filter(files)
+            manifest.write_file(os.path.join(dirname, DOCKERIGNORE_FILENAME), context_filter.dockerignore([name for name, f in files]))
+            manifest.copy_files([(source, os.path.join(dirname, name)) for name, source in kept])
+            contexts[dirname] = ContextSize(files, kept)
+
+        report = manifest.finish()
+        report.contexts = contexts
+        hash_index.prune()
+        hash_index.save()
+        log.info("%s: %s", dir, report)
+        for name, size in contexts.items():
+            log.info("%s build context: %s", name, size)
+        for path in report.written:
+            log.debug("Wrote %s", path)
+        for path in report.removed:
+            log.debug("Removed %s", path)
+        if self.shared_bases:
+            log.info("Run sh %s before fig up to build the shared base images", os.path.join(dir, BASES_SCRIPT_FILENAME))
+        return report
 
     def __repr__(self):
         res = "========== DOCKERFILES ==========\n\n" 
@@ -0,0 +1,112 @@
+import hashlib
+from collections import defaultdict
+from output import needs_build
+
+# instructions which don't need the build context and behave the same in a base image
+PREFIX_OPCODES = frozenset(['RUN', 'ENV', 'WORKDIR', 'USER', 'MAINTAINER'])
+BASE_IMAGE_PREFIX = 'camp2docker_base_'
+# generated next to fig.yml, to run before fig up
+BASES_SCRIPT_FILENAME = 'build-bases.sh'
+
+def instruction_prefix(container):
+    """
+        The instructions a container starts with which could go in a base image
+    """
+    prefix = []
+    for instruction in container.instructions:
+        if instruction.opcode not in PREFIX_OPCODES or instruction.flags:
+            break
+        prefix.append(instruction)
+    return tuple(prefix)
+
+def prefix_key(container):
+    return container.base, instruction_prefix(container)
+
+class SharedBase(object):
+    """
+        Base image made of the first instructions of several containers, named after its content
+        so that identical prefixes of different plans share one image
+    """
+    def __init__(self, base, instructions):
+        self.base = base
+        self.instructions = tuple(instructions)
+
+    @property
+    def dockerfile(self):
+        res = "FROM {base_image}\n".format(base_image=self.base)
+        for instruction in self.instructions:
+            res += "{INSTRUCTION_TYPE} {instruction_parameter}\n".format(INSTRUCTION_TYPE=instruction.opcode, instruction_parameter=instruction.argument)
+        return res
+
+    @property
+    def name(self):
+        return BASE_IMAGE_PREFIX + hashlib.sha1(self.dockerfile.encode('utf-8')).hexdigest()[:12]
+
+    def __eq__(self, other):
+        return isinstance(other, SharedBase) and (self.base, self.instructions) == (other.base, other.instructions)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.base, self.instructions))
+
+    def __repr__(self):
+        return "{name} ({count} instructions from {base})".format(name=self.name, count=len(self.instructions), base=self.base)
+
+def bases_script(shared_bases):
+    """
+        Shell script building the shared base images from their generated directories
+    """
+    script = "#!/bin/sh\n# builds the shared base images the Dockerfiles start FROM, to run before fig up\nset -e\ncd \"$(dirname \"$0\")\"\n"
+    for shared in shared_bases:
+        script += "docker build -t {name} {name}\n".format(name=shared.name)
+    return script
+
+class BaseImagePlanner(object):
+    """
+        Counts the instruction prefixes of containers built on the same base, to factor those
+        shared by at least min_users containers in base images
+    """
+    def __init__(self, min_users=2):
+        self.min_users = min_users
+        self._users = defaultdict(int)
+
+    def add(self, key):
+        """
+            Count a container by its prefix_key
+        """
+        base, prefix = key
+        for length in range(1, len(prefix) + 1):
+            self._users[base, prefix[:length]] += 1
+
+    def add_container(self, container):
+        self.add(prefix_key(container))
+
+    def shared_base(self, container):
+        """
+            The SharedBase of the longest prefix of a container used by enough containers and
+            ending with a RUN, None if there is none
+        """
+        prefix = instruction_prefix(container)
+        length = 0
+        while length < len(prefix) and self._users[container.base, prefix[:length + 1]] >= self.min_users:
+            length += 1
+        while length and prefix[length - 1].opcode != 'RUN':
+            length -= 1
+        return SharedBase(container.base, prefix[:length]) if length else None
+
+    def rewrite(self, container):
+        """
+            Make a container start FROM its shared base image, and return the SharedBase or None
+        """
+        shared = self.shared_base(container)
+        if shared is None:
+            return None
+        rest = container.instructions[len(shared.instructions):]
+        # a container not built anymore runs the shared base image, without the rest
+        if rest and not needs_build(rest):
+            return None
+        container.base = shared.name
+        container.instructions = rest
+        return shared
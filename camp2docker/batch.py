@@ -0,0 +1,121 @@
+import glob
+import multiprocessing
+import os
+import traceback
+from collections import defaultdict
+from assembly import Assembly
+from config import Config
+from plan import Plan
+from materialize import Materializer, DEFAULT_STRATEGY
+from store import ArtifactStore
+from baseimages import BaseImagePlanner, prefix_key
+
+_config = None
+_materializer = None
+_store = None
+_optimize_layers = False
+_planner = None
+
+def find_plans(plans):
+    """
+        Return the plan files of a directory, or matching a glob pattern, sorted by name
+    """
+    if os.path.isdir(plans):
+        files = [os.path.join(plans, f) for f in os.listdir(plans) if f.endswith('.yaml') or f.endswith('.yml')]
+    else:
+        files = glob.glob(plans)
+    return sorted(files)
+
+def _assembly(planfile):
+    assembly = Assembly.from_plan(planfile, _config)
+    if _optimize_layers:
+        assembly.optimize_layers(os.path.split(planfile)[0])
+    return assembly
+
+def _scan(args):
+    """
+        The name of a plan and, with shared_bases, the prefix_key of its containers to build,
+        or the formatted traceback of its failure
+    """
+    planfile, shared_bases = args
+    try:
+        if not shared_bases:
+            return Plan.from_file(planfile).name, [], None
+        assembly = _assembly(planfile)
+        return assembly.plan.name, [prefix_key(c.container) for c in assembly.components if c.container.needs_build], None
+    except Exception:
+        return None, [], traceback.format_exc()
+
+def _generate(planfile, output_directory):
+    try:
+        assembly = _assembly(planfile)
+        if _planner is not None:
+            assembly.share_base_images(_planner)
+        assembly.generate_files(os.path.split(planfile)[0], output_directory, _materializer, _store)
+    except Exception:
+        return planfile, traceback.format_exc()
+    return planfile, None
+
+def _generate_star(args):
+    return _generate(*args)
+
+def _map(function, tasks, workers):
+    if workers == 1:
+        for task in tasks:
+            yield function(task)
+        return
+    # the workers are forked and inherit the module globals, such as the loaded configuration
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap(function, tasks):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+def generate_batch(planfiles, output_directory, config='config', workers=None, strategy=DEFAULT_STRATEGY, store=False, optimize_layers=False, shared_bases=False):
+    """
+        Generate the files of each plan, loading the configuration only once.
+        The artifacts are materialized with the given strategy, or linked from the
+        ArtifactStore of the output directory with store.
+        The Dockerfiles are rewritten by the layer optimizer with optimize_layers, and with
+        shared_bases the instructions prefixes common to containers of all the plans are
+        moved to shared base images.
+        A first pass over the plans reads their names: plans with the same name, which would
+        be generated in the same directory, fail.
+        Yield (planfile, error) as the plans are processed, in order, error being None on
+        success or the formatted traceback of the failure
+    """
+    global _config, _materializer, _store, _optimize_layers, _planner
+    _config = config if isinstance(config, Config) else Config.from_path(config)
+    _materializer = Materializer(strategy)
+    _store = ArtifactStore(output_directory) if store else None
+    _optimize_layers = optimize_layers
+    _planner = None
+    failures = {}
+    planfiles_by_name = defaultdict(list)
+    prefix_keys = {}
+    for planfile, (name, keys, error) in zip(planfiles, _map(_scan, [(planfile, shared_bases) for planfile in planfiles], workers)):
+        if error is not None:
+            failures[planfile] = error
+        else:
+            planfiles_by_name[name].append(planfile)
+            prefix_keys[planfile] = keys
+    for name, named in planfiles_by_name.items():
+        if len(named) > 1:
+            for planfile in named:
+                failures[planfile] = "The plans {planfiles} are all named {name}".format(planfiles=', '.join(named), name=name)
+    if shared_bases:
+        planner = BaseImagePlanner()
+        for planfile, keys in prefix_keys.items():
+            if planfile not in failures:
+                for key in keys:
+                    planner.add(key)
+        _planner = planner
+    tasks = [(planfile, output_directory) for planfile in planfiles if planfile not in failures]
+    results = _map(_generate_star, tasks, workers)
+    for planfile in planfiles:
+        if planfile in failures:
+            yield planfile, failures[planfile]
+        else:
+            yield next(results)
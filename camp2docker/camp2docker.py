@@ -3,12 +3,15 @@
 Usage:
     camp2docker load <filename>
     camp2docker parse <filename>
-    camp2docker process <filename>
-    camp2docker generate <filename> <output_folder>
-    camp2docker generun <filename> <output_folder>
-    camp2docker start <filename>
-    camp2docker stop <filename>
-    camp2docker rm <filename>
+    camp2docker process <filename> [--optimize-layers] [--shared-bases]
+    camp2docker generate <filename> <output_folder> [--artifacts=<strategy>] [--store] [--optimize-layers] [--shared-bases]
+    camp2docker generun <filename> (<output_folder> [--artifacts=<strategy>] [--store] | --stream) [--optimize-layers] [--shared-bases] [--no-build-keys] [--workers=<workers>]
+    camp2docker generate-batch <plans> <output_folder> [--workers=<workers>] [--artifacts=<strategy>] [--store] [--optimize-layers] [--shared-bases]
+    camp2docker apply <filename> [--dry-run] [--optimize-layers] [--shared-bases] [--no-build-keys] [--workers=<workers>]
+    camp2docker start <filename> [--workers=<workers>]
+    camp2docker stop <filename> [--workers=<workers>]
+    camp2docker rm <filename> [--workers=<workers>]
+    camp2docker serve [--host=<host>] [--port=<port>] [--root=<directory>] [--workers=<workers>]
     camp2docker services
     camp2docker service <service>
     camp2docker artifacts
@@ -17,18 +20,72 @@ Usage:
 
 Options:
     -h --help Show this
+    --workers=<workers>  Number of processes converting the plans, the number of CPUs by default, or of images built and containers started at the same time, 4 by default
+    --artifacts=<strategy>  How artifacts are put in the build contexts: auto, reflink, hardlink or copy [default: auto]
+    --stream  Stream the build contexts to the Docker daemon instead of writing them in <output_folder>
+    --optimize-layers  Merge consecutive RUN and ENV instructions, and add the dependency files of the artifacts first
+    --shared-bases  Move the first instructions containers built on the same base have in common to shared base images
+    --no-build-keys  Build all the images, without labelling them with their build key (needed before Docker 1.6)
+    --dry-run  Only print what applying the plan would create, recreate or start
+    --host=<host>  Address the conversion server listens on [default: 127.0.0.1]
+    --port=<port>  Port the conversion server listens on [default: 8042]
+    --root=<directory>  Directory the artifacts of the plans posted to the conversion server must be under [default: .]
+    --store  Keep each distinct artifact file once in <output_folder>/.camp2docker-store, hardlinked in the build contexts
 """
-from docopt import docopt
+from docopt import docopt, DocoptExit
 from plan import Plan
 from assembly import PlanProcessor, Assembly
 from config import Config
-from fig.packages.docker.client import Client
-from fig.cli.utils import docker_url
+from batch import find_plans, generate_batch
+from materialize import Materializer
+from store import ArtifactStore
+from hashindex import HashIndex, INDEX_FILENAME
+from orchestrate import DEFAULT_WORKERS
+from runtime import Runtime
+from lockfile import write_lockfile, load_assembly
+from server import serve
 import pprint
 import logging
 import sys
 import os
 
+def artifact_store(args):
+    return ArtifactStore(args["<output_folder>"]) if args["--store"] else None
+
+def collect_garbage(store):
+    if store is not None:
+        removed = store.collect_garbage()
+        logging.info("%d unreferenced artifact files removed from the store", len(removed))
+
+def assembly_from_plan(args):
+    assembly = Assembly.from_plan(args["<filename>"])
+    if args["--optimize-layers"]:
+        assembly.optimize_layers(os.path.split(args["<filename>"])[0])
+    if args["--shared-bases"]:
+        assembly.share_base_images()
+    if args["generate"] or args["generun"] or (args["apply"] and not args["--dry-run"]):
+        write_lockfile(assembly, args["<filename>"])
+    return assembly
+
+def workers(args, default=None):
+    if args["--workers"] is None:
+        return default
+    try:
+        count = int(args["--workers"])
+    except ValueError:
+        count = 0
+    if count < 1:
+        # exits with the usage
+        raise DocoptExit("--workers must be a positive integer, not {workers}".format(workers=args["--workers"]))
+    return count
+
+def runtime(args):
+    return Runtime(workers=workers(args, DEFAULT_WORKERS))
+
+def build_keys(args):
+    # labelling the images by default when the Docker daemon supports it
+    return False if args["--no-build-keys"] else None
+
 def setup_logging():
     console_handler = logging.StreamHandler(sys.stderr)
     console_handler.setFormatter(logging.Formatter())
@@ -48,30 +105,50 @@ if __name__ == "__main__":
         plan = Plan.from_file(args["<filename>"])
         print plan
     elif args["process"]:
-        assembly = Assembly.from_plan(args["<filename>"])
+        assembly = assembly_from_plan(args)
         print assembly
 
     elif args["generate"]:
-        assembly = Assembly.from_plan(args["<filename>"])
-        assembly.generate_files(os.path.split(args["<filename>"])[0], args["<output_folder>"])
+        assembly = assembly_from_plan(args)
+        store = artifact_store(args)
+        assembly.generate_files(os.path.split(args["<filename>"])[0], args["<output_folder>"], Materializer(args["--artifacts"]), store)
+        collect_garbage(store)
+    elif args["generate-batch"]:
+        failures = 0
+        for planfile, error in generate_batch(find_plans(args["<plans>"]), args["<output_folder>"], workers=workers(args), strategy=args["--artifacts"], store=args["--store"], optimize_layers=args["--optimize-layers"], shared_bases=args["--shared-bases"]):
+            if error is None:
+                print "OK {planfile}".format(planfile=planfile)
+            else:
+                failures += 1
+                print "FAILED {planfile}\n{error}".format(planfile=planfile, error=error)
+        collect_garbage(artifact_store(args))
+        if failures:
+            sys.exit(1)
+    elif args["generun"] and args["--stream"]:
+        assembly = assembly_from_plan(args)
+        with runtime(args) as r:
+            r.build(assembly, os.path.split(args["<filename>"])[0], build_keys=build_keys(args))
+            r.up(assembly)
     elif args["generun"]:
-        assembly = Assembly.from_plan(args["<filename>"])
-        assembly.generate_files(os.path.split(args["<filename>"])[0], args["<output_folder>"])
-        os.chdir(os.path.join(args["<output_folder>"], assembly.plan.name))
-        client = Client(docker_url())
-        assembly.run(client)
-    elif args["start"]:
-        assembly = Assembly.from_plan(args["<filename>"])
-        client = Client(docker_url())
-        assembly.start(client)
-    elif args["stop"]:
-        assembly = Assembly.from_plan(args["<filename>"])
-        client = Client(docker_url())
-        assembly.stop(client)
-    elif args["rm"]:
-        assembly = Assembly.from_plan(args["<filename>"])
-        client = Client(docker_url())
-        assembly.rm(client)
+        assembly = assembly_from_plan(args)
+        store = artifact_store(args)
+        assembly.generate_files(os.path.split(args["<filename>"])[0], args["<output_folder>"], Materializer(args["--artifacts"]), store)
+        collect_garbage(store)
+        with runtime(args) as r:
+            r.build(assembly, os.path.split(args["<filename>"])[0], HashIndex(os.path.join(args["<output_folder>"], INDEX_FILENAME)), build_keys=build_keys(args))
+            os.chdir(os.path.join(args["<output_folder>"], assembly.plan.name))
+            r.up(assembly)
+    elif args["apply"]:
+        assembly = assembly_from_plan(args)
+        with runtime(args) as r:
+            for change in r.deploy(assembly, os.path.split(args["<filename>"])[0], dry_run=args["--dry-run"], build_keys=build_keys(args)):
+                print change
+    elif args["start"] or args["stop"] or args["rm"]:
+        operation = [o for o in ("start", "stop", "rm") if args[o]]
+        with runtime(args) as r:
+            r.apply(operation, [load_assembly(args["<filename>"])])
+    elif args["serve"]:
+        serve(args["--host"], int(args["--port"]), workers=workers(args), root=args["--root"])
     elif args["services"]:
         config = Config.from_path()
         services = config.services
@@ -1,5 +1,12 @@
-import yaml
 import os
+import hashlib
+import cPickle as pickle
+from utils import load_yaml_file, load_yaml_files, write_pickle
+from output import compile_instructions
+
+CACHE_FILENAME = '.camp2docker.cache'
+CACHE_VERSION = 6
+MANIFEST_FILENAME = '.camp2docker.manifest'
 
 class ConfigError(Exception):
     pass
@@ -16,6 +23,38 @@ class NoRequirementException(Exception):
 class ParameterException(Exception):
     pass
 
+class NoActionException(Exception):
+    pass
+
+def _index_by(items, attribute, kind):
+    """
+        Build a dict of items keyed by the given attribute, refusing duplicate keys
+    """
+    index = {}
+    for item in items:
+        key = getattr(item, attribute)
+        if key in index:
+            raise ConfigError("Duplicate {kind} {key}".format(kind=kind, key=key))
+        index[key] = item
+    return index
+
+def _index_positions(names, kind):
+    """
+        Build a dict of positions keyed by name, refusing duplicate names
+    """
+    index = {}
+    for position, name in enumerate(names):
+        if name in index:
+            raise ConfigError("Duplicate {kind} {key}".format(kind=kind, key=name))
+        index[name] = position
+    return index
+
+def _provides_characteristics(service_characteristics, characteristics):
+    for characteristic in characteristics:
+        if next((c for c in service_characteristics if c.match_characteristic(characteristic)), None) is None:
+            return False
+    return True
+
 class BaseConfig(object):
     def __repr__(self):
         return str(self.__dict__)
@@ -28,10 +67,7 @@ class ServiceConfig(BaseConfig):
         self.characteristics = [CharacteristicConfig(**characteristic) for characteristic in characteristics]
 
     def corresponds_to_characteristics(self, characteristics):
-        for characteristic in characteristics:
-            if next((c for c in self.characteristics if c.match_characteristic(characteristic)), None) is None:
-                return False
-        return True
+        return _provides_characteristics(self.characteristics, characteristics)
 
 class CharacteristicConfig(BaseConfig):
     def __init__(self, characteristic_type, **kwargs):
@@ -54,19 +90,26 @@ class CharacteristicConfig(BaseConfig):
         return True
 
 class ArtifactConfig(BaseConfig):
-    def __init__(self, name, default_requirement, requirements):
+    def __init__(self, name, default_requirement, requirements, ignore=None, dependencies=None, install=None):
         self.name = name
         self.default_requirement = default_requirement
+        # paths, relative to an artifact directory, never added to the build contexts
+        self.ignore = list(ignore) if ignore is not None else []
+        # dependency manifests, relative to an artifact directory, added first by the layer optimizer
+        self.dependencies = list(dependencies) if dependencies is not None else []
+        # commands installing the dependencies, the artifact itself being added after them
+        self.install = list(install) if install is not None else []
         self.requirements = [RequirementConfig(**requirement) for requirement in requirements]
+        self._requirements_by_type = _index_by(self.requirements, 'requirement_type', 'requirement')
     def get_default_requirement(self):
         try:
-            return next(r for r in self.requirements if r.requirement_type == self.default_requirement)
-        except StopIteration:
+            return self._requirements_by_type[self.default_requirement]
+        except KeyError:
             raise NoRequirementException("Can't find the default requirement {requirement}".format(requirement=self.default_requirement))
     def find_requirement_by_type(self, requirement_type):
         try:
-            return next(r for r in self.requirements if r.requirement_type == requirement_type)
-        except StopIteration:
+            return self._requirements_by_type[requirement_type]
+        except KeyError:
             raise NoRequirementException("Can't find requirement {requirement}".format(requirement=requirement_type))
 
 class RequirementConfig(BaseConfig):
@@ -78,6 +121,7 @@ class RequirementConfig(BaseConfig):
             self.parameters = {}
         self.default_service = default_service
         self.actions = [ActionConfig(**action) for action in actions]
+        self._actions_by_service = _index_by(self.actions, 'service', 'action for service')
     def validate_parameters(self, parameters):
         try:
             if len(parameters) > 0:
@@ -86,7 +130,10 @@ class RequirementConfig(BaseConfig):
             raise ParameterException("No parameters expected")
 
     def find_action_by_service_name(self, service_name):
-        return next(a for a in self.actions if a.service == service_name)
+        try:
+            return self._actions_by_service[service_name]
+        except KeyError:
+            raise NoActionException("No action of {requirement} for service {service}".format(requirement=self.requirement_type, service=service_name))
 
 class ParameterConfig(BaseConfig):
     TYPES = ('string', 'integer', 'boolean')
@@ -121,65 +168,283 @@ class InstructionList(BaseConfig):
     def __init__(self, target, do):
         self.target = target
         self.do = do
+        self.program = compile_instructions(do)
 
 class Config(object):
     def __init__(self, path, services, artifacts):
         self.path = path
         self.services = services
         self.artifacts = artifacts
+        self._services_by_name = _index_by(services, 'name', 'service')
+        self._artifacts_by_name = _index_by(artifacts, 'name', 'artifact')
+        self._service_characteristics = [service.characteristics for service in services]
+        self._characteristic_index = self._build_characteristic_index(self._service_characteristics)
+
+    @staticmethod
+    def _build_characteristic_index(service_characteristics):
+        """
+            Map (characteristic_type, attribute, value) to the set of
+            (service position, characteristic position) providing it.
+            The characteristic type alone is indexed as (characteristic_type, None, None)
+        """
+        index = {}
+        for s, characteristics in enumerate(service_characteristics):
+            for c, characteristic in enumerate(characteristics):
+                characteristic_type = characteristic.characteristic_type
+                index.setdefault((characteristic_type, None, None), set()).add((s, c))
+                for attribute, value in characteristic.parameters.iteritems():
+                    try:
+                        index.setdefault((characteristic_type, attribute, value), set()).add((s, c))
+                    except TypeError:
+                        # unhashable values can only be matched by a scan
+                        pass
+        return index
+
+    @classmethod
+    def from_path(cls, path='config', use_cache=True, lazy=False):
+        """
+            Load the configuration files of the services and artifacts directories.
+            The built configuration is cached in the configuration directory and reused
+            as long as no configuration file is added, removed or modified.
+            With lazy, return a LazyConfig building services and artifacts on first access
+        """
+        def _parse_files(files):
+            elements = []
+            for document in load_yaml_files(files):
+                elements.extend(document)
+            return elements
+
+        services_files = cls._list_directory(path, 'services')
+        artifacts_files = cls._list_directory(path, 'artifacts')
+
+        if lazy:
+            return LazyConfig.from_files(path, services_files, artifacts_files, use_cache)
+
+        if use_cache:
+            signature = cls._files_signature(services_files + artifacts_files)
+            config = cls._load_cache(path, signature)
+            if config is not None:
+                return config
+
+        services = [ServiceConfig(**service) for service in _parse_files(services_files)]
+        artifacts = [ArtifactConfig(**artifact) for artifact in _parse_files(artifacts_files)]
+        config = cls(path, services, artifacts)
+
+        if use_cache:
+            config._save_cache(signature)
+        return config
+
+    @staticmethod
+    def _list_directory(path, directory):
+        directory_path = os.path.join(path, directory)
+        files = sorted(os.listdir(directory_path))
+        return [os.path.join(directory_path, file) for file in files if file.endswith('.yaml') or file.endswith('.yml')]
 
     @classmethod
-    def from_path(cls, path='config'):
-        def _parse_services_directory():
-            services_path = os.path.join(path, 'services')
-            files = os.listdir(services_path)
-            services = []
-            for file in files:
-                if file.endswith('.yaml') or file.endswith('.yml'):
-                    services.extend(_parse_services_file(os.path.join(services_path, file)))
-            return services
-
-        def _parse_services_file(filename):
-            with open(filename, "r") as f:
-                services = yaml.load(f)
-            return services
-
-        def _parse_artifacts_directory():
-            artifacts_path = os.path.join(path, 'artifacts')
-            files = os.listdir(artifacts_path)
-            artifacts = []
-            for file in files:
-                if file.endswith('.yaml') or file.endswith('.yml'):
-                    artifacts.extend(_parse_artifacts_file(os.path.join(artifacts_path, file)))
-            return artifacts
-
-        def _parse_artifacts_file(filename):
-            with open(filename, "r") as f:
-                artifacts = yaml.load(f)
-            return artifacts
-
-        services = [ServiceConfig(**service) for service in _parse_services_directory()]
-        artifacts = [ArtifactConfig(**artifact) for artifact in _parse_artifacts_directory()]
-
-        return cls(path, services, artifacts)
+    def digest(cls, path='config'):
+        """
+            Digest of the names, sizes and modification times of the configuration files
+        """
+        sha = hashlib.sha1()
+        files = cls._list_directory(path, 'services') + cls._list_directory(path, 'artifacts')
+        for filename, size, mtime in cls._files_signature(files):
+            sha.update("{filename}\0{size}\0{mtime!r}\n".format(filename=os.path.relpath(filename, path), size=size, mtime=mtime))
+        return sha.hexdigest()
+
+    @staticmethod
+    def _files_signature(files):
+        signature = []
+        for filename in files:
+            stat = os.stat(filename)
+            signature.append((filename, stat.st_size, stat.st_mtime))
+        return signature
+
+    @classmethod
+    def _load_cache(cls, path, signature):
+        try:
+            with open(os.path.join(path, CACHE_FILENAME), 'rb') as f:
+                version, cached_signature, config = pickle.load(f)
+        except Exception:
+            return None
+        if version != CACHE_VERSION or cached_signature != signature:
+            return None
+        config.path = path
+        return config
+
+    def _save_cache(self, signature):
+        write_pickle(os.path.join(self.path, CACHE_FILENAME), (CACHE_VERSION, signature, self))
 
     def find_artifact_config_by_type(self, artifact_type):
         try:
-            return next(artifact for artifact in self.artifacts if artifact.name == artifact_type)
-        except StopIteration:
+            return self._artifacts_by_name[artifact_type]
+        except KeyError:
             raise NoArtifactException("Artifact {name} not found".format(name=artifact_type))
 
     def find_service_by_name(self, name):
         try:
-            return next(service for service in self.services if service.name == name)
-        except StopIteration:
+            return self._services_by_name[name]
+        except KeyError:
             raise NoServiceException("Service {name} not found".format(name=name))
 
     def find_service_by_characteristics(self, characteristics):
-        for service in self.services:
-            if service.corresponds_to_characteristics(characteristics):
-                return service
+        """
+            Return the first service (in configuration order) providing all the characteristics
+        """
+        candidates = None
+        for characteristic in characteristics:
+            try:
+                services = self._services_matching_characteristic(characteristic)
+            except TypeError:
+                return self._scan_service_by_characteristics(characteristics)
+            candidates = services if candidates is None else candidates & services
+            if not candidates:
+                raise NoServiceException()
+        if candidates is None:
+            candidates = range(len(self._service_characteristics))
+        if not candidates:
+            raise NoServiceException()
+        return self._service_at(min(candidates))
+
+    def _service_at(self, position):
+        return self.services[position]
+
+    def _services_matching_characteristic(self, characteristic):
+        characteristic_type = characteristic.characteristic_type
+        holders = None
+        for attribute, value in characteristic.__dict__.iteritems():
+            if attribute == 'characteristic_type':
+                key = (characteristic_type, None, None)
+            else:
+                key = (characteristic_type, attribute, value)
+            found = self._characteristic_index.get(key, frozenset())
+            holders = found if holders is None else holders & found
+            if not holders:
+                return set()
+        return set(s for s, c in holders)
+
+    def _scan_service_by_characteristics(self, characteristics):
+        for position, service_characteristics in enumerate(self._service_characteristics):
+            if _provides_characteristics(service_characteristics, characteristics):
+                return self._service_at(position)
         raise NoServiceException()
 
     def __repr__(self):
         return str(self.__dict__)
+
+class LazyConfig(Config):
+    """
+        Configuration parsing and building a service or an artifact only when it is first accessed.
+        The manifest (name and characteristics of the elements defined by each file) is
+        cached in the configuration directory and only rebuilt for the modified files
+    """
+    def __init__(self, path, services_manifest, artifacts_manifest, documents=None):
+        """
+            services_manifest and artifacts_manifest are lists of (filename, [(name, characteristics)])
+        """
+        self.path = path
+        self._documents = documents if documents is not None else {}
+        self._service_locations, service_names, self._service_characteristics = [], [], []
+        for filename, entries in services_manifest:
+            for position, (name, characteristics) in enumerate(entries):
+                self._service_locations.append((filename, position, name))
+                service_names.append(name)
+                self._service_characteristics.append([CharacteristicConfig(**c) for c in characteristics])
+        self._artifact_locations, artifact_names = [], []
+        for filename, entries in artifacts_manifest:
+            for position, (name, characteristics) in enumerate(entries):
+                self._artifact_locations.append((filename, position, name))
+                artifact_names.append(name)
+        self._service_positions = _index_positions(service_names, 'service')
+        self._artifact_positions = _index_positions(artifact_names, 'artifact')
+        self._characteristic_index = self._build_characteristic_index(self._service_characteristics)
+        self._services = {}
+        self._artifacts = {}
+
+    @classmethod
+    def from_files(cls, path, services_files, artifacts_files, use_cache=True):
+        previous = cls._load_manifest(path) if use_cache else {}
+        manifest = {}
+        stale = []
+        for filename, size, mtime in cls._files_signature(services_files + artifacts_files):
+            entry = previous.get(filename)
+            if entry is not None and entry[:2] == (size, mtime):
+                manifest[filename] = entry
+            else:
+                stale.append((filename, size, mtime))
+
+        documents = {}
+        if stale:
+            for (filename, size, mtime), document in zip(stale, load_yaml_files([filename for filename, _, _ in stale])):
+                documents[filename] = document
+                entries = [(element['name'], element.get('characteristics', [])) for element in document]
+                manifest[filename] = (size, mtime, entries)
+            if use_cache:
+                cls._save_manifest(path, manifest)
+
+        return cls(path,
+                [(filename, manifest[filename][2]) for filename in services_files],
+                [(filename, manifest[filename][2]) for filename in artifacts_files],
+                documents)
+
+    @staticmethod
+    def _load_manifest(path):
+        try:
+            with open(os.path.join(path, MANIFEST_FILENAME), 'rb') as f:
+                version, manifest = pickle.load(f)
+        except Exception:
+            return {}
+        return manifest if version == CACHE_VERSION else {}
+
+    @staticmethod
+    def _save_manifest(path, manifest):
+        write_pickle(os.path.join(path, MANIFEST_FILENAME), (CACHE_VERSION, manifest))
+
+    def _element(self, location):
+        filename, position, name = location
+        try:
+            document = self._documents[filename]
+        except KeyError:
+            document = self._documents[filename] = load_yaml_file(filename)
+        try:
+            element = document[position]
+        except IndexError:
+            element = None
+        if element is None or element.get('name') != name:
+            raise ConfigError("{filename} was modified while loading the configuration".format(filename=filename))
+        return element
+
+    def _service_at(self, position):
+        try:
+            return self._services[position]
+        except KeyError:
+            service = self._services[position] = ServiceConfig(**self._element(self._service_locations[position]))
+            return service
+
+    def _artifact_at(self, position):
+        try:
+            return self._artifacts[position]
+        except KeyError:
+            artifact = self._artifacts[position] = ArtifactConfig(**self._element(self._artifact_locations[position]))
+            return artifact
+
+    @property
+    def services(self):
+        return [self._service_at(position) for position in range(len(self._service_locations))]
+
+    @property
+    def artifacts(self):
+        return [self._artifact_at(position) for position in range(len(self._artifact_locations))]
+
+    def find_artifact_config_by_type(self, artifact_type):
+        try:
+            position = self._artifact_positions[artifact_type]
+        except KeyError:
+            raise NoArtifactException("Artifact {name} not found".format(name=artifact_type))
+        return self._artifact_at(position)
+
+    def find_service_by_name(self, name):
+        try:
+            position = self._service_positions[name]
+        except KeyError:
+            raise NoServiceException("Service {name} not found".format(name=name))
+        return self._service_at(position)
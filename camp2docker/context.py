@@ -0,0 +1,129 @@
+import os
+import re
+import sys
+import tarfile
+import time
+from fig.progress_stream import stream_output, StreamOutputError
+from dockerclient import copy_client
+from fig.packages.docker.errors import APIError
+
+CHUNK_SIZE = 1 << 16
+BLOCK_SIZE = tarfile.BLOCKSIZE
+BUILD_KEY_LABEL = 'camp2docker.build-key'
+BASE_ID_LABEL = 'camp2docker.base-id'
+# the LABEL instruction comes with Docker 1.6
+LABELS_API_VERSION = (1, 18)
+
+class BuildException(Exception):
+    pass
+
+def _padding(size):
+    return '\0' * (-size % BLOCK_SIZE)
+
+def _header(name, size, mode, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = mode
+    info.mtime = mtime
+    return info.tobuf(tarfile.GNU_FORMAT)
+
+def inspect_image(client, name):
+    """
+        The description of an image by the Docker daemon, None if there is no such image
+    """
+    try:
+        return client.inspect_image(name)
+    except APIError as e:
+        if e.response.status_code == 404:
+            return None
+        raise
+
+def supports_labels(client):
+    """
+        Whether the Docker daemon can label the images it builds
+    """
+    try:
+        version = client.version().get('ApiVersion', '0')
+        return tuple(int(v) for v in version.split('.')) >= LABELS_API_VERSION
+    except (APIError, ValueError):
+        return False
+
+def image_labels(image):
+    return (image.get('Config') or {}).get('Labels') or {}
+
+class BuildContext(object):
+    """
+        Build context of a component, its Dockerfile and artifacts laid out as generate_files
+        does, streamed as a tar archive without being staged on disk.
+        The labels are added to the image by the Dockerfile
+    """
+    def __init__(self, component, plan_directory, labels=None):
+        self.component = component
+        self.plan_directory = plan_directory
+        self.labels = labels if labels is not None else {}
+
+    @property
+    def dockerfile(self):
+        dockerfile = str(self.component.container)
+        for label, value in sorted(self.labels.items()):
+            dockerfile += 'LABEL {label}="{value}"\n'.format(label=label, value=value)
+        return dockerfile
+
+    @property
+    def files(self):
+        """
+            (name in the context, artifact file) of the artifacts files the Dockerfile adds
+        """
+        return self.component.context_filter.filter(self.component.context_files(self.plan_directory))
+
+    def __iter__(self):
+        # an empty chunk would end a chunked HTTP request body
+        return (chunk for chunk in self._chunks() if chunk)
+
+    def _chunks(self):
+        dockerfile = self.dockerfile
+        yield _header('Dockerfile', len(dockerfile), 0644, int(time.time()))
+        yield dockerfile
+        yield _padding(len(dockerfile))
+        for name, filename in self.files:
+            with open(filename, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                yield _header(name, stat.st_size, stat.st_mode & 07777, int(stat.st_mtime))
+                written = 0
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    written += len(chunk)
+                    yield chunk
+                if written != stat.st_size:
+                    raise BuildException("{filename} was modified while building".format(filename=filename))
+                yield _padding(stat.st_size)
+        yield '\0' * (2 * BLOCK_SIZE)
+
+def build_image(client, name, output=sys.stdout, **build_options):
+    """
+        Build an image with the build options of the docker client, print the build output
+        and return the image id
+    """
+    build_output = client.build(stream=True, rm=True, **build_options)
+    try:
+        events = stream_output(build_output, output)
+    except StreamOutputError as e:
+        raise BuildException("Can't build {name}: {reason}".format(name=name, reason=e))
+    for event in reversed(events):
+        match = re.search(r'Successfully built ([0-9a-f]+)', event.get('stream', ''))
+        if match:
+            return match.group(1)
+    raise BuildException("Can't build {name}".format(name=name))
+
+def build_streamed(client, component, plan_directory, tag, output=sys.stdout, nocache=False, labels=None):
+    """
+        Build the image of a component from its context streamed to the Docker daemon,
+        and return the image id
+    """
+    # requests puts the connection of a chunked request back in its pool before the response
+    # is read, so another request of the client could take it while the build streams
+    build_client = copy_client(client)
+    try:
+        return build_image(build_client, component.container.name, output, fileobj=iter(BuildContext(component, plan_directory, labels)),
+                custom_context=True, tag=tag, nocache=nocache)
+    finally:
+        build_client.close()
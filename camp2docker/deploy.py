@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+from context import inspect_image, supports_labels
+from hashindex import HashIndex, INDEX_FILENAME
+from utils import thread_map
+
+log = logging.getLogger(__name__)
+
+# the docker client fig comes with can't label containers, so the hash is in their environment
+CONFIG_HASH_VARIABLE = 'CAMP2DOCKER_CONFIG_HASH'
+
+def config_hash(component, image_key, link_hashes=()):
+    """
+        Digest of what the containers of a component are created from: its service, the key
+        of its image and the configuration hashes of the components it links to
+    """
+    sha = hashlib.sha1()
+    sha.update(json.dumps(component.service_dict, sort_keys=True))
+    sha.update("\0{image}".format(image=image_key))
+    for link_hash in sorted(link_hashes):
+        sha.update("\0{link}".format(link=link_hash))
+    return sha.hexdigest()
+
+class Change(object):
+    """
+        What applying an assembly does to the containers of a component: create, recreate,
+        start or keep them, and why
+    """
+    def __init__(self, component, action, reason, config_hash, rebuild=False):
+        self.component = component
+        self.action = action
+        self.reason = reason
+        self.config_hash = config_hash
+        self.rebuild = rebuild
+
+    @property
+    def name(self):
+        return self.component.container.name
+
+    def __repr__(self):
+        return "{action} {name}: {reason}{rebuild}".format(action=self.action, name=self.name, reason=self.reason, rebuild=" (image rebuilt)" if self.rebuild else "")
+
+class Deployment(object):
+    """
+        Applies an assembly incrementally with an Orchestrator: only the images whose build key
+        changed are rebuilt, and only the components whose configuration hash differs from the
+        one of their containers are recreated, along with those linking to a created or
+        recreated component; the other containers are left running.
+        The artifacts are hashed with hash_index, by default the HashIndex of the plan directory.
+        Without build_keys, by default when the Docker daemon can't label images, all the
+        images are built, and the plan only knows the images already built
+    """
+    def __init__(self, orchestrator, plan_directory, hash_index=None, build_keys=None):
+        self.orchestrator = orchestrator
+        self.assembly = orchestrator.assembly
+        self.client = orchestrator.client
+        self.plan_directory = plan_directory
+        self.hash_index = hash_index if hash_index is not None else HashIndex(os.path.join(plan_directory, INDEX_FILENAME))
+        self.build_keys = build_keys if build_keys is not None else supports_labels(self.client)
+
+    def _image_key(self, component):
+        """
+            The id of the image of the component and False if it is up to date, else the build
+            key of its image and True as it is built
+        """
+        if component.container.needs_build:
+            image = inspect_image(self.client, self.assembly.image_name(component))
+            if image is not None and not self.build_keys:
+                return image['Id'], False
+            key, up_to_date = self.assembly.image_build_key(self.client, component, self.plan_directory, self.hash_index, pull=False)
+            return (image['Id'], False) if up_to_date else (key, True)
+        image = inspect_image(self.client, component.container.base)
+        return (image['Id'] if image is not None else component.container.base), False
+
+    def _change(self, component, project, changes):
+        image_key, rebuild = self._image_key(component)
+        links = [changes[link] for link in component.container.links if link in changes]
+        new_hash = config_hash(component, image_key, [link.config_hash for link in links])
+        containers = project.get_service(component.container.name).containers(stopped=True)
+        if not containers:
+            return Change(component, 'create', "no container", new_hash, rebuild)
+        # the links of the containers are bound to the ids of the linked containers
+        recreated = [link.name for link in links if link.action in ('create', 'recreate')]
+        if recreated or any(c.environment.get(CONFIG_HASH_VARIABLE) != new_hash for c in containers):
+            if rebuild:
+                reason = "image changed"
+            elif recreated:
+                reason = "links to recreated {names}".format(names=', '.join(recreated))
+            else:
+                reason = "configuration changed"
+            return Change(component, 'recreate', reason, new_hash, rebuild)
+        if not all(c.is_running for c in containers):
+            return Change(component, 'start', "stopped", new_hash, rebuild)
+        return Change(component, 'keep', "unchanged", new_hash, rebuild)
+
+    def plan(self):
+        """
+            The Change of each component, in the order of the waves of linked components
+        """
+        project = self.assembly.to_fig_project(self.client)
+        changes = {}
+        plan = []
+        for wave in self.orchestrator.waves:
+            wave_changes = thread_map(lambda c: self._change(c, project, changes), wave, self.orchestrator.workers)
+            for change in wave_changes:
+                changes[change.component.container] = change
+            plan.extend(wave_changes)
+        self.hash_index.save()
+        return plan
+
+    def _apply_change(self, project, change):
+        service = project.get_service(change.name)
+        if change.action in ('create', 'recreate'):
+            service.recreate_containers(environment={CONFIG_HASH_VARIABLE: change.config_hash})
+        elif change.action == 'start':
+            service.start()
+
+    def apply(self):
+        """
+            Pull the missing base images, build the changed images, then create, recreate or
+            start the containers of the components which need it, a wave after the other.
+            Return the plan applied
+        """
+        self.orchestrator.pull()
+        self.assembly.build(self.client, self.plan_directory, self.hash_index, workers=self.orchestrator.workers, build_keys=self.build_keys)
+        plan = self.plan()
+        project = self.assembly.to_fig_project(self.client)
+        by_component = dict((change.component, change) for change in plan)
+        for wave in self.orchestrator.waves:
+            changes = [by_component[c] for c in wave if by_component[c].action != 'keep']
+            for change in changes:
+                log.info("%r", change)
+            thread_map(lambda change: self._apply_change(project, change), changes, self.orchestrator.workers)
+        return plan
@@ -0,0 +1,68 @@
+import threading
+from requests.packages.urllib3 import connectionpool
+from fig.packages.docker.client import Client, DEFAULT_DOCKER_API_VERSION, DEFAULT_TIMEOUT_SECONDS
+from fig.packages.docker.unixconn.unixconn import UnixAdapter, UnixHTTPConnection
+
+class PooledUnixConnectionPool(connectionpool.HTTPConnectionPool):
+    """
+        Pool of up to maxsize connections kept alive to the unix socket of the daemon
+    """
+    def __init__(self, base_url, socket_path, timeout=DEFAULT_TIMEOUT_SECONDS, maxsize=1):
+        connectionpool.HTTPConnectionPool.__init__(self, 'localhost', timeout=timeout, maxsize=maxsize)
+        self.base_url = base_url
+        self.socket_path = socket_path
+        # urllib3 keeps the timeout as a Timeout, the connections take seconds
+        self.socket_timeout = timeout
+
+    def _new_conn(self):
+        return UnixHTTPConnection(self.base_url, self.socket_path, self.socket_timeout)
+
+class PooledUnixAdapter(UnixAdapter):
+    """
+        Adapter of the docker unix socket keeping up to pool_size connections alive, where
+        the vendored one opens a new connection for each request
+    """
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT_SECONDS, pool_size=1):
+        UnixAdapter.__init__(self, base_url, timeout)
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get_connection(self, socket_path, proxies=None):
+        with self._lock:
+            pool = self._pools.get(socket_path)
+            if pool is None:
+                pool = self._pools[socket_path] = PooledUnixConnectionPool(self.base_url, socket_path, self.timeout, self.pool_size)
+            return pool
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+        UnixAdapter.close(self)
+
+class DockerClient(Client):
+    """
+        The docker client fig vendors, keeping the base_url, api_version and timeout it is
+        created with, so that it can be copied. With pool_size, up to pool_size connections
+        to the daemon unix socket are kept alive; requests already keeps TCP connections alive
+    """
+    def __init__(self, base_url=None, api_version=DEFAULT_DOCKER_API_VERSION, timeout=DEFAULT_TIMEOUT_SECONDS, pool_size=None):
+        Client.__init__(self, base_url, api_version, timeout)
+        self.api_version = api_version
+        self.timeout = timeout
+        if pool_size is not None:
+            self.mount('http+unix://', PooledUnixAdapter(self.base_url, timeout, pool_size))
+
+    def copy(self, pool_size=None):
+        return DockerClient(self.base_url, self.api_version, self.timeout, pool_size)
+
+def copy_client(client):
+    """
+        A new client to the daemon of client, with its settings if it is a DockerClient, else
+        with the default ones
+    """
+    if isinstance(client, DockerClient):
+        return client.copy()
+    return DockerClient(client.base_url)
@@ -0,0 +1,114 @@
+import fnmatch
+import json
+import os
+
+DOCKERIGNORE_FILENAME = '.dockerignore'
+# always sent to the daemon, whatever the Dockerfile adds
+CONTEXT_FILES = frozenset(['Dockerfile', DOCKERIGNORE_FILENAME])
+ADD_OPCODES = frozenset(['ADD', 'COPY'])
+
+def _split(path):
+    return [name for name in path.replace(os.sep, '/').split('/') if name]
+
+def _match_prefix(pattern, names):
+    """
+        Whether the path names, or one of their parent directories, match the pattern;
+        as with Docker, wildcards don't match the path separator
+    """
+    parts = _split(pattern)
+    return 0 < len(parts) <= len(names) and all(fnmatch.fnmatchcase(name, part) for part, name in zip(parts, names))
+
+def added_sources(container):
+    """
+        Sources, relative to the build context, of the ADD and COPY instructions of a container.
+        '.' when the whole context is added
+    """
+    sources = []
+    for instruction in container.instructions:
+        if instruction.opcode not in ADD_OPCODES or not isinstance(instruction.argument, basestring):
+            continue
+        argument = instruction.argument.strip()
+        if argument.startswith('['):
+            try:
+                arguments = json.loads(argument)
+            except ValueError:
+                arguments = argument.split()
+        else:
+            arguments = argument.split()
+        for source in arguments[:-1]:
+            if '://' in source:
+                continue
+            sources.append(os.path.normpath(source.lstrip('/')) if source.strip('/') else '.')
+    return sources
+
+class ContextFilter(object):
+    """
+        Selects the files of a build context that its Dockerfile adds, minus the ignore
+        rules of the types of its artifacts
+    """
+    def __init__(self, sources, ignore=()):
+        self.sources = list(sources)
+        self.ignore = sorted(set(ignore))
+        self._adds_all = '.' in self.sources
+
+    @classmethod
+    def from_component(cls, component):
+        return cls(added_sources(component.container), component.ignore)
+
+    def is_added(self, path):
+        if path in CONTEXT_FILES or self._adds_all:
+            return True
+        names = _split(path)
+        return any(_match_prefix(source, names) for source in self.sources)
+
+    def is_ignored(self, path):
+        if path in CONTEXT_FILES:
+            return False
+        names = _split(path)
+        return any(_match_prefix(pattern, names) for pattern in self.ignore)
+
+    def includes(self, path):
+        return self.is_added(path) and not self.is_ignored(path)
+
+    def filter(self, files):
+        """
+            The (name in the context, file) files to send to the daemon
+        """
+        return [(name, filename) for name, filename in files if self.includes(name)]
+
+    def dockerignore(self, names):
+        """
+            Content of the .dockerignore of a context made of the files names: the ignore rules,
+            then the largest directories or files of the context which are not added
+        """
+        kept_directories = set()
+        for name in names:
+            if self.includes(name):
+                parts = _split(name)
+                kept_directories.update('/'.join(parts[:i]) for i in range(1, len(parts)))
+        excluded = set()
+        for name in names:
+            if self.is_added(name) or self.is_ignored(name):
+                continue
+            parts = _split(name)
+            for i in range(1, len(parts) + 1):
+                prefix = '/'.join(parts[:i])
+                if prefix not in kept_directories:
+                    excluded.add(prefix)
+                    break
+        return ''.join(line + '\n' for line in self.ignore + sorted(excluded))
+
+class ContextSize(object):
+    """
+        Size in bytes of a build context with all the artifacts files, and with only the files
+        its Dockerfile needs
+    """
+    def __init__(self, files, kept):
+        self.before = sum(os.path.getsize(filename) for name, filename in files)
+        self.after = sum(os.path.getsize(filename) for name, filename in kept)
+        self.files_before = len(files)
+        self.files_after = len(kept)
+
+    def __repr__(self):
+        return "{files_before} files, {before} bytes -> {files_after} files, {after} bytes".format(
+                files_before=self.files_before, before=self.before, files_after=self.files_after, after=self.after)
@@ -0,0 +1,159 @@
+import cPickle as pickle
+import hashlib
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from utils import thread_map, write_pickle
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_FILENAME = '.camp2docker.hashes'
+INDEX_VERSION = 1
+CHUNK_SIZE = 1 << 20
+MMAP_THRESHOLD = 1 << 24
+DEFAULT_THREADS = 8
+# a file modified in the same second as it is hashed could change without its mtime changing
+RACY_DELAY = 2
+
+def file_digest(filename):
+    """
+        sha1 of a file, read in chunks, through a memory map for large files
+    """
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(0, size, CHUNK_SIZE):
+                    sha.update(buffer(mapped, offset, CHUNK_SIZE))
+            finally:
+                mapped.close()
+        else:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+def tree_files(path):
+    """
+        The files of a directory (following symbolic links), sorted, relative to the directory.
+        A directory linking back to one of its parents is skipped
+    """
+    files = []
+    # the real paths of the parents of each directory to walk
+    parents = {path: frozenset()}
+    for root, dirs, names in os.walk(path, followlinks=True):
+        chain = parents.pop(root) | frozenset([os.path.realpath(root)])
+        kept = [d for d in sorted(dirs) if os.path.realpath(os.path.join(root, d)) not in chain]
+        for d in kept:
+            parents[os.path.join(root, d)] = chain
+        dirs[:] = kept
+        for name in sorted(names):
+            files.append(os.path.relpath(os.path.join(root, name), path))
+    return files
+
+class HashIndex(object):
+    """
+        Persistent cache of file digests keyed on (path, size, mtime, inode), so that the
+        files of large artifacts are only hashed again when they are modified.
+        Processes sharing the index file, such as the workers of generate_batch, merge their
+        entries with it when they save
+    """
+    def __init__(self, filename=None, threads=DEFAULT_THREADS):
+        self.filename = filename
+        self.threads = threads
+        self.entries = self._load(filename) if filename is not None else {}
+        self._modified = False
+        self._pruned = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(filename):
+        try:
+            with open(filename, 'rb') as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            return {}
+        return entries if version == INDEX_VERSION else {}
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        try:
+            lock = open(self.filename + '.lock', 'a')
+        except IOError:
+            # a read-only directory, where the index isn't saved anyway
+            yield
+            return
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+        finally:
+            lock.close()
+
+    def save(self):
+        """
+            Write the entries, merged with those other processes saved in the file meanwhile
+        """
+        if self.filename is not None and self._modified:
+            with self._lock:
+                entries = dict(self.entries)
+                pruned = self._pruned
+                self._modified = False
+                self._pruned = set()
+            with self._file_lock():
+                saved = self._load(self.filename)
+                for path in pruned:
+                    saved.pop(path, None)
+                saved.update(entries)
+                write_pickle(self.filename, (INDEX_VERSION, saved))
+
+    def file_digest(self, filename):
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime, stat.st_ino)
+        entry = self.entries.get(path)
+        if entry is not None and entry[:3] == key:
+            return entry[3]
+        digest = file_digest(path)
+        if stat.st_mtime < time.time() - RACY_DELAY:
+            with self._lock:
+                self.entries[path] = key + (digest,)
+                self._modified = True
+        return digest
+
+    def files_digests(self, filenames):
+        """
+            Digests of the files, hashed in a pool of threads
+        """
+        return thread_map(self.file_digest, filenames, self.threads)
+
+    def tree_digest(self, path):
+        """
+            Digest of a whole artifact: the digest of a file, or for a directory the digest of
+            the list of its files relative paths and digests
+        """
+        if not os.path.isdir(path):
+            return self.file_digest(path)
+        files = tree_files(path)
+        digests = self.files_digests([os.path.join(path, f) for f in files])
+        sha = hashlib.sha1()
+        for f, digest in zip(files, digests):
+            sha.update("{path}\0{digest}\n".format(path=f, digest=digest))
+        return sha.hexdigest()
+
+    def prune(self):
+        """
+            Forget the files which don't exist anymore
+        """
+        with self._lock:
+            for path in [p for p in self.entries if not os.path.exists(p)]:
+                del self.entries[path]
+                self._pruned.add(path)
+                self._modified = True
@@ -0,0 +1,143 @@
+import os
+import re
+from output import Instruction
+
+ADD_OPCODES = frozenset(['ADD', 'COPY'])
+# instructions a deferred ADD can be moved after: they don't use what it adds
+DEFERRABLE_OPCODES = frozenset(['ENV', 'WORKDIR'])
+MERGED_OPCODES = frozenset(['RUN', 'ENV'])
+
+def _is_shell_form(instruction):
+    return isinstance(instruction.argument, basestring) and not instruction.argument.lstrip().startswith('[') and not instruction.flags
+
+def _join_commands(commands):
+    # each RUN runs in its own shell: a subshell per command keeps its exit status, and
+    # keeps its cd, export or set from changing what the next commands run in
+    return ' && '.join('({command})'.format(command=c) for c in commands)
+
+def _env_pairs(argument):
+    """
+        "KEY value" as KEY="value"; an argument already made of KEY=value pairs is kept
+    """
+    parts = argument.split(None, 1)
+    if '=' in parts[0] or len(parts) == 1:
+        return argument
+    value = parts[1].replace('\\', '\\\\').replace('"', '\\"')
+    return '{key}="{value}"'.format(key=parts[0], value=value)
+
+def _env_keys(argument):
+    parts = argument.split(None, 1)
+    if '=' not in parts[0]:
+        return [parts[0]]
+    return [pair.split('=', 1)[0] for pair in re.findall(r'(?:[^\s"\\]|\\.|"(?:[^"\\]|\\.)*")+', argument)]
+
+def _references(argument, keys):
+    """
+        Whether an ENV argument uses one of the variables keys, whose value it would see
+        unchanged when merged with the ENV setting it
+    """
+    return any(re.search(r'\$(?:{key}\b|\{{{key}[}}:])'.format(key=re.escape(key)), argument) for key in keys)
+
+def _merge(group):
+    if len(group) == 1:
+        return group[0]
+    arguments = [instruction.argument for instruction in group]
+    if group[0].opcode == 'RUN':
+        return Instruction('RUN', _join_commands(arguments), ())
+    return Instruction('ENV', ' '.join(_env_pairs(a) for a in arguments), ())
+
+def merge_instructions(instructions):
+    """
+        Merge consecutive shell form RUN instructions, and consecutive ENV instructions not
+        using the variables the previous ones set, in one layer
+    """
+    merged = []
+    group = []
+    keys = set()
+    for instruction in instructions:
+        if group and (instruction.opcode != group[0].opcode or not _is_shell_form(instruction)
+                      or (instruction.opcode == 'ENV' and _references(instruction.argument, keys))):
+            merged.append(_merge(group))
+            group = []
+            keys.clear()
+        if instruction.opcode in MERGED_OPCODES and _is_shell_form(instruction):
+            group.append(instruction)
+            if instruction.opcode == 'ENV':
+                keys.update(_env_keys(instruction.argument))
+        else:
+            merged.append(instruction)
+    if group:
+        merged.append(_merge(group))
+    return merged
+
+def _split_add(instruction, dependencies, installs):
+    """
+        (source, ADD instructions of its dependency files) for an instruction adding a source
+        with dependency files and install commands, or None if the instruction can't be split
+    """
+    if instruction.opcode not in ADD_OPCODES or not _is_shell_form(instruction):
+        return None
+    arguments = instruction.argument.split()
+    if len(arguments) != 2:
+        return None
+    source, destination = arguments
+    source = os.path.normpath(source)
+    files = dependencies.get(source)
+    if not files or not installs.get(source) or not destination.startswith('/') or '$' in destination:
+        return None
+    adds = []
+    for dependency in files:
+        target = os.path.join(destination, os.path.dirname(dependency)).rstrip('/') + '/'
+        adds.append(Instruction(instruction.opcode, '{source} {target}'.format(source=os.path.join(arguments[0], dependency), target=target), ()))
+    return source, adds
+
+def _is_install(instruction, commands):
+    return instruction.opcode == 'RUN' and _is_shell_form(instruction) and any(instruction.argument.strip().startswith(c) for c in commands)
+
+def reorder_instructions(instructions, dependencies, installs=None):
+    """
+        Add first the dependency files of the sources in dependencies (source path in the build
+        context: dependency files relative to it), and move the ADD of the whole source after
+        the install commands of the source in installs (source path: commands) which follow it,
+        with the ENV and WORKDIR instructions around them, so that the installed dependencies
+        stay cached as long as the dependency files don't change. The source is added before
+        any other instruction, such as a RUN which may use it
+    """
+    installs = installs or {}
+    reordered = []
+    deferred = []
+    for instruction in instructions:
+        if deferred and not (instruction.opcode in DEFERRABLE_OPCODES or any(_is_install(instruction, installs[source]) for source, add in deferred)):
+            reordered.extend(add for source, add in deferred)
+            del deferred[:]
+        split = _split_add(instruction, dependencies, installs)
+        if split is None:
+            reordered.append(instruction)
+        else:
+            source, adds = split
+            reordered.extend(adds)
+            deferred.append((source, instruction))
+    reordered.extend(add for source, add in deferred)
+    return reordered
+
+def optimize_instructions(instructions, dependencies=None, installs=None):
+    return merge_instructions(reorder_instructions(instructions, dependencies or {}, installs))
+
+def _adds_dependency(instruction, dependency_files):
+    return _is_shell_form(instruction) and os.path.normpath(instruction.argument.split()[0]) in dependency_files
+
+class LayerCount(object):
+    """
+        Layers the Dockerfile of a container creates, one per instruction, and those rebuilt
+        when the artifacts other than the dependency files change, from the first ADD or COPY on
+    """
+    def __init__(self, container, dependencies=None):
+        dependency_files = set(os.path.join(source, f) for source, files in (dependencies or {}).items() for f in files)
+        trailing = (container.cmd is not None) + (container.entrypoint is not None) + bool(container.exposes)
+        self.layers = len(container.instructions) + trailing
+        adds = [k for k, instruction in enumerate(container.instructions)
+                if instruction.opcode in ADD_OPCODES and not _adds_dependency(instruction, dependency_files)]
+        self.volatile = len(container.instructions) - adds[0] + trailing if adds else 0
+
+    def __repr__(self):
+        return "{layers} layers, {volatile} rebuilt when the artifacts change".format(layers=self.layers, volatile=self.volatile)
@@ -0,0 +1,104 @@
+import json
+import os
+from assembly import Assembly, Component
+from baseimages import SharedBase
+from config import Config, CACHE_VERSION
+from hashindex import file_digest
+from output import Container, Instruction
+from plan import Plan
+from utils import write_json
+
+# the lockfile is a plain description of the containers, never unpickled
+LOCK_VERSION = 3
+
+def lockfile_path(planfile):
+    directory, name = os.path.split(planfile)
+    return os.path.join(directory, '.camp2docker.{name}.lock'.format(name=name))
+
+def _digests(planfile, config):
+    return [file_digest(planfile), Config.digest(config.path if isinstance(config, Config) else config)]
+
+def _instructions(instructions):
+    return [[i.opcode, i.argument] + list(i.flags) for i in instructions]
+
+def _describe_container(container):
+    return {
+        'name': container.name,
+        'base': container.base,
+        'instructions': _instructions(container.instructions),
+        'cmd': container.cmd,
+        'entrypoint': container.entrypoint,
+        'volumes': container.volumes,
+        'links': [link.name for link in container.links],
+        'exposes': container.exposes,
+    }
+
+def _load_container(description):
+    container = Container(description['name'], description['base'])
+    container.instructions = [Instruction.from_list(i) for i in description['instructions']]
+    container.cmd = description['cmd']
+    container.entrypoint = description['entrypoint']
+    container.volumes = description['volumes']
+    container.exposes = description['exposes']
+    return container
+
+def describe_assembly(assembly):
+    """
+        What running an assembly needs, as JSON data: its containers, their links and
+        the shared base images
+    """
+    return {
+        'containers': [_describe_container(c.container) for c in assembly.components],
+        'shared_bases': [{'base': shared.base, 'instructions': _instructions(shared.instructions)} for shared in assembly.shared_bases],
+    }
+
+def load_described_assembly(plan, description):
+    """
+        The assembly of a plan from its describe_assembly data
+    """
+    assembly = Assembly(plan)
+    containers = [_load_container(d) for d in description['containers']]
+    by_name = dict((c.name, c) for c in containers)
+    for container, d in zip(containers, description['containers']):
+        container.links = [by_name[name] for name in d['links']]
+        assembly.components.append(Component(None, None, container))
+    assembly.shared_bases = [SharedBase(d['base'], [Instruction.from_list(i) for i in d['instructions']]) for d in description['shared_bases']]
+    assembly.changed()
+    return assembly
+
+def write_lockfile(assembly, planfile, config='config'):
+    """
+        Save the description of the assembly of a plan next to it, with the digests of the
+        plan and configuration
+    """
+    write_json(lockfile_path(planfile), {
+        'version': [LOCK_VERSION, CACHE_VERSION],
+        'digests': _digests(planfile, config),
+        'assembly': describe_assembly(assembly),
+    })
+
+def read_lockfile(planfile, config='config'):
+    """
+        The assembly saved for a plan, None if there is none, if it was saved by another
+        version or if the plan or the configuration changed since
+    """
+    try:
+        with open(lockfile_path(planfile), 'rb') as f:
+            lock = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(lock, dict) or lock.get('version') != [LOCK_VERSION, CACHE_VERSION] or lock.get('digests') != _digests(planfile, config):
+        return None
+    try:
+        return load_described_assembly(Plan.from_file(planfile), lock['assembly'])
+    except (KeyError, TypeError, IndexError):
+        return None
+
+def load_assembly(planfile, config='config'):
+    """
+        The assembly saved for a plan if it is up to date, else the one processed from the plan
+    """
+    assembly = read_lockfile(planfile, config)
+    if assembly is None:
+        assembly = Assembly.from_plan(planfile, config)
+    return assembly
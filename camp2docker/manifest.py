@@ -0,0 +1,156 @@
+import errno
+import hashlib
+import json
+import os
+from materialize import Materializer
+from hashindex import HashIndex, tree_files
+
+MANIFEST_FILENAME = '.camp2docker.manifest'
+MANIFEST_VERSION = 2
+
+def content_digest(content):
+    return hashlib.sha1(content).hexdigest()
+
+def encode_path(path):
+    """
+        A path as JSON text: its bytes decoded as latin-1, so that any file name, UTF-8 or
+        not, is recorded and read back as is
+    """
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return path.decode('latin-1')
+
+def decode_path(name):
+    return name.encode('latin-1')
+
+def makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+class GenerationReport(object):
+    """
+        Paths, relative to the output directory, touched by a generation
+    """
+    def __init__(self):
+        self.written = []
+        self.unchanged = []
+        self.removed = []
+        # ContextSize of the build context of each component
+        self.contexts = {}
+
+    def __repr__(self):
+        return "{written} written, {unchanged} unchanged, {removed} removed".format(
+                written=len(self.written), unchanged=len(self.unchanged), removed=len(self.removed))
+
+class GenerationManifest(object):
+    """
+        Content hashes of the files generated or copied in an output directory.
+        A file is only written when its content differs from the one recorded by the
+        previous generation, and finish removes what was not generated again
+    """
+    def __init__(self, directory, previous=None, materializer=None, store=None, hash_index=None):
+        """
+            Copied files are hashed with the hash_index, and put in place by the materializer
+            or linked from the ArtifactStore when a store is given
+        """
+        self.directory = directory
+        self.previous = previous if previous is not None else {}
+        self.materializer = materializer if materializer is not None else Materializer()
+        self.store = store
+        self.hash_index = hash_index if hash_index is not None else HashIndex()
+        self.files = {}
+        self.report = GenerationReport()
+
+    @classmethod
+    def load(cls, directory, materializer=None, store=None, hash_index=None):
+        try:
+            with open(os.path.join(directory, MANIFEST_FILENAME), 'r') as f:
+                manifest = json.load(f)
+            files = manifest['files'] if manifest.get('version') == MANIFEST_VERSION else {}
+            previous = dict((decode_path(name), digest) for name, digest in files.items())
+        except (IOError, ValueError, KeyError, AttributeError, UnicodeError):
+            previous = {}
+        return cls(directory, previous, materializer, store, hash_index)
+
+    def _is_current(self, path, digest):
+        return self.previous.get(path) == digest and os.path.isfile(os.path.join(self.directory, path))
+
+    def _record(self, path, digest, changed):
+        self.files[path] = digest
+        if changed:
+            self.report.written.append(path)
+        else:
+            self.report.unchanged.append(path)
+
+    def write_file(self, path, content):
+        digest = content_digest(content)
+        changed = not self._is_current(path, digest)
+        if changed:
+            target = os.path.join(self.directory, path)
+            makedirs(os.path.dirname(target))
+            with open(target, 'w') as f:
+                f.write(content)
+        self._record(path, digest, changed)
+
+    def _copy(self, file):
+        source, path = file
+        digest = self.hash_index.file_digest(source)
+        changed = not self._is_current(path, digest)
+        if changed:
+            target = os.path.join(self.directory, path)
+            makedirs(os.path.dirname(target))
+            if self.store is not None:
+                self.store.put(source, digest)
+                self.store.link(digest, target)
+            else:
+                self.materializer.materialize(source, target)
+        return path, digest, changed
+
+    def copy_files(self, files):
+        """
+            Copy the (source, path) files, hashing and materializing them in the materializer thread pool
+        """
+        for path, digest, changed in self.materializer.map(self._copy, files):
+            self._record(path, digest, changed)
+
+    def copy_file(self, source, path):
+        self.copy_files([(source, path)])
+
+    def copy_tree(self, source, path):
+        self.copy_files([(os.path.join(source, f), os.path.join(path, f)) for f in tree_files(source)])
+
+    def finish(self):
+        """
+            Remove the files of the previous generation which were not generated again, and
+            the directories they leave empty, save the manifest and return the report.
+            Files the manifest never recorded are left in place
+        """
+        for path in sorted(self.previous):
+            if path in self.files:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, path))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+            self._remove_empty_parents(path)
+            self.report.removed.append(path)
+        self.save()
+        return self.report
+
+    def _remove_empty_parents(self, path):
+        parent = os.path.dirname(path)
+        while parent:
+            try:
+                os.rmdir(os.path.join(self.directory, parent))
+            except OSError:
+                return
+            parent = os.path.dirname(parent)
+
+    def save(self):
+        with open(os.path.join(self.directory, MANIFEST_FILENAME), 'w') as f:
+            files = dict((encode_path(path), digest) for path, digest in self.files.items())
+            json.dump({'version': MANIFEST_VERSION, 'files': files}, f, indent=1, sort_keys=True)
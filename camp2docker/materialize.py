@@ -0,0 +1,92 @@
+import errno
+import os
+import shutil
+import threading
+from utils import thread_map
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl cloning a file on copy-on-write filesystems (btrfs, xfs) on Linux
+FICLONE = 0x40049409
+STRATEGIES = ('auto', 'reflink', 'hardlink', 'copy')
+DEFAULT_STRATEGY = 'auto'
+DEFAULT_THREADS = 8
+
+class MaterializationError(Exception):
+    pass
+
+def reflink(source, target):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+    source = os.path.realpath(source)
+    with open(source, 'rb') as src:
+        try:
+            with open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except (IOError, OSError):
+            os.remove(target)
+            raise
+    shutil.copymode(source, target)
+
+def hardlink(source, target):
+    # link would link a symbolic link itself, which may dangle in the build context
+    os.link(os.path.realpath(source), target)
+
+def copy(source, target):
+    shutil.copy(source, target)
+
+_functions = {'reflink': reflink, 'hardlink': hardlink, 'copy': copy}
+# from the cheapest
+AUTO_STRATEGIES = ('reflink', 'hardlink', 'copy')
+
+class Materializer(object):
+    """
+        Put artifact files in the build contexts. With the auto strategy, the cheapest of
+        reflink, hardlink and copy is probed once per (source, target) filesystems pair, and
+        a file it fails for, such as a file with too many links, falls back to the next ones.
+        Symbolic links are always followed as the Docker daemon can't follow them out of
+        the build context.
+        Hardlinked files share their content with the artifact: they are replaced, never
+        written to, when the artifact changes
+    """
+    def __init__(self, strategy=DEFAULT_STRATEGY, threads=DEFAULT_THREADS):
+        if strategy not in STRATEGIES:
+            raise MaterializationError("Strategy {strategy} not in {strategies}".format(strategy=strategy, strategies=', '.join(STRATEGIES)))
+        self.strategy = strategy
+        self.threads = threads
+        self._filesystems_strategies = {}
+        self._lock = threading.Lock()
+
+    def materialize(self, source, target):
+        try:
+            os.remove(target)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        if self.strategy != 'auto':
+            return _functions[self.strategy](source, target)
+
+        key = (os.stat(source).st_dev, os.stat(os.path.dirname(target) or '.').st_dev)
+        with self._lock:
+            probed = self._filesystems_strategies.get(key)
+        strategies = AUTO_STRATEGIES[AUTO_STRATEGIES.index(probed):] if probed is not None else AUTO_STRATEGIES
+        for strategy in strategies[:-1]:
+            try:
+                _functions[strategy](source, target)
+            except (IOError, OSError):
+                continue
+            break
+        else:
+            strategy = 'copy'
+            copy(source, target)
+        if probed is None:
+            with self._lock:
+                self._filesystems_strategies[key] = strategy
+
+    def map(self, function, items):
+        """
+            Apply function to the items in the thread pool, keeping their order
+        """
+        return thread_map(function, items, self.threads)
@@ -0,0 +1,89 @@
+import logging
+import weakref
+from utils import thread_map
+from pull import Puller, base_images
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+class CycleException(Exception):
+    pass
+
+def dependency_waves(components):
+    """
+        Group the components in waves, each component only linking to components of the
+        previous waves. Raise CycleException when the links form a cycle
+    """
+    by_container = dict((c.container, c) for c in components)
+    dependencies = dict((c, set(by_container[link] for link in c.container.links if link in by_container)) for c in components)
+    waves = []
+    done = set()
+    remaining = list(components)
+    while remaining:
+        wave = [c for c in remaining if dependencies[c] <= done]
+        if not wave:
+            raise CycleException("Links cycle between {names}".format(names=', '.join(sorted(c.container.name for c in remaining))))
+        waves.append(wave)
+        done.update(wave)
+        remaining = [c for c in remaining if c not in done]
+    return waves
+
+class Orchestrator(object):
+    """
+        Runs the operations of an assembly on its components in parallel: the images are built
+        by up to workers at a time, and the containers are started a wave of linked components
+        after the other, and stopped or removed in the reverse order.
+        The missing base images are pulled by the Puller puller before building or starting.
+        The assembly is only referenced weakly, so that caching an orchestrator doesn't keep it
+        alive: the caller does
+    """
+    def __init__(self, assembly, client, workers=DEFAULT_WORKERS, puller=None):
+        self._assembly = weakref.ref(assembly)
+        self.client = client
+        self.workers = workers
+        self.puller = puller if puller is not None else Puller(client, workers)
+        self.waves = dependency_waves(assembly.components)
+        self._built = False
+
+    @property
+    def assembly(self):
+        assembly = self._assembly()
+        if assembly is None:
+            raise ReferenceError("The assembly of the orchestrator doesn't exist anymore")
+        return assembly
+
+    def pull(self):
+        statuses = self.puller.pull_all(base_images(self.assembly))
+        log.info("Base images: %d pulled, %d present", statuses.values().count('pulled'), statuses.values().count('present'))
+        return statuses
+
+    def build(self, plan_directory, hash_index=None, force=False, build_keys=None):
+        self.pull()
+        # builds the shared base images first
+        built = self.assembly.build(self.client, plan_directory, hash_index, force, self.workers, build_keys=build_keys)
+        self._built = True
+        return built
+
+    def _apply(self, operation, waves):
+        project = self.assembly.to_fig_project(self.client)
+        for wave in waves:
+            log.debug("%s %s", operation, ', '.join(c.container.name for c in wave))
+            thread_map(lambda c: getattr(project.get_service(c.container.name), operation)(), wave, self.workers)
+
+    def up(self):
+        # unless build just pulled the base images and built the shared ones
+        if not self._built:
+            self.pull()
+            self.assembly.build_shared_bases(self.client)
+        self._built = False
+        self._apply('recreate_containers', self.waves)
+
+    def start(self):
+        self._apply('start', self.waves)
+
+    def stop(self):
+        self._apply('stop', reversed(self.waves))
+
+    def rm(self):
+        self._apply('remove_stopped', reversed(self.waves))
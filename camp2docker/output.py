@@ -1,8 +1,55 @@
 import pystache
+from collections import namedtuple
 
 class InstructionError(Exception):
     pass
 
+_renderer = pystache.Renderer()
+_parsed_templates = {}
+
+def render_template(template, params):
+    """
+        Render a mustache template, parsing each distinct template only once.
+        Strings without any tag are returned as is
+    """
+    if '{{' not in template:
+        return template
+    try:
+        parsed_template = _parsed_templates[template]
+    except KeyError:
+        parsed_template = _parsed_templates[template] = pystache.parse(unicode(template))
+    return _renderer.render(parsed_template, params)
+
+BUILD_OPCODES = frozenset(['RUN', 'ADD'])
+
+class Instruction(namedtuple('Instruction', ['opcode', 'argument', 'flags'])):
+    """
+        An instruction of an action: ["OPCODE", argument, flags...] in the configuration.
+        Opcodes without a handler, including the ones Docker adds, are written as they are
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_list(cls, instruction):
+        return cls(instruction[0], instruction[1], tuple(instruction[2:]))
+
+    def render(self, params):
+        argument = render_template(self.argument, params) if type(self.argument) is str else self.argument
+        flags = tuple(render_template(flag, params) if type(flag) is str else flag for flag in self.flags)
+        return Instruction(self.opcode, argument, flags)
+
+def needs_build(instructions):
+    """
+        Whether instructions have to be built in an image, rather than running their base image
+    """
+    return any(instruction.opcode in BUILD_OPCODES for instruction in instructions)
+
+def compile_instructions(instructions):
+    """
+        Turn a list of configuration instructions into Instruction records
+    """
+    return [i if isinstance(i, Instruction) else Instruction.from_list(i) for i in instructions]
+
 class Container(object):
     def  __init__(self, name, base):
         self.name = name
@@ -22,36 +69,58 @@ class Container(object):
 
     @staticmethod
     def process_mustache_template_list(instruction, params):
-        return [pystache.render(elem, params) if type(elem) is str else elem for elem in instruction ]
+        return [render_template(elem, params) if type(elem) is str else elem for elem in instruction]
 
     def process_instructions(self, instructions, params, source_container):
-        for instruction in instructions:
-            instruction = self.process_mustache_template_list(instruction, params)
-            if not instruction[1]:
+        for instruction in compile_instructions(instructions):
+            instruction = instruction.render(params)
+            if not instruction.argument:
                 continue
-            if instruction[0] == 'VOLUME':
-                self.add_instruction(instruction)
-                self.add_volume(instruction[1:], source_container)
-            elif instruction[0] == 'LINK':
-                self.add_link(instruction[1], source_container)
-            elif instruction[0] == 'EXPOSE':
-                self.add_expose(instruction[1])
-            elif instruction[0] == 'CMD':
-                if self.cmd is None:
-                    self.cmd = instruction[1]
-                else:
-                    raise InstructionError("Two CMD")
-            elif instruction[0] == 'ENTRYPOINT':
-                if self.entrypoint is None:
-                    self.entrypoint = instruction[1]
-                else:
-                    raise InstructionError("Two ENTRYPOINT")
-            else:
-                self.add_instruction(instruction)
+            handler = self._handlers.get(instruction.opcode, Container._process_default)
+            handler(self, instruction, source_container)
+
+    def _process_volume(self, instruction, source_container):
+        self.add_instruction(instruction)
+        self.add_volume([instruction.argument] + list(instruction.flags), source_container)
+
+    def _process_link(self, instruction, source_container):
+        self.add_link(instruction.argument, source_container)
+
+    def _process_expose(self, instruction, source_container):
+        self.add_expose(instruction.argument)
+
+    def _process_cmd(self, instruction, source_container):
+        if self.cmd is None:
+            self.cmd = instruction.argument
+        else:
+            raise InstructionError("Two CMD")
+
+    def _process_entrypoint(self, instruction, source_container):
+        if self.entrypoint is None:
+            self.entrypoint = instruction.argument
+        else:
+            raise InstructionError("Two ENTRYPOINT")
+
+    def _process_default(self, instruction, source_container):
+        self.add_instruction(instruction)
+
+    _handlers = {
+        'VOLUME': _process_volume,
+        'LINK': _process_link,
+        'EXPOSE': _process_expose,
+        'CMD': _process_cmd,
+        'ENTRYPOINT': _process_entrypoint,
+    }
 
     def add_instruction(self, instruction):
+        if not isinstance(instruction, Instruction):
+            instruction = Instruction.from_list(instruction)
         self.instructions.append(instruction)
 
+    @property
+    def needs_build(self):
+        return needs_build(self.instructions)
+
     def add_expose(self, expose):
         self.exposes.append(expose)
 
@@ -64,20 +133,20 @@ class Container(object):
     def add_volume(self, volume, source_container):
         self.volumes.append(volume)
 
-    @property
-    def needs_build(self):
-        for i in self.instructions:
-            if i[0] in ["RUN", "ADD"]:
-                return True
-        return False
-
     def __repr__(self):
         res = "# {filename}".format(filename=self.name)
         for link in self.links:
             res += " -> {container_name}".format(container_name=link.name)
-        res+= "\nFROM {base_image}\n".format(base_image=self.base)
+        return res + "\n" + self.dockerfile
+
+    @property
+    def dockerfile(self):
+        """
+            The instructions of the Dockerfile, without the comment naming the container and its links
+        """
+        res = "FROM {base_image}\n".format(base_image=self.base)
         for instruction in self.instructions:
-            res+= "{INSTRUCTION_TYPE} {instruction_parameter}\n".format(INSTRUCTION_TYPE=instruction[0], instruction_parameter=instruction[1])
+            res+= "{INSTRUCTION_TYPE} {instruction_parameter}\n".format(INSTRUCTION_TYPE=instruction.opcode, instruction_parameter=instruction.argument)
         if self.cmd is not None:
             res+= "CMD {command}\n".format(command=self.cmd)
         if self.entrypoint is not None:
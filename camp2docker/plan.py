@@ -1,5 +1,5 @@
-from yaml import load
 import os
+from utils import load_yaml
 from config import Config
 from output import Container
 
@@ -37,14 +37,46 @@ class Plan(GeneralNode):
             services = kwargs.pop('services')
             self.services = ServiceSpecificationSet.from_dict_array(services)
         super(Plan, self).__init__(**kwargs)
+        self._services_by_id = self._index_services()
+
+    def _index_services(self):
+        """
+            Map the id of every service specification of the plan, in the artifacts
+            requirements or in the services, to the specification
+        """
+        specifications = [requirement.fulfillment for artifact in self.artifacts_or_empty for requirement in artifact.requirements_or_empty
+                if isinstance(getattr(requirement, 'fulfillment', None), ServiceSpecification)]
+        specifications.extend(self.services_or_empty)
+        index = {}
+        for specification in specifications:
+            if hasattr(specification, 'id'):
+                if specification.id in index:
+                    raise SpecificationException("Duplicate service id {id}".format(id=specification.id))
+                index[specification.id] = specification
+        return index
+
+    def find_service_by_id(self, id):
+        try:
+            return self._services_by_id[id]
+        except KeyError:
+            raise ServiceReferenceException("No service {id}".format(id=id))
+
+    @classmethod
+    def from_yaml(cls, stream, name):
+        """
+            Parse a plan from a YAML string or stream, named name when it has no name
+        """
+        plan = load_yaml(stream)
+        if not isinstance(plan, dict) or "camp_version" not in plan:
+            raise SpecificationException("A plan is a mapping with a camp_version")
+        if not plan.has_key("name"):
+            plan["name"] = name
+        return cls(**plan)
 
     @classmethod
     def from_file(cls, filename):
         with open(filename, 'r') as f:
-            plan = load(f)
-            if not plan.has_key("name"):
-                plan["name"] = os.path.split(filename)[1].split('.')[0]
-            return cls(**plan)
+            return cls.from_yaml(f, os.path.split(filename)[1].split('.')[0])
 
     @property
     def artifacts_or_empty(self):
@@ -100,24 +132,11 @@ class RequirementSpecification(Node):
         return dict((c,v) for c,v in self.__dict__.iteritems() if c not in ['requirement_type', 'fulfillment'])
 
     def service(self, plan):
-        if type(self.fulfillment) is ServiceSpecification:
-            return self.fulfillment
-        elif type(self.fulfillment) is str:
-            id = self.fulfillment.split('id:')[1]
-            for artifact in plan.artifacts_or_empty:
-                for requirement in artifact.requirements_or_empty:
-                    try:
-                        if requirement.fulfillment.id == id:
-                            return requirement.fulfillment
-                    except:
-                        pass
-            for service in plan.services_or_empty:
-                try:
-                    if service.id == id:
-                        return service
-                except:
-                    pass
-            raise ServiceReferenceException("No service {id}".format(id=id))
+        fulfillment = getattr(self, 'fulfillment', None)
+        if type(fulfillment) is ServiceSpecification:
+            return fulfillment
+        elif type(fulfillment) is str:
+            return plan.find_service_by_id(fulfillment.split('id:')[1])
 
 class ContentSpecification(Node):
     def __init__(self, **kwargs):
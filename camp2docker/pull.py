@@ -0,0 +1,77 @@
+import json
+import logging
+import time
+from requests.exceptions import RequestException
+from fig.packages.docker.utils import parse_repository_tag
+from context import inspect_image
+from utils import thread_map
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+class PullException(Exception):
+    pass
+
+def base_images(assembly):
+    """
+        The distinct images the components of an assembly run or are built from, in order.
+        Shared base images are built, so the images they are built from are pulled instead
+    """
+    shared_names = set(shared.name for shared in assembly.shared_bases)
+    images = [shared.base for shared in assembly.shared_bases]
+    images.extend(c.container.base for c in assembly.components if c.container.base not in shared_names)
+    distinct = []
+    for image in images:
+        if image not in distinct:
+            distinct.append(image)
+    return distinct
+
+class Puller(object):
+    """
+        Pulls images which are not present on the Docker daemon, up to workers at a time,
+        retrying a failed pull up to retries times, after backoff seconds doubled after each attempt
+    """
+    def __init__(self, client, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, sleep=time.sleep):
+        self.client = client
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def _pull_once(self, image):
+        repository, tag = parse_repository_tag(image)
+        for chunk in self.client.pull(repository, tag=tag or 'latest', stream=True):
+            for line in chunk.splitlines():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if 'error' in event:
+                    raise PullException("Can't pull {image}: {error}".format(image=image, error=event['error']))
+
+    def pull(self, image):
+        """
+            Pull an image unless it is present, and return 'present' or 'pulled'
+        """
+        if inspect_image(self.client, image) is not None:
+            return 'present'
+        delay = self.backoff
+        for attempt in range(1, self.retries + 2):
+            try:
+                log.info("Pulling %s...", image)
+                self._pull_once(image)
+                return 'pulled'
+            except (PullException, RequestException, ValueError) as e:
+                if attempt > self.retries:
+                    raise PullException("Can't pull {image} after {attempts} attempts: {error}".format(image=image, attempts=attempt, error=e))
+                log.warning("Pulling %s failed (%s), retrying in %.1fs", image, e, delay)
+                self.sleep(delay)
+                delay *= 2
+
+    def pull_all(self, images):
+        """
+            Pull the images concurrently, and return the status of each one by name
+        """
+        return dict(zip(images, thread_map(self.pull, images, self.workers)))
@@ -0,0 +1,64 @@
+import weakref
+from fig.cli.utils import docker_url
+from dockerclient import DockerClient
+from orchestrate import Orchestrator, DEFAULT_WORKERS
+from deploy import Deployment
+
+class Runtime(object):
+    """
+        Runs the lifecycle operations of many assemblies with one docker client, whose
+        connections are kept alive from an operation to the next, and an Orchestrator per
+        assembly, kept until the assembly changes
+    """
+    def __init__(self, client=None, workers=DEFAULT_WORKERS):
+        self.client = client if client is not None else DockerClient(docker_url(), pool_size=workers)
+        self.workers = workers
+        self._orchestrators = weakref.WeakKeyDictionary()
+
+    def orchestrator(self, assembly):
+        revision, orchestrator = self._orchestrators.get(assembly, (None, None))
+        if revision != assembly.revision:
+            orchestrator = Orchestrator(assembly, self.client, self.workers)
+            self._orchestrators[assembly] = (assembly.revision, orchestrator)
+        return orchestrator
+
+    def build(self, assembly, plan_directory, hash_index=None, force=False, build_keys=None):
+        return self.orchestrator(assembly).build(plan_directory, hash_index, force, build_keys)
+
+    def up(self, assembly):
+        self.orchestrator(assembly).up()
+
+    def deploy(self, assembly, plan_directory, hash_index=None, dry_run=False, build_keys=None):
+        """
+            Apply the assembly incrementally, or only plan the changes when dry_run, and
+            return the Change of each component
+        """
+        deployment = Deployment(self.orchestrator(assembly), plan_directory, hash_index, build_keys)
+        return deployment.plan() if dry_run else deployment.apply()
+
+    def start(self, assembly):
+        self.orchestrator(assembly).start()
+
+    def stop(self, assembly):
+        self.orchestrator(assembly).stop()
+
+    def rm(self, assembly):
+        self.orchestrator(assembly).rm()
+
+    def apply(self, operations, assemblies):
+        """
+            Run each of the operations, by name, on all the assemblies in turn
+        """
+        for operation in operations:
+            for assembly in assemblies:
+                getattr(self, operation)(assembly)
+
+    def close(self):
+        self._orchestrators.clear()
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
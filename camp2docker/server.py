@@ -0,0 +1,283 @@
+import BaseHTTPServer
+import SocketServer
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import traceback
+import urlparse
+from collections import OrderedDict
+from StringIO import StringIO
+from yaml import YAMLError
+from plan import Plan, SpecificationException, ArtifactTypeError, ServiceReferenceException
+from assembly import PlanProcessor, LinkException
+from config import Config, ConfigError, NoServiceException, NoArtifactException, NoRequirementException, ParameterException, NoActionException
+from materialize import Materializer
+from manifest import MANIFEST_FILENAME
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8042
+DEFAULT_INTERVAL = 1.0
+DEFAULT_TIMEOUT = 60.0
+
+# configuration of the conversions in this process, and the digest of its files
+_config = None
+_digest = None
+
+class RequestException(Exception):
+    pass
+
+# errors of the posted plan or query, answered with 400
+REQUEST_ERRORS = (RequestException, YAMLError, SpecificationException, ArtifactTypeError, ServiceReferenceException, LinkException,
+                  ConfigError, NoServiceException, NoArtifactException, NoRequirementException, ParameterException, NoActionException)
+
+def is_within(path, directory):
+    """
+        Whether path, once its symbolic links are resolved, is directory or under it
+    """
+    path = os.path.realpath(path)
+    directory = os.path.realpath(directory)
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+def resolve_directory(root, directory):
+    """
+        The directory of the query, relative to root, which it must not escape
+    """
+    path = os.path.join(root, directory)
+    if os.path.isabs(directory) or not is_within(path, root):
+        raise RequestException("The directory {directory} is not under the served root".format(directory=directory))
+    return os.path.realpath(path)
+
+def _check_artifacts(assembly, directory):
+    """
+        Make sure the artifacts of the assembly, and the files they are made of, are in directory
+    """
+    for component in assembly.components:
+        for artifact in component.artifacts:
+            href = getattr(artifact, 'href', None)
+            if href is not None and (os.path.isabs(href) or not is_within(os.path.join(directory, href), directory)):
+                raise RequestException("The artifact {href} is not under the plan directory".format(href=href))
+        for name, source in component.context_files(directory):
+            if not is_within(source, directory):
+                raise RequestException("The artifact file {name} is not under the plan directory".format(name=name))
+
+def _assembly(plan_yaml, options):
+    plan = Plan.from_yaml(plan_yaml, options['name'])
+    assembly = PlanProcessor(plan, _config).process_plan()
+    _check_artifacts(assembly, options['directory'])
+    if options['optimize_layers']:
+        assembly.optimize_layers(options['directory'])
+    if options['shared_bases']:
+        assembly.share_base_images()
+    return assembly
+
+def convert(plan_yaml, options):
+    """
+        The fig file and the Dockerfiles of a plan, as a JSON document
+    """
+    assembly = _assembly(plan_yaml, options)
+    return json.dumps(OrderedDict([
+        ('name', assembly.plan.name),
+        ('fig', assembly.to_fig()),
+        ('dockerfiles', OrderedDict((c.container.name, str(c.container)) for c in assembly.components)),
+        ('shared_bases', OrderedDict((shared.name, shared.dockerfile) for shared in assembly.shared_bases)),
+    ]))
+
+def archive(plan_yaml, options):
+    """
+        The directory generate writes for a plan, as a gzipped tar archive
+    """
+    assembly = _assembly(plan_yaml, options)
+    output = tempfile.mkdtemp()
+    try:
+        assembly.generate_files(options['directory'], output, Materializer('copy'))
+        data = StringIO()
+        tar = tarfile.open(fileobj=data, mode='w:gz')
+        try:
+            tar.add(os.path.join(output, assembly.plan.name), assembly.plan.name, filter=lambda info: None if os.path.basename(info.name) == MANIFEST_FILENAME else info)
+        finally:
+            tar.close()
+        return data.getvalue()
+    finally:
+        shutil.rmtree(output)
+
+def _load_config(path, digest):
+    """
+        Load the configuration of path in this process, unless the one of digest is loaded
+    """
+    global _config, _digest
+    if digest != _digest:
+        _config = Config.from_path(path)
+        _digest = digest
+
+def _run(args):
+    function, plan_yaml, options, path, digest = args
+    try:
+        _load_config(path, digest)
+        return function(plan_yaml, options), 200
+    except REQUEST_ERRORS as e:
+        return "{error}: {message}".format(error=type(e).__name__, message=e), 400
+    except Exception:
+        log.error("Conversion failed\n%s", traceback.format_exc())
+        return "Internal error", 500
+
+class Converter(object):
+    """
+        Runs conversions with the configuration of path, reloaded when its files change.
+        A watcher thread checks them every interval seconds. The conversions run in a pool of
+        worker processes, forked once before any other thread starts, which load the new
+        configuration before their next conversion; a conversion taking more than timeout
+        seconds is given up. With one worker, the conversions run in the calling thread
+    """
+    def __init__(self, path='config', workers=None, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.workers = workers
+        self.interval = interval
+        self.timeout = timeout
+        self.reloads = 0
+        self._digest = None
+        self._failed_digest = None
+        self._lock = threading.Lock()
+        self.refresh()
+        # forked with the loaded configuration, while this is the only thread
+        self._pool = None if workers == 1 else multiprocessing.Pool(workers)
+        self._closed = threading.Event()
+        self._watcher = threading.Thread(target=self._watch)
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def refresh(self):
+        """
+            Reload the configuration if its files changed; the workers reload it in turn.
+            A configuration which doesn't load is logged, and the previous one is kept
+        """
+        digest = Config.digest(self.path)
+        if digest in (self._digest, self._failed_digest):
+            return
+        try:
+            with self._lock:
+                log.info("Loading the configuration from %s", self.path)
+                _load_config(self.path, digest)
+        except Exception:
+            self._failed_digest = digest
+            log.error("Can't load the configuration from %s, keeping the previous one\n%s", self.path, traceback.format_exc())
+            return
+        self._digest = digest
+        self.reloads += 1
+
+    def _watch(self):
+        while not self._closed.wait(self.interval):
+            self.refresh()
+
+    def run(self, function, plan_yaml, options):
+        """
+            Apply function to a plan and its options, and return (result, status): the result
+            and 200 on success, or a short error message and 400 for an invalid request, 500
+            for an internal failure, 503 when the conversion times out
+        """
+        args = (function, plan_yaml, options, self.path, self._digest)
+        if self._pool is None:
+            return _run(args)
+        try:
+            return self._pool.apply_async(_run, [args]).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            log.error("Conversion timed out after %.1fs", self.timeout)
+            return "Conversion timed out", 503
+
+    def close(self):
+        self._closed.set()
+        self._watcher.join()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+
+class ConversionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+        POST a plan to /assembly for its fig file and Dockerfiles in JSON, or to /archive for
+        the tar.gz of its generated directory. The query may give the name of the plan, the
+        directory its artifacts are relative to, under the root of the server, optimize_layers
+        and shared_bases
+    """
+    protocol_version = 'HTTP/1.1'
+    routes = {
+        '/assembly': (convert, 'application/json'),
+        '/archive': (archive, 'application/x-gzip'),
+    }
+
+    def log_message(self, format, *args):
+        log.debug("%s %s", self.address_string(), format % args)
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            # the body isn't read
+            self.close_connection = 1
+        if length is None:
+            self.send(411, 'application/json', json.dumps({'error': "The plan must be posted with a Content-Length"}))
+            return
+        if not length.isdigit():
+            self.send(400, 'application/json', json.dumps({'error': "Invalid Content-Length {length}".format(length=length)}))
+            return
+        plan_yaml = self.rfile.read(int(length))
+        if url.path not in self.routes:
+            self.send(404, 'application/json', json.dumps({'error': "No route {path}".format(path=url.path)}))
+            return
+        function, content_type = self.routes[url.path]
+        try:
+            directory = resolve_directory(self.server.root, query.get('directory', '.'))
+        except RequestException as e:
+            self.send(400, 'application/json', json.dumps({'error': str(e)}))
+            return
+        options = {
+            'name': query.get('name', 'plan'),
+            'directory': directory,
+            'optimize_layers': query.get('optimize_layers') in ('1', 'true'),
+            'shared_bases': query.get('shared_bases') in ('1', 'true'),
+        }
+        result, status = self.server.converter.run(function, plan_yaml, options)
+        if status != 200:
+            self.send(status, 'application/json', json.dumps({'error': result}))
+        else:
+            self.send(200, content_type, result)
+
+class ConversionServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        Serves the conversions of a Converter, reading the artifacts under the directory root only
+    """
+    daemon_threads = True
+
+    def __init__(self, address, converter, root='.'):
+        BaseHTTPServer.HTTPServer.__init__(self, address, ConversionHandler)
+        self.converter = converter
+        self.root = os.path.realpath(root)
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, config='config', workers=None, root='.'):
+    """
+        Serve conversions on host:port until interrupted, the plans artifacts being under root
+    """
+    converter = Converter(config, workers)
+    server = ConversionServer((host, port), converter, root)
+    log.info("Serving on http://%s:%d, artifacts under %s", host, server.server_address[1], server.root)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        converter.close()
@@ -0,0 +1,108 @@
+import errno
+import os
+import shutil
+import tempfile
+import time
+from manifest import GenerationManifest, makedirs
+from materialize import reflink, copy
+
+STORE_DIRECTORY = '.camp2docker-store'
+TEMP_PREFIX = '.tmp'
+
+def _older_than(path, start):
+    """
+        Whether path was last changed, or renamed, before start; False if it is gone
+    """
+    try:
+        return os.stat(path).st_ctime < start
+    except OSError:
+        return False
+
+class ArtifactStore(object):
+    """
+        Content-addressed store of the artifact files of the plans generated in an output directory.
+        Each distinct file is stored once, named by its sha1, and hardlinked into the build contexts.
+        Files are reflinked or copied into the store, never hardlinked, so that modifying an
+        artifact can't change a stored object
+    """
+    def __init__(self, output_directory):
+        self.output_directory = output_directory
+        self.directory = os.path.join(output_directory, STORE_DIRECTORY)
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def put(self, source, digest):
+        path = self.object_path(digest)
+        if os.path.isfile(path):
+            return path
+        makedirs(os.path.dirname(path))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        os.close(fd)
+        try:
+            try:
+                reflink(source, temp_path)
+            except (IOError, OSError):
+                copy(source, temp_path)
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def link(self, digest, target):
+        try:
+            os.remove(target)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        try:
+            os.link(self.object_path(digest), target)
+        except OSError:
+            shutil.copy(self.object_path(digest), target)
+
+    def referenced_digests(self):
+        """
+            The digests recorded by the generation manifests of the plans of the output directory
+        """
+        digests = set()
+        for name in os.listdir(self.output_directory):
+            directory = os.path.join(self.output_directory, name)
+            if name != STORE_DIRECTORY and os.path.isdir(directory):
+                digests.update(GenerationManifest.load(directory).previous.itervalues())
+        return digests
+
+    def collect_garbage(self):
+        """
+            Remove the objects no plan of the output directory references, and return their digests.
+            The files being put, or stored since the collection started, are left alone, as the
+            generations running meanwhile may reference them
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        start = time.time()
+        referenced = self.referenced_digests()
+        removed = []
+        for prefix in sorted(os.listdir(self.directory)):
+            prefix_directory = os.path.join(self.directory, prefix)
+            if not os.path.isdir(prefix_directory):
+                continue
+            for name in sorted(os.listdir(prefix_directory)):
+                digest = prefix + name
+                path = os.path.join(prefix_directory, name)
+                if digest in referenced or name.startswith(TEMP_PREFIX) or not _older_than(path, start):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    continue
+                removed.append(digest)
+            if not os.listdir(prefix_directory) and _older_than(prefix_directory, start):
+                try:
+                    os.rmdir(prefix_directory)
+                except OSError:
+                    pass
+        return removed
@@ -1,3 +1,85 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import cPickle as pickle
+import yaml
+from multiprocessing.pool import ThreadPool
+
+try:
+    YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    YamlLoader = yaml.SafeLoader
+
+PARALLEL_LOADING_THRESHOLD = 64
+
+def load_yaml(stream, loader=None):
+    """
+        Parse a YAML stream with the libyaml safe loader when available
+    """
+    return yaml.load(stream, Loader=loader or YamlLoader)
+
+def load_yaml_file(filename, loader=None):
+    with open(filename, 'r') as f:
+        return load_yaml(f, loader)
+
+def load_yaml_files(filenames, processes=None, threshold=None):
+    """
+        Parse YAML files, in a process pool when there are at least threshold
+        (PARALLEL_LOADING_THRESHOLD by default) files.
+        The documents are returned in the order of filenames
+    """
+    if threshold is None:
+        threshold = PARALLEL_LOADING_THRESHOLD
+    if len(filenames) < threshold:
+        return [load_yaml_file(filename) for filename in filenames]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(load_yaml_file, filenames)
+    finally:
+        pool.close()
+        pool.join()
+
+def thread_map(function, items, threads):
+    """
+        Apply function to the items in a pool of threads, keeping their order
+    """
+    if threads <= 1 or len(items) < 2:
+        return [function(item) for item in items]
+    pool = ThreadPool(min(threads, len(items)))
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+def _write_atomically(filename, dump, errors):
+    directory, name = os.path.split(filename)
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory or '.', prefix=name)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            dump(f)
+        os.rename(temp_path, filename)
+    except BaseException as e:
+        os.remove(temp_path)
+        if not isinstance(e, (OSError, IOError) + errors):
+            raise
+
+def write_pickle(filename, data):
+    """
+        Write data atomically; a read-only directory only disables caching
+    """
+    _write_atomically(filename, lambda f: pickle.dump(data, f, pickle.HIGHEST_PROTOCOL), (pickle.PicklingError,))
+
+def write_json(filename, data):
+    """
+        Write data as JSON atomically; a read-only directory only disables caching
+    """
+    _write_atomically(filename, lambda f: json.dump(data, f, sort_keys=True), (TypeError, ValueError))
+
 def mustach_dict(d):
     res = {}
 
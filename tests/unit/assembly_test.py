@@ -1,17 +1,156 @@
 import unittest
+import os
+import re
+import shutil
+import tempfile
 from mock import Mock, patch
+from fig.packages.docker.client import Client
+from StringIO import StringIO
 from camp2docker.plan import Plan
-from camp2docker.assembly import Component
+from camp2docker.config import Config
+from camp2docker.assembly import Assembly, Component, PlanProcessor
+from camp2docker.hashindex import HashIndex, INDEX_FILENAME
+from camp2docker.context import BASE_ID_LABEL
+from camp2docker.output import Container
+from fake_daemon import FakeDaemon
 
 class PlanProcessorTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.plan = Plan.from_file('tests/fixtures/app.yaml')
+        cls.config = Config.from_path('tests/fixtures/config')
 
     def setUp(self):
-        self.pp = PlanProcessor(self.plan)
+        self.pp = PlanProcessor(self.plan, self.config)
+
+    def test_process_plan(self):
+        assembly = self.pp.process_plan()
+        self.assertEqual([c.container.name for c in assembly.components], ['nodejs', 'mongodb'])
+        nodejs, mongodb = assembly.components
+        self.assertEqual(nodejs.container.links, [mongodb.container])
+        self.assertIs(assembly.search_component(self.plan.find_service_by_id('mongo')), mongodb)
+
+    def test_to_fig(self):
+        expected = "nodejs:\n  build: nodejs\n  links:\n    - mongodb\n  ports:\n    - \"3000:3000\"\nmongodb:\n  build: mongodb\n"
+        self.assertEqual(self.pp.process_plan().to_fig(), expected)
+
+    def test_optimize_layers(self):
+        assembly = self.pp.process_plan()
+        counts = assembly.optimize_layers('tests/fixtures')
+        self.assertEqual(counts.keys(), ['nodejs', 'mongodb'])
+        before, after = counts['nodejs']
+        self.assertEqual(after.layers, before.layers - 1)
+        self.assertEqual([i.opcode for i in assembly.components[0].container.instructions], ['ADD', 'WORKDIR', 'RUN', 'ENV'])
+
+class AssemblyTest(unittest.TestCase):
+    def setUp(self):
+        self.assembly = Assembly(Mock())
+        self.service_config = Mock()
+        self.service_config.name = 'nodejs'
+        self.service_config.base = 'node'
+
+    def test_add_component(self):
+        specification = Mock()
+        component = self.assembly.add_component(specification, self.service_config)
+        self.assertIs(self.assembly.add_component(specification, self.service_config), component)
+        self.assertIs(self.assembly.search_component(specification), component)
+        self.assertEqual(self.assembly.components, [component])
+
+    @patch('camp2docker.assembly.Orchestrator')
+    def test_lifecycle_orchestrated(self, Orchestrator):
+        client = Mock()
+        self.assembly.run(client)
+        Orchestrator.assert_called_once_with(self.assembly, client)
+        Orchestrator.return_value.up.assert_called_once_with()
+        self.assembly.rm(client)
+        Orchestrator.return_value.rm.assert_called_once_with()
+
+    def test_add_component_without_specification(self):
+        first = self.assembly.add_component(None, self.service_config)
+        second = self.assembly.add_component(None, self.service_config)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.assembly.components, [first, second])
+
+    def test_search_non_existing_component(self):
+        self.assertIsNone(self.assembly.search_component(Mock()))
+
+    def test_fig_project_memoized(self):
+        self.assembly.plan.name = 'app'
+        self.assembly.add_component(None, self.service_config)
+        client = Mock()
+        project = self.assembly.to_fig_project(client)
+        self.assertIs(self.assembly.to_fig_project(client), project)
+        self.assertIsNot(self.assembly.to_fig_project(Mock()), project)
+        service_dicts = self.assembly.to_service_dicts
+        revision = self.assembly.revision
+        self.assembly.changed()
+        self.assertEqual(self.assembly.revision, revision + 1)
+        self.assertIsNot(self.assembly.to_service_dicts, service_dicts)
+        self.assertEqual(self.assembly.to_service_dicts, service_dicts)
+
+    def add_built_component(self, name, instructions):
+        service_config = Mock(base='node')
+        service_config.name = name
+        component = self.assembly.add_component(None, service_config)
+        for instruction in instructions:
+            component.container.add_instruction(instruction)
+        return component
+
+    def test_share_base_images(self):
+        first = self.add_built_component('first', [['RUN', 'npm install -g forever'], ['ADD', 'first /src/']])
+        second = self.add_built_component('second', [['RUN', 'npm install -g forever'], ['ADD', 'second /src/']])
+        shared, = self.assembly.share_base_images()
+        self.assertEqual(first.container.base, shared.name)
+        self.assertEqual(second.container.base, shared.name)
+        self.assertEqual([i.opcode for i in second.container.instructions], ['ADD'])
+        images = {'node': {'Id': 'node0000'}}
+        with patch('camp2docker.assembly.inspect_image', side_effect=lambda client, name: images.get(name)), patch('camp2docker.assembly.build_image') as build_image:
+            self.assembly.build_shared_bases(Mock(), labels=False)
+            self.assertEqual(build_image.call_args[1]['tag'], shared.name)
+            self.assertNotIn('LABEL', build_image.call_args[1]['fileobj'].getvalue())
+            images[shared.name] = {'Id': '0123456789ab'}
+            self.assembly.build_shared_bases(Mock(), labels=False)
+            self.assertEqual(build_image.call_count, 1)
+
+    def test_build_shared_bases_updated_base(self):
+        self.add_built_component('first', [['RUN', 'npm install -g forever'], ['ADD', 'first /src/']])
+        self.add_built_component('second', [['RUN', 'npm install -g forever'], ['ADD', 'second /src/']])
+        shared, = self.assembly.share_base_images()
+        images = {'node': {'Id': 'node0000'}}
+
+        def build_image(client, name, output, fileobj, tag):
+            labels = dict(re.findall(r'^LABEL (\S+)="(.*)"$', fileobj.getvalue(), re.M))
+            images[tag] = {'Id': 'built', 'Config': {'Labels': labels}}
+        with patch('camp2docker.assembly.inspect_image', side_effect=lambda client, name: images.get(name)), patch('camp2docker.assembly.build_image', side_effect=build_image) as build:
+            self.assembly.build_shared_bases(Mock(), labels=True)
+            self.assertEqual(images[shared.name]['Config']['Labels'], {BASE_ID_LABEL: 'node0000'})
+            self.assembly.build_shared_bases(Mock(), labels=True)
+            self.assertEqual(build.call_count, 1)
+            images['node'] = {'Id': 'node0001'}
+            self.assembly.build_shared_bases(Mock(), labels=True)
+            self.assertEqual(build.call_count, 2)
+            self.assertEqual(images[shared.name]['Config']['Labels'], {BASE_ID_LABEL: 'node0001'})
+
+    def test_share_base_images_whole_container(self):
+        first = self.add_built_component('first', [['RUN', 'npm install -g forever']])
+        second = self.add_built_component('second', [['RUN', 'npm install -g forever'], ['ADD', 'second /src/']])
+        shared, = self.assembly.share_base_images()
+        self.assertFalse(first.container.needs_build)
+        self.assertTrue(second.container.needs_build)
+        self.assertIn("image: {name}".format(name=shared.name), self.assembly.to_fig())
 
 class ComponentTest(unittest.TestCase):
+    @patch('camp2docker.assembly.Component.context_digest', return_value='context')
+    def test_build_key_ignores_links(self, context_digest):
+        container = Container('nodejs', 'node')
+        container.add_instruction(['RUN', 'npm install'])
+        component = Component(None, None, container)
+        key = component.build_key('plans', None, 'node0000')
+        container.links.append(Container('mongodb', 'dockerfile/mongodb'))
+        self.assertEqual(component.build_key('plans', None, 'node0000'), key)
+        container.add_instruction(['RUN', 'npm test'])
+        self.assertNotEqual(component.build_key('plans', None, 'node0000'), key)
+
     @patch('camp2docker.assembly.Container.from_service', return_value=Mock(name='mongodb', base='dockerfile/mongodb'))
     @patch('camp2docker.config.ServiceConfig')
     @patch('camp2docker.plan.ServiceSpecification')
@@ -37,3 +176,107 @@ class ComponentTest(unittest.TestCase):
         self.assertEqual(component.service_config, service_config)
         self.assertEqual(component.container, container)
         self.assertEqual(component.artifacts, set(["app.js"]))
+
+    @patch('camp2docker.config.ServiceConfig')
+    @patch('camp2docker.output.Container')
+    def test_artifacts_digest(self, Container, ServiceConfig):
+        hash_index = Mock()
+        hash_index.tree_digest.side_effect = lambda path: path
+        first = Component(None, ServiceConfig(), Container(), [Mock(href='dump'), Mock(href='app.js')])
+        second = Component(None, ServiceConfig(), Container(), [Mock(href='app.js'), Mock(href='dump')])
+        self.assertEqual(first.artifacts_digest('plans', hash_index), second.artifacts_digest('plans', hash_index))
+        hash_index.tree_digest.assert_any_call('plans/dump')
+
+    @patch('camp2docker.config.ServiceConfig')
+    @patch('camp2docker.output.Container')
+    def test_add_artifact(self, Container, ServiceConfig):
+        component = Component(None, ServiceConfig(), Container())
+        app, dump = Mock(href='app/'), Mock(href='dump')
+        component.add_artifact(app, ['node_modules', '.git'])
+        component.add_artifact(dump)
+        self.assertEqual(component.artifacts, set([app, dump]))
+        self.assertEqual(component.ignore, set(['app/node_modules', 'app/.git']))
+
+    @patch('camp2docker.config.ServiceConfig')
+    @patch('camp2docker.output.Container')
+    def test_dependency_files(self, Container, ServiceConfig):
+        component = Component(None, ServiceConfig(), Container())
+        component.add_artifact(Mock(href='app'), dependencies=['package.json', 'npm-shrinkwrap.json'], install=['npm install'])
+        component.add_artifact(Mock(href='dump'), dependencies=['package.json'])
+        self.assertEqual(component.installs, {'app': ['npm install']})
+        with patch('os.path.isfile', side_effect=lambda path: path == 'plans/app/package.json'):
+            self.assertEqual(component.dependency_files('plans'), {'app': ['package.json']})
+
+class AssemblyBuildTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.config = Config.from_path('tests/fixtures/config')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/fixtures/app.yaml') as f:
+            plan = f.read().replace('#name: app', 'name: app')
+        self.planfile = os.path.join(self.directory, 'app.yaml')
+        with open(self.planfile, 'w') as f:
+            f.write(plan)
+        self.write('app.js', "console.log('camp2docker');\n")
+        os.mkdir(os.path.join(self.directory, 'dump'))
+        self.write(os.path.join('dump', 'collection.bson'), 'documents')
+        self.daemon = FakeDaemon().start()
+        self.daemon.images['node'] = {'Id': 'node0000'}
+        self.daemon.images['dockerfile/mongodb'] = {'Id': 'mongodb0000'}
+        self.client = Client(self.daemon.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def build(self, **kwargs):
+        assembly = Assembly.from_plan(self.planfile, self.config)
+        with patch('sys.stdout', StringIO()):
+            return assembly.build(self.client, self.directory, HashIndex(), **kwargs)
+
+    def test_build_skips_unchanged(self):
+        self.assertEqual(self.build(), ['nodejs', 'mongodb'])
+        self.assertIn('camp2docker.build-key', self.daemon.images['app_nodejs']['Config']['Labels'])
+        self.assertEqual(self.build(), [])
+        self.write('app.js', "console.log('changed');\n")
+        self.assertEqual(self.build(), ['nodejs'])
+        self.assertEqual(self.build(force=True), ['nodejs', 'mongodb'])
+        self.assertEqual(len(self.daemon.builds), 5)
+
+    def test_build_base_changed(self):
+        self.build()
+        self.daemon.images['node'] = {'Id': 'node0001'}
+        self.assertEqual(self.build(), ['nodejs'])
+
+    def test_build_pulls_missing_base_first(self):
+        del self.daemon.images['node']
+        self.assertEqual(self.build(), ['nodejs', 'mongodb'])
+        self.assertEqual(self.daemon.pulls, ['node:latest'])
+        self.assertEqual(self.build(), [])
+
+    def test_build_without_labels(self):
+        self.daemon.api_version = '1.17'
+        self.assertEqual(self.build(), ['nodejs', 'mongodb'])
+        self.assertEqual(self.build(), ['nodejs', 'mongodb'])
+        self.assertNotIn('LABEL', self.daemon.builds[0]['files']['Dockerfile'])
+        self.daemon.api_version = '1.18'
+        self.assertEqual(self.build(build_keys=False), ['nodejs', 'mongodb'])
+
+    def test_build_persists_hash_index(self):
+        os.utime(os.path.join(self.directory, 'app.js'), (0, 0))
+        assembly = Assembly.from_plan(self.planfile, self.config)
+        with patch('sys.stdout', StringIO()):
+            assembly.build(self.client, self.directory)
+        index = HashIndex(os.path.join(self.directory, INDEX_FILENAME))
+        self.assertIn(os.path.join(self.directory, 'app.js'), index.entries)
+
+    def test_build_parallel(self):
+        self.assertEqual(self.build(workers=2), ['nodejs', 'mongodb'])
+        self.assertEqual(sorted(build['tag'] for build in self.daemon.builds), ['app_mongodb', 'app_nodejs'])
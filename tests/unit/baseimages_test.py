@@ -0,0 +1,59 @@
+import unittest
+from camp2docker.baseimages import BaseImagePlanner, SharedBase, instruction_prefix
+from camp2docker.output import Container
+
+def container(name, base, instructions):
+    c = Container(name, base)
+    for instruction in instructions:
+        c.add_instruction(instruction)
+    return c
+
+class InstructionPrefixTest(unittest.TestCase):
+    def test_prefix_stops_at_add(self):
+        c = container('nodejs', 'node', [['WORKDIR', '/src'], ['RUN', 'npm install -g forever'], ['ADD', 'app /src/'], ['RUN', 'npm install']])
+        self.assertEqual([i.opcode for i in instruction_prefix(c)], ['WORKDIR', 'RUN'])
+
+class BaseImagePlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.first = container('first', 'node', [['RUN', 'apt-get update'], ['RUN', 'npm install -g forever'], ['ENV', 'NODE_ENV production'], ['ADD', 'first /src/']])
+        self.second = container('second', 'node', [['RUN', 'apt-get update'], ['RUN', 'npm install -g forever'], ['ENV', 'NODE_ENV production'], ['RUN', 'npm install']])
+        self.third = container('third', 'node', [['RUN', 'apt-get update'], ['RUN', 'npm install -g grunt']])
+        self.other = container('mongodb', 'dockerfile/mongodb', [['RUN', 'apt-get update']])
+        self.planner = BaseImagePlanner()
+        for c in (self.first, self.second, self.third, self.other):
+            self.planner.add_container(c)
+
+    def test_shared_base(self):
+        shared = self.planner.shared_base(self.first)
+        self.assertEqual(shared.base, 'node')
+        self.assertEqual([i.argument for i in shared.instructions], ['apt-get update', 'npm install -g forever'])
+        self.assertEqual(self.planner.shared_base(self.second), shared)
+        self.assertEqual([i.argument for i in self.planner.shared_base(self.third).instructions], ['apt-get update'])
+        self.assertIsNone(self.planner.shared_base(self.other))
+
+    def test_rewrite(self):
+        shared = self.planner.rewrite(self.first)
+        self.assertEqual(self.first.base, shared.name)
+        self.assertEqual([i.opcode for i in self.first.instructions], ['ENV', 'ADD'])
+        self.assertIsNone(self.planner.rewrite(self.other))
+        self.assertEqual(self.other.base, 'dockerfile/mongodb')
+
+    def test_rewrite_keeps_unbuilt_rest(self):
+        planner = BaseImagePlanner()
+        first = container('first', 'node', [['RUN', 'apt-get update'], ['ENV', 'NODE_ENV production']])
+        second = container('second', 'node', [['RUN', 'apt-get update'], ['ADD', 'second /src/']])
+        planner.add_container(first)
+        planner.add_container(second)
+        self.assertIsNone(planner.rewrite(first))
+        self.assertEqual(first.base, 'node')
+        self.assertTrue(first.needs_build)
+        self.assertIsNotNone(planner.rewrite(second))
+
+class SharedBaseTest(unittest.TestCase):
+    def test_name(self):
+        first = SharedBase('node', container('a', 'node', [['RUN', 'apt-get update']]).instructions)
+        second = SharedBase('node', container('b', 'node', [['RUN', 'apt-get update']]).instructions)
+        self.assertEqual(first.name, second.name)
+        self.assertTrue(first.name.startswith('camp2docker_base_'))
+        self.assertEqual(first.dockerfile, "FROM node\nRUN apt-get update\n")
+        self.assertNotEqual(first.name, SharedBase('node:0.10', first.instructions).name)
@@ -0,0 +1,132 @@
+import unittest
+import os
+import shutil
+import tempfile
+from camp2docker.batch import find_plans, generate_batch
+from camp2docker.config import Config
+from camp2docker.hashindex import HashIndex, INDEX_FILENAME
+
+PLAN = """name: {name}
+camp_version: CAMP 1.1
+artifacts:
+    -
+        artifact_type: Nodejs:Application
+        content: {{ href: app.js }}
+"""
+
+SCRIPT_ARTIFACT = """-
+  name: Nodejs:Script
+  default_requirement: Nodejs:Run
+  requirements:
+    -
+      requirement_type: Nodejs:Run
+      default_service: nodejs
+      actions:
+        -
+          service: nodejs
+          instructions:
+            - target: .
+              do:
+                - ["RUN", "npm install -g forever"]
+                - ["ADD", "{{artifact}} /src/"]
+                - ["CMD", "forever /src/{{artifact}}"]
+"""
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.plans = os.path.join(self.directory, 'plans')
+        self.output = os.path.join(self.directory, 'output')
+        os.mkdir(self.plans)
+        os.mkdir(self.output)
+        with open(os.path.join(self.plans, 'app.js'), 'w') as f:
+            f.write("console.log('camp2docker');\n")
+        for name in ('first', 'second'):
+            with open(os.path.join(self.plans, name + '.yaml'), 'w') as f:
+                f.write(PLAN.format(name=name))
+        with open(os.path.join(self.plans, 'broken.yml'), 'w') as f:
+            f.write("name: broken\ncamp_version: CAMP 1.1\nartifacts:\n    - {artifact_type: Cat, content: {href: app.js}}\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find_plans_directory(self):
+        self.assertEqual([os.path.basename(p) for p in find_plans(self.plans)], ['broken.yml', 'first.yaml', 'second.yaml'])
+
+    def test_find_plans_glob(self):
+        self.assertEqual([os.path.basename(p) for p in find_plans(os.path.join(self.plans, '*.yaml'))], ['first.yaml', 'second.yaml'])
+
+    def check_batch(self, workers):
+        config = Config.from_path(os.path.join('tests', 'fixtures', 'config'))
+        results = list(generate_batch(find_plans(self.plans), self.output, config, workers))
+        self.assertEqual([os.path.basename(p) for p, error in results], ['broken.yml', 'first.yaml', 'second.yaml'])
+        self.assertIn('NoArtifactException', results[0][1])
+        self.assertIsNone(results[1][1])
+        self.assertIsNone(results[2][1])
+        for name in ('first', 'second'):
+            self.assertTrue(os.path.isfile(os.path.join(self.output, name, 'nodejs', 'Dockerfile')))
+            self.assertTrue(os.path.isfile(os.path.join(self.output, name, 'nodejs', 'app.js')))
+            self.assertTrue(os.path.isfile(os.path.join(self.output, name, 'nodejs', '.dockerignore')))
+
+    def test_generate_batch_sequential(self):
+        self.check_batch(1)
+
+    def test_generate_batch_pool(self):
+        self.check_batch(2)
+
+    def test_generate_batch_same_names(self):
+        with open(os.path.join(self.plans, 'other.yaml'), 'w') as f:
+            f.write(PLAN.format(name='first'))
+        config = Config.from_path(os.path.join('tests', 'fixtures', 'config'))
+        results = dict(generate_batch(find_plans(self.plans), self.output, config, 2))
+        self.assertIsNone(results[os.path.join(self.plans, 'second.yaml')])
+        for name in ('first.yaml', 'other.yaml'):
+            self.assertIn('are all named first', results[os.path.join(self.plans, name)])
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'first')))
+
+    def test_generate_batch_shared_bases_failure(self):
+        config = Config.from_path(os.path.join('tests', 'fixtures', 'config'))
+        results = list(generate_batch(find_plans(self.plans), self.output, config, 2, shared_bases=True))
+        self.assertEqual([os.path.basename(p) for p, error in results], ['broken.yml', 'first.yaml', 'second.yaml'])
+        self.assertIn('NoArtifactException', results[0][1])
+        self.assertEqual([error for p, error in results[1:]], [None, None])
+
+    def test_generate_batch_hash_index(self):
+        os.remove(os.path.join(self.plans, 'broken.yml'))
+        for name in ('first', 'second'):
+            with open(os.path.join(self.plans, name + '.js'), 'w') as f:
+                f.write("console.log('{name}');\n".format(name=name))
+            os.utime(os.path.join(self.plans, name + '.js'), (0, 0))
+            with open(os.path.join(self.plans, name + '.yaml'), 'w') as f:
+                f.write(PLAN.format(name=name).replace('app.js', name + '.js'))
+        config = Config.from_path(os.path.join('tests', 'fixtures', 'config'))
+        self.assertEqual([error for p, error in generate_batch(find_plans(self.plans), self.output, config, 2)], [None, None])
+        index = HashIndex(os.path.join(self.output, INDEX_FILENAME))
+        self.assertEqual(sorted(index.entries), [os.path.abspath(os.path.join(self.plans, name + '.js')) for name in ('first', 'second')])
+        os.remove(os.path.join(self.plans, 'second.js'))
+        os.remove(os.path.join(self.plans, 'second.yaml'))
+        list(generate_batch(find_plans(self.plans), self.output, config, 1))
+        self.assertEqual(sorted(HashIndex(os.path.join(self.output, INDEX_FILENAME)).entries), [os.path.abspath(os.path.join(self.plans, 'first.js'))])
+
+    def test_generate_batch_shared_bases(self):
+        config = os.path.join(self.directory, 'config')
+        shutil.copytree(os.path.join('tests', 'fixtures', 'config'), config, ignore=shutil.ignore_patterns('.camp2docker.*'))
+        with open(os.path.join(config, 'artifacts', 'scripts.yaml'), 'w') as f:
+            f.write(SCRIPT_ARTIFACT)
+        for name in ('first', 'second'):
+            with open(os.path.join(self.plans, name + '.yaml'), 'w') as f:
+                f.write(PLAN.format(name=name).replace('Nodejs:Application', 'Nodejs:Script'))
+        os.remove(os.path.join(self.plans, 'broken.yml'))
+        results = list(generate_batch(find_plans(self.plans), self.output, Config.from_path(config), 2, shared_bases=True))
+        self.assertEqual([error for p, error in results], [None, None])
+        dockerfiles = []
+        for name in ('first', 'second'):
+            with open(os.path.join(self.output, name, 'nodejs', 'Dockerfile')) as f:
+                dockerfiles.append(f.read())
+        base = dockerfiles[0].splitlines()[1]
+        self.assertTrue(base.startswith('FROM camp2docker_base_'))
+        self.assertEqual(dockerfiles[1].splitlines()[1], base)
+        with open(os.path.join(self.output, 'first', base[len('FROM '):], 'Dockerfile')) as f:
+            self.assertEqual(f.read(), "FROM node\nRUN npm install -g forever\n")
+        with open(os.path.join(self.output, 'first', 'build-bases.sh')) as f:
+            self.assertIn("docker build -t {name} {name}\n".format(name=base[len('FROM '):]), f.read())
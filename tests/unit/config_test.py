@@ -1,7 +1,11 @@
 import unittest
 import yaml
 import os
-from camp2docker.config import Config, ServiceConfig, CharacteristicConfig, ArtifactConfig, RequirementConfig, ParameterConfig, ActionConfig, NoServiceException, NoArtifactException, NoRequirementException, ParameterException
+import shutil
+import tempfile
+from mock import patch
+from camp2docker.utils import load_yaml_file
+from camp2docker.config import Config, LazyConfig, ServiceConfig, CharacteristicConfig, ArtifactConfig, RequirementConfig, ParameterConfig, ActionConfig, ConfigError, NoServiceException, NoActionException, NoArtifactException, NoRequirementException, ParameterException
 from camp2docker.plan import CharacteristicSpecification
 
 def setUpModule():
@@ -21,6 +25,19 @@ class ConfigTest(unittest.TestCase):
     def setUpClass(cls):
         cls.config = Config.from_path(config_fixtures_dir)
     
+    def test_digest(self):
+        self.assertEqual(Config.digest(config_fixtures_dir), Config.digest(config_fixtures_dir))
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'config')
+            shutil.copytree(config_fixtures_dir, path)
+            digest = Config.digest(path)
+            with open(os.path.join(path, 'artifacts', 'artifacts.yaml'), 'a') as f:
+                f.write('\n')
+            self.assertNotEqual(Config.digest(path), digest)
+        finally:
+            shutil.rmtree(directory)
+
     def test_number_services(self):
         self.assertEqual(len(self.config.services), 2)
 
@@ -62,6 +79,126 @@ class ConfigTest(unittest.TestCase):
         with self.assertRaises(NoServiceException):
             self.config.find_service_by_characteristics(characteristics)
 
+    def test_find_service_by_characteristics_first_match(self):
+        services = [
+                ServiceConfig('mongodb', 'MongoDB', 'dockerfile/mongodb', [{'characteristic_type': 'Database'}, {'characteristic_type': 'MongoDB', 'MongoDB:version': 'latest'}]),
+                ServiceConfig('postgres', 'PostgreSQL', 'postgres', [{'characteristic_type': 'Database'}, {'characteristic_type': 'SQL'}]),
+                ServiceConfig('mongodb-2.6', 'MongoDB 2.6', 'mongo:2.6', [{'characteristic_type': 'MongoDB', 'MongoDB:version': '2.6'}, {'characteristic_type': 'Database'}])
+        ]
+        config = Config('config', services, [])
+        database = CharacteristicSpecification(**{'characteristic_type': 'Database'})
+        mongodb = CharacteristicSpecification(**{'characteristic_type': 'MongoDB', 'MongoDB:version': '2.6'})
+        self.assertIs(config.find_service_by_characteristics([database]), services[0])
+        self.assertIs(config.find_service_by_characteristics([CharacteristicSpecification(characteristic_type='SQL'), database]), services[1])
+        self.assertIs(config.find_service_by_characteristics([database, mongodb]), services[2])
+
+    def test_find_service_by_characteristics_same_characteristic(self):
+        """Attributes of a characteristic must all be provided by the same service characteristic"""
+        services = [ServiceConfig('mongodb', 'MongoDB', 'dockerfile/mongodb', [{'characteristic_type': 'MongoDB', 'MongoDB:version': 'latest'}, {'characteristic_type': 'MongoDB', 'MongoDB:SingleNode': True}])]
+        config = Config('config', services, [])
+        characteristics = [CharacteristicSpecification(**{'characteristic_type': 'MongoDB', 'MongoDB:version': 'latest', 'MongoDB:SingleNode': True})]
+        with self.assertRaises(NoServiceException):
+            config.find_service_by_characteristics(characteristics)
+
+    def test_find_service_by_unhashable_characteristics(self):
+        characteristics = [CharacteristicSpecification(**{'characteristic_type': 'MongoDB', 'MongoDB:version': ['latest']})]
+        with self.assertRaises(NoServiceException):
+            self.config.find_service_by_characteristics(characteristics)
+
+    def test_find_service_by_characteristics_no_service(self):
+        with self.assertRaises(NoServiceException):
+            Config('config', [], []).find_service_by_characteristics([])
+
+    def test_duplicate_service(self):
+        duplicates = [ServiceConfig(**s) for s in (services[0], services[0])]
+        with self.assertRaises(ConfigError):
+            Config('config', duplicates, [])
+
+    def test_duplicate_artifact(self):
+        duplicates = [ArtifactConfig(**a) for a in (artifacts[0], artifacts[0])]
+        with self.assertRaises(ConfigError):
+            Config('config', [], duplicates)
+
+class ConfigDirectoryTestCase(unittest.TestCase):
+    """Work on a copy of the configuration fixtures"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config')
+        shutil.copytree(config_fixtures_dir, self.path)
+        for cache in [f for f in os.listdir(self.path) if f.startswith('.camp2docker.')]:
+            os.remove(os.path.join(self.path, cache))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+class ConfigCacheTest(ConfigDirectoryTestCase):
+    def test_cache_reused(self):
+        Config.from_path(self.path)
+        with patch('camp2docker.config.load_yaml_files') as load:
+            config = Config.from_path(self.path)
+            self.assertFalse(load.called)
+        self.assertEqual(len(config.services), 2)
+        self.assertEqual(config.find_service_by_name('nodejs').base, 'node')
+
+    def test_cache_invalidated(self):
+        Config.from_path(self.path)
+        services_file = os.path.join(self.path, 'services', 'services.yaml')
+        with open(services_file, 'a') as f:
+            f.write("-\n  name: redis\n  description: Redis\n  base: redis\n  characteristics: []\n")
+        config = Config.from_path(self.path)
+        self.assertEqual(len(config.services), 3)
+
+    def test_cache_invalidated_new_file(self):
+        Config.from_path(self.path)
+        with open(os.path.join(self.path, 'services', 'redis.yml'), 'w') as f:
+            f.write("-\n  name: redis\n  description: Redis\n  base: redis\n  characteristics: []\n")
+        config = Config.from_path(self.path)
+        self.assertEqual(config.find_service_by_name('redis').base, 'redis')
+
+    def test_no_cache(self):
+        Config.from_path(self.path, use_cache=False)
+        self.assertFalse(os.path.exists(os.path.join(self.path, '.camp2docker.cache')))
+
+class LazyConfigTest(ConfigDirectoryTestCase):
+    def test_lazy_config(self):
+        config = Config.from_path(self.path, lazy=True)
+        self.assertIsInstance(config, LazyConfig)
+        self.assertEqual([s.name for s in config.services], ['mongodb', 'nodejs'])
+        self.assertEqual([a.name for a in config.artifacts], ['Nodejs:Application', 'MongoDB:Dump'])
+
+    def test_parsed_on_access(self):
+        Config.from_path(self.path, lazy=True)
+        with patch('camp2docker.config.load_yaml_file', wraps=load_yaml_file) as load:
+            config = Config.from_path(self.path, lazy=True)
+            self.assertFalse(load.called)
+            artifact = config.find_artifact_config_by_type('MongoDB:Dump')
+            self.assertIs(config.find_artifact_config_by_type('MongoDB:Dump'), artifact)
+            load.assert_called_once_with(os.path.join(self.path, 'artifacts', 'artifacts.yaml'))
+        self.assertEqual(artifact.default_requirement, 'MongoDB:ImportPump')
+
+    def test_find_service_by_characteristics(self):
+        Config.from_path(self.path, lazy=True)
+        config = Config.from_path(self.path, lazy=True)
+        characteristics = [CharacteristicSpecification(**{'characteristic_type': 'MongoDB', 'MongoDB:version': 'latest'})]
+        self.assertIs(config.find_service_by_characteristics(characteristics), config.find_service_by_name('mongodb'))
+        with self.assertRaises(NoServiceException):
+            config.find_service_by_name('Restaurant')
+        with self.assertRaises(NoArtifactException):
+            config.find_artifact_config_by_type('Cat')
+
+    def test_manifest_refreshed(self):
+        Config.from_path(self.path, lazy=True)
+        with open(os.path.join(self.path, 'services', 'services.yaml'), 'a') as f:
+            f.write("-\n  name: redis\n  description: Redis\n  base: redis\n  characteristics: [{characteristic_type: Redis}]\n")
+        config = Config.from_path(self.path, lazy=True)
+        characteristics = [CharacteristicSpecification(characteristic_type='Redis')]
+        self.assertEqual(config.find_service_by_characteristics(characteristics).base, 'redis')
+
+    def test_duplicate_service(self):
+        shutil.copy(os.path.join(self.path, 'services', 'services.yaml'), os.path.join(self.path, 'services', 'copy.yaml'))
+        with self.assertRaises(ConfigError):
+            Config.from_path(self.path, lazy=True)
+
 class ServiceConfigTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -139,6 +276,11 @@ class ArtifactConfigTest(unittest.TestCase):
         with self.assertRaises(NoRequirementException):
             self.artifact.find_requirement_by_type('RunForest')
 
+    def test_duplicate_requirement(self):
+        artifact = dict(artifacts[0], requirements=artifacts[0]["requirements"] * 2)
+        with self.assertRaises(ConfigError):
+            ArtifactConfig(**artifact)
+
 class RequirementConfigTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -163,3 +305,18 @@ class RequirementConfigTest(unittest.TestCase):
     def test_validate_non_valid_key_parameter(self):
         with self.assertRaises(ParameterException):
             self.requirement.validate_parameters({'first_name': 'Thomas'})
+
+    def test_find_action_by_service_name(self):
+        actual = self.requirement.find_action_by_service_name('mongodb')
+        expected = self.requirement.actions[0]
+        self.assertIs(actual, expected)
+
+    def test_find_non_existing_action_by_service_name(self):
+        with self.assertRaises(NoActionException):
+            self.requirement.find_action_by_service_name('nodejs')
+
+    def test_duplicate_action(self):
+        requirement = dict(artifacts[0]["requirements"][1])
+        requirement["actions"] = requirement["actions"] * 2
+        with self.assertRaises(ConfigError):
+            RequirementConfig(**requirement)
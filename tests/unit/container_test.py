@@ -1,6 +1,7 @@
 import unittest
-from mock import Mock
-from camp2docker.output import Container
+import pystache
+from mock import Mock, patch
+from camp2docker.output import Container, Instruction, InstructionError, compile_instructions, render_template
 
 class ContainerTest(unittest.TestCase):
     @classmethod
@@ -52,12 +53,30 @@ class ContainerTest(unittest.TestCase):
         expected = ['ENV', '']
         self.assertEqual(actual, expected)
 
+    def test_render_template_escape(self):
+        template = 'mongod {{options}} {{{raw}}}'
+        params = {'options': '--a && --b', 'raw': '&&'}
+        self.assertEqual(render_template(template, params), pystache.render(template, params))
+
+    def test_render_template_no_tag(self):
+        template = 'npm install'
+        with patch('camp2docker.output.pystache.parse') as parse:
+            self.assertIs(render_template(template, {'artifact': 'app.js'}), template)
+            self.assertFalse(parse.called)
+
+    def test_render_template_parsed_once(self):
+        template = 'node {{artifact}} --port {{port}}'
+        with patch('camp2docker.output.pystache.parse', wraps=pystache.parse) as parse:
+            self.assertEqual(render_template(template, {'artifact': 'app.js', 'port': 80}), 'node app.js --port 80')
+            self.assertEqual(render_template(template, {'artifact': 'server.js', 'port': 8080}), 'node server.js --port 8080')
+            self.assertEqual(parse.call_count, 1)
+
     def test_add_instruction(self):
         instruction1 = Container.process_mustache_template_list(self.instructions[0], {'artifact': 'app.js'})
         instruction2 = Container.process_mustache_template_list(self.instructions[1], {'artifact': 'app.js'})
         self.container.add_instruction(instruction1)
         self.container.add_instruction(instruction2)
-        self.assertEqual(self.container.instructions, [instruction1, instruction2])
+        self.assertEqual(self.container.instructions, [Instruction('ADD', 'app.js /usr/src', ()), Instruction('RUN', 'npm install', (True,))])
 
     def test_add_expose(self):
         expose1 = 3000
@@ -91,9 +110,33 @@ class ContainerTest(unittest.TestCase):
         self.assertEqual(self.container.entrypoint, '/bin/boot.sh')
         self.assertEqual(self.container.links, [source_container])
         self.assertEqual(self.container.exposes, [3000])
-        self.assertEqual(self.container.instructions, [['ADD', 'app.js /usr/src'], ['RUN', 'npm install', True],['ENV', 'PORT 3000'], ['VOLUME', '/usr/src']])
+        self.assertEqual(self.container.instructions, [Instruction('ADD', 'app.js /usr/src', ()), Instruction('RUN', 'npm install', (True,)), Instruction('ENV', 'PORT 3000', ()), Instruction('VOLUME', '/usr/src', ())])
         self.assertTrue(self.container.needs_build)
 
+    def test_process_compiled_instructions(self):
+        source_container = Container('mongodb', 'dockerfile/mongodb')
+        params = {'artifact': 'app.js', 'Port': 3000}
+        compiled = Container('nodejs', 'node')
+        compiled.process_instructions(compile_instructions(self.instructions), params, source_container)
+        self.container.process_instructions(self.instructions, params, source_container)
+        self.assertEqual(compiled.instructions, self.container.instructions)
+        self.assertEqual(compiled.cmd, self.container.cmd)
+
+    def test_process_two_cmd(self):
+        with self.assertRaises(InstructionError):
+            self.container.process_instructions([['CMD', 'node app.js'], ['CMD', 'node server.js']], {}, self.container)
+
+    def test_unknown_instruction_kept(self):
+        self.container.process_instructions([['LABEL', 'version="1.0"'], ['STOPSIGNAL', 'SIGTERM']], {}, self.container)
+        self.assertEqual(self.container.instructions, [Instruction('LABEL', 'version="1.0"', ()), Instruction('STOPSIGNAL', 'SIGTERM', ())])
+        self.assertIn('LABEL version="1.0"\nSTOPSIGNAL SIGTERM\n', str(self.container))
+        self.assertFalse(self.container.needs_build)
+
+    def test_needs_build_follows_instructions(self):
+        self.container.add_instruction(['RUN', 'npm install'])
+        self.container.instructions = self.container.instructions[1:]
+        self.assertFalse(self.container.needs_build)
+
     def test_needs_build_add(self):
         self.container.add_instruction(['ADD', 'app.js /usr/src'])
         self.assertTrue(self.container.needs_build)
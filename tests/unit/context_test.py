@@ -0,0 +1,66 @@
+import unittest
+import os
+import shutil
+import tarfile
+import tempfile
+from StringIO import StringIO
+from mock import Mock
+from fig.packages.docker.client import Client
+from camp2docker.context import BuildContext, BuildException, build_streamed
+from camp2docker.output import Container
+from camp2docker.assembly import Component
+from fake_daemon import FakeDaemon
+
+class BuildContextTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'dump', 'db'))
+        with open(os.path.join(self.directory, 'dump', 'db', 'collection.bson'), 'w') as f:
+            f.write('documents' * 10000)
+        os.makedirs(os.path.join(self.directory, 'dump', '.git'))
+        with open(os.path.join(self.directory, 'dump', '.git', 'HEAD'), 'w') as f:
+            f.write('ref: refs/heads/master\n')
+        with open(os.path.join(self.directory, 'app.js'), 'w') as f:
+            f.write("console.log('camp2docker');\n")
+        with open(os.path.join(self.directory, 'unused.txt'), 'w') as f:
+            f.write('unused\n')
+        container = Container('mongodb', 'dockerfile/mongodb')
+        container.add_instruction(['ADD', 'dump /opt/'])
+        container.add_instruction(['ADD', 'app.js /src/'])
+        self.component = Component(None, Mock(), container)
+        self.component.add_artifact(Mock(href='dump'), ['.git'])
+        self.component.add_artifact(Mock(href='app.js'))
+        self.component.add_artifact(Mock(href='unused.txt'))
+        self.daemon = FakeDaemon().start()
+        self.client = Client(self.daemon.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def test_files(self):
+        expected = [('app.js', os.path.join(self.directory, 'app.js')), (os.path.join('dump', 'db', 'collection.bson'), os.path.join(self.directory, 'dump', 'db', 'collection.bson'))]
+        self.assertEqual(BuildContext(self.component, self.directory).files, expected)
+
+    def test_tar(self):
+        chunks = list(BuildContext(self.component, self.directory))
+        self.assertNotIn('', chunks)
+        archive = tarfile.open(fileobj=StringIO(''.join(chunks)))
+        self.assertEqual(archive.getnames(), ['Dockerfile', 'app.js', 'dump/db/collection.bson'])
+        self.assertEqual(archive.extractfile('Dockerfile').read(), str(self.component.container))
+        self.assertEqual(archive.extractfile('dump/db/collection.bson').read(), 'documents' * 10000)
+
+    def test_build_streamed(self):
+        image = build_streamed(self.client, self.component, self.directory, 'app_mongodb', output=StringIO())
+        self.assertEqual(image, self.daemon.images['app_mongodb']['Id'])
+        build, = self.daemon.builds
+        self.assertEqual(build['tag'], 'app_mongodb')
+        self.assertTrue(build['chunked'])
+        self.assertEqual(sorted(build['files']), ['Dockerfile', 'app.js', 'dump/db/collection.bson'])
+        self.assertEqual(build['files']['app.js'], "console.log('camp2docker');\n")
+
+    def test_build_streamed_error(self):
+        self.daemon.fail_builds = True
+        with self.assertRaises(BuildException):
+            build_streamed(self.client, self.component, self.directory, 'app_mongodb', output=StringIO())
@@ -0,0 +1,128 @@
+import unittest
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+from mock import Mock, patch
+from fig.packages.docker import Client
+from camp2docker.assembly import Assembly
+from camp2docker.config import Config
+from camp2docker.hashindex import HashIndex, INDEX_FILENAME
+from camp2docker.deploy import CONFIG_HASH_VARIABLE, Deployment, config_hash
+from camp2docker.orchestrate import Orchestrator
+from camp2docker.output import Container
+from fake_daemon import FakeDaemon
+
+class ConfigHashTest(unittest.TestCase):
+    def component(self, name, base='node'):
+        container = Container(name, base)
+        return Mock(container=container, service_dict={'name': name, 'image': base})
+
+    def test_config_hash(self):
+        nodejs = self.component('nodejs')
+        self.assertEqual(config_hash(nodejs, 'node0000', ['b', 'a']), config_hash(nodejs, 'node0000', ['a', 'b']))
+        self.assertNotEqual(config_hash(nodejs, 'node0000'), config_hash(nodejs, 'node0001'))
+        self.assertNotEqual(config_hash(nodejs, 'node0000'), config_hash(nodejs, 'node0000', ['a']))
+        self.assertNotEqual(config_hash(nodejs, 'node0000'), config_hash(self.component('nodejs', 'iojs'), 'node0000'))
+
+class DeploymentTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.config = Config.from_path('tests/fixtures/config')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/fixtures/app.yaml') as f:
+            plan = f.read().replace('#name: app', 'name: app')
+        self.planfile = os.path.join(self.directory, 'app.yaml')
+        with open(self.planfile, 'w') as f:
+            f.write(plan)
+        self.write('app.js', "console.log('camp2docker');\n")
+        os.mkdir(os.path.join(self.directory, 'dump'))
+        self.write(os.path.join('dump', 'collection.bson'), 'documents')
+        self.daemon = FakeDaemon().start()
+        self.daemon.images['node'] = {'Id': 'node0000'}
+        self.daemon.images['dockerfile/mongodb'] = {'Id': 'mongodb0000'}
+        self.client = Client(self.daemon.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def deployment(self):
+        assembly = Assembly.from_plan(self.planfile, self.config)
+        return Deployment(Orchestrator(assembly, self.client, 2), self.directory)
+
+    def apply(self):
+        del self.daemon.operations[:]
+        with patch('sys.stdout', StringIO()):
+            return [(change.action, change.name) for change in self.deployment().apply()]
+
+    def created(self):
+        return [name for operation, name in self.daemon.operations if operation == 'create' and not name.startswith('intermediate')]
+
+    def test_plan_first_deployment(self):
+        plan = self.deployment().plan()
+        self.assertEqual([(c.action, c.name, c.rebuild) for c in plan], [('create', 'mongodb', True), ('create', 'nodejs', True)])
+        self.assertEqual(self.daemon.builds, [])
+        self.assertEqual(self.daemon.containers, {})
+
+    def test_apply(self):
+        self.assertEqual(self.apply(), [('create', 'mongodb'), ('create', 'nodejs')])
+        self.assertEqual(self.created(), ['app_mongodb_1', 'app_nodejs_1'])
+        for container in self.daemon.containers.values():
+            self.assertTrue(container['State']['Running'])
+            self.assertIn(CONFIG_HASH_VARIABLE, ''.join(container['Config']['Env']))
+        self.assertEqual(self.apply(), [('keep', 'mongodb'), ('keep', 'nodejs')])
+        self.assertEqual(self.daemon.operations, [])
+
+    def test_apply_changed_artifact(self):
+        self.apply()
+        self.write('app.js', "console.log('changed');\n")
+        plan = self.deployment().plan()
+        self.assertEqual([repr(change) for change in plan], ["keep mongodb: unchanged", "recreate nodejs: image changed (image rebuilt)"])
+        self.assertEqual(self.apply(), [('keep', 'mongodb'), ('recreate', 'nodejs')])
+        self.assertEqual(self.created(), ['app_nodejs_1'])
+        self.assertEqual(sorted(build['tag'] for build in self.daemon.builds), ['app_mongodb', 'app_nodejs', 'app_nodejs'])
+
+    def test_apply_recreates_dependents(self):
+        self.apply()
+        self.write(os.path.join('dump', 'collection.bson'), 'other documents')
+        plan = self.deployment().plan()
+        self.assertEqual([repr(change) for change in plan], ["recreate mongodb: image changed (image rebuilt)", "recreate nodejs: links to recreated mongodb"])
+        self.assertEqual(self.apply(), [('recreate', 'mongodb'), ('recreate', 'nodejs')])
+        self.assertEqual(self.created(), ['app_mongodb_1', 'app_nodejs_1'])
+
+    def test_apply_recreates_dependents_of_created(self):
+        self.apply()
+        for container_id, container in self.daemon.containers.items():
+            if container['Name'] == '/app_mongodb_1':
+                del self.daemon.containers[container_id]
+        plan = self.deployment().plan()
+        self.assertEqual([repr(change) for change in plan], ["create mongodb: no container", "recreate nodejs: links to recreated mongodb"])
+        self.assertEqual(self.apply(), [('create', 'mongodb'), ('recreate', 'nodejs')])
+        self.assertEqual(self.created(), ['app_mongodb_1', 'app_nodejs_1'])
+
+    def test_plan_persists_hash_index(self):
+        os.utime(os.path.join(self.directory, 'app.js'), (0, 0))
+        self.deployment().plan()
+        self.assertIn(os.path.abspath(os.path.join(self.directory, 'app.js')), HashIndex(os.path.join(self.directory, INDEX_FILENAME)).entries)
+
+    def test_apply_without_labels(self):
+        self.daemon.api_version = '1.17'
+        self.assertEqual(self.apply(), [('create', 'mongodb'), ('create', 'nodejs')])
+        self.assertEqual([(c.action, c.name, c.rebuild) for c in self.deployment().plan()], [('keep', 'mongodb', False), ('keep', 'nodejs', False)])
+        self.assertFalse(any('LABEL' in build['files']['Dockerfile'] for build in self.daemon.builds))
+
+    def test_apply_starts_stopped(self):
+        self.apply()
+        for container in self.daemon.containers.values():
+            if container['Name'] == '/app_nodejs_1':
+                container['State']['Running'] = False
+        self.assertEqual(self.apply(), [('keep', 'mongodb'), ('start', 'nodejs')])
+        self.assertEqual(self.daemon.operations, [('start', 'app_nodejs_1')])
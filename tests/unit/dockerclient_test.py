@@ -0,0 +1,53 @@
+import unittest
+import os
+import shutil
+import tempfile
+from fig.packages.docker.client import Client
+from fig.packages.docker.unixconn.unixconn import UnixHTTPConnection
+from camp2docker.dockerclient import DockerClient, PooledUnixConnectionPool, copy_client
+from fake_daemon import FakeDaemon
+
+class DockerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.daemon = FakeDaemon(os.path.join(self.directory, 'docker.sock')).start()
+        self.daemon.images['node'] = {'Id': 'node0000'}
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def inspect(self, client, times):
+        try:
+            for i in range(times):
+                self.assertEqual(client.inspect_image('node')['Id'], 'node0000')
+        finally:
+            client.close()
+
+    def test_connection_kept_alive(self):
+        self.inspect(DockerClient(self.daemon.url, pool_size=5), 5)
+        self.assertEqual(self.daemon.server.connections, 1)
+
+    def test_vendored_client_reconnects(self):
+        self.inspect(Client(self.daemon.url), 3)
+        self.assertEqual(self.daemon.server.connections, 3)
+
+    def test_copy(self):
+        client = DockerClient(self.daemon.url, '1.18', 10, pool_size=2)
+        copy = client.copy()
+        self.assertEqual((copy.base_url, copy.api_version, copy.timeout), (client.base_url, '1.18', 10))
+        self.inspect(copy, 1)
+        client.close()
+
+    def test_copy_vendored_client(self):
+        copy = copy_client(Client(self.daemon.url))
+        self.assertIsInstance(copy, DockerClient)
+        self.assertEqual(copy.base_url, Client(self.daemon.url).base_url)
+        self.inspect(copy, 1)
+
+    def test_pool_connections(self):
+        pool = PooledUnixConnectionPool('http+unix://' + self.daemon.unix_socket, '/images/node/json', 10, 2)
+        connection = pool._new_conn()
+        self.assertIsInstance(connection, UnixHTTPConnection)
+        self.assertEqual(connection.timeout, 10)
+        self.assertEqual(pool.pool.maxsize, 2)
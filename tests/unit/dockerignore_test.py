@@ -0,0 +1,64 @@
+import unittest
+import os
+import shutil
+import tempfile
+from camp2docker.dockerignore import ContextFilter, ContextSize, added_sources
+from camp2docker.output import Container
+
+class AddedSourcesTest(unittest.TestCase):
+    def test_added_sources(self):
+        container = Container('nodejs', 'node')
+        container.add_instruction(['ADD', 'app /src/app/'])
+        container.add_instruction(['COPY', 'package.json ./lib/*.js /src/'])
+        container.add_instruction(['ADD', '["config.json", "/etc/app/"]'])
+        container.add_instruction(['ADD', 'http://example.com/app.tar.gz /tmp/'])
+        container.add_instruction(['RUN', 'npm install'])
+        self.assertEqual(added_sources(container), ['app', 'package.json', 'lib/*.js', 'config.json'])
+
+    def test_added_context(self):
+        container = Container('nodejs', 'node')
+        container.add_instruction(['ADD', '. /src/app/'])
+        self.assertEqual(added_sources(container), ['.'])
+
+class ContextFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.filter = ContextFilter(['app', 'lib/*.js'], ['app/node_modules', 'app/*.log'])
+
+    def test_includes(self):
+        self.assertTrue(self.filter.includes('Dockerfile'))
+        self.assertTrue(self.filter.includes('app/server.js'))
+        self.assertTrue(self.filter.includes('lib/util.js'))
+        self.assertFalse(self.filter.includes('lib/sub/util.js'))
+        self.assertFalse(self.filter.includes('app/node_modules/express/index.js'))
+        self.assertFalse(self.filter.includes('app/npm-debug.log'))
+        self.assertTrue(self.filter.includes('app/logs/today.log'))
+        self.assertFalse(self.filter.includes('dump/collection.bson'))
+
+    def test_adds_all(self):
+        context_filter = ContextFilter(['.'], ['app/.git'])
+        self.assertTrue(context_filter.includes('dump/collection.bson'))
+        self.assertFalse(context_filter.includes('app/.git/HEAD'))
+
+    def test_filter(self):
+        files = [('app/server.js', '/plans/app/server.js'), ('app/node_modules/a.js', '/plans/app/node_modules/a.js')]
+        self.assertEqual(self.filter.filter(files), files[:1])
+
+    def test_dockerignore(self):
+        names = ['app/server.js', 'app/node_modules/a.js', 'lib/util.js', 'lib/README', 'lib/sub/util.js', 'dump/db/collection.bson']
+        self.assertEqual(self.filter.dockerignore(names), "app/*.log\napp/node_modules\ndump\nlib/README\nlib/sub\n")
+
+class ContextSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name, size in (('small', 10), ('large', 1000)):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write('x' * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_context_size(self):
+        files = [(name, os.path.join(self.directory, name)) for name in ('small', 'large')]
+        size = ContextSize(files, files[:1])
+        self.assertEqual((size.before, size.after), (1010, 10))
+        self.assertEqual(repr(size), "2 files, 1010 bytes -> 1 files, 10 bytes")
@@ -0,0 +1,208 @@
+"""
+    Fake Docker daemon answering the remote API on a local port, recording what it receives
+"""
+import BaseHTTPServer
+import SocketServer
+import itertools
+import json
+import re
+import tarfile
+import threading
+import time
+import urlparse
+from StringIO import StringIO
+
+class FakeDaemonHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+            return ''.join(body)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def send_stream(self, events):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        # the docker client reads streams from the raw socket, so the body must not reach the
+        # client with the headers, which its HTTP parser would buffer
+        time.sleep(0.05)
+        for event in events:
+            data = json.dumps(event) + '\n'
+            self.wfile.write('%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.write('0\r\n\r\n')
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        url = urlparse.urlparse(self.path)
+        path = '/' + url.path.split('/', 2)[-1] if url.path.startswith('/v1.') else url.path
+        query = dict(urlparse.parse_qsl(url.query))
+        for route_method, pattern, name in self.server.daemon.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                return getattr(self.server.daemon, name)(self, query, *match.groups())
+        handler = getattr(self.server.daemon, method + path.replace('/', '_'), None)
+        if handler is None:
+            self.send_json({'message': 'not found'}, 404)
+        else:
+            handler(self, query)
+
+    def do_GET(self):
+        self.route('get')
+
+    def do_POST(self):
+        self.route('post')
+
+    def do_DELETE(self):
+        self.route('delete')
+
+class FakeDaemonServerMixin(SocketServer.ThreadingMixIn):
+    # keep-alive connections are served in their own threads so that shutdown doesn't wait for them
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        # connections closed by the stopped server; request errors fail the tests on the client side
+        pass
+
+class FakeDaemonServer(FakeDaemonServerMixin, BaseHTTPServer.HTTPServer):
+    pass
+
+class FakeUnixDaemonServer(FakeDaemonServerMixin, SocketServer.UnixStreamServer):
+    pass
+
+class FakeDaemon(object):
+    routes = [
+        ('get', r'^/images/(.+)/json$', 'inspect_image'),
+        ('get', r'^/containers/json$', 'list_containers'),
+        ('get', r'^/containers/([^/]+)/json$', 'inspect_container'),
+        ('post', r'^/containers/([^/]+)/(start|stop|wait)$', 'container_operation'),
+        ('delete', r'^/containers/([^/]+)$', 'remove_container'),
+    ]
+
+    def __init__(self, unix_socket=None):
+        self.builds = []
+        # images by name, as returned by inspect
+        self.images = {}
+        self.pulls = []
+        # number of times pulling an image fails before succeeding
+        self.pull_failures = {}
+        self.fail_builds = False
+        self.api_version = '1.18'
+        # containers by id, as returned by inspect, and the operations run on them
+        self.containers = {}
+        self.operations = []
+        self.container_numbers = itertools.count(1)
+        self.unix_socket = unix_socket
+        if unix_socket is None:
+            self.server = FakeDaemonServer(('127.0.0.1', 0), FakeDaemonHandler)
+        else:
+            self.server = FakeUnixDaemonServer(unix_socket, FakeDaemonHandler)
+        self.server.daemon = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        if self.unix_socket is not None:
+            return 'unix://' + self.unix_socket
+        return 'http://127.0.0.1:{port}'.format(port=self.server.server_address[1])
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post_build(self, handler, query):
+        body = handler.read_body()
+        archive = tarfile.open(fileobj=StringIO(body))
+        files = dict((m.name, archive.extractfile(m).read()) for m in archive.getmembers() if m.isfile())
+        self.builds.append({'tag': query.get('t'), 'files': files, 'chunked': handler.headers.get('Transfer-Encoding') == 'chunked'})
+        if self.fail_builds:
+            handler.send_stream([{'stream': 'Step 0 : FROM node\n'}, {'error': 'build failed', 'errorDetail': {'message': 'build failed'}}])
+        else:
+            labels = dict(re.findall(r'^LABEL (\S+)="(.*)"$', files.get('Dockerfile', ''), re.M))
+            image_id = '{id:012x}'.format(id=len(self.builds))
+            self.images[query.get('t')] = {'Id': image_id, 'Config': {'Labels': labels}}
+            handler.send_stream([{'stream': 'Step 0 : FROM node\n'}, {'stream': 'Successfully built {id}\n'.format(id=image_id)}])
+
+    def post_images_create(self, handler, query):
+        name = '{image}:{tag}'.format(image=query['fromImage'], tag=query.get('tag', 'latest'))
+        self.pulls.append(name)
+        if self.pull_failures.get(name, 0) > 0:
+            self.pull_failures[name] -= 1
+            handler.send_stream([{'status': 'Pulling repository ' + query['fromImage']}, {'error': 'connection reset', 'errorDetail': {'message': 'connection reset'}}])
+        else:
+            self.images[name] = self.images[query['fromImage']] = {'Id': '{id:012x}'.format(id=len(self.pulls))}
+            handler.send_stream([{'status': 'Pulling repository ' + query['fromImage']}, {'status': 'Download complete'}])
+
+    def inspect_image(self, handler, query, name):
+        if name in self.images:
+            handler.send_json(self.images[name])
+        else:
+            handler.send_json({'message': 'No such image: ' + name}, 404)
+
+    def post_containers_create(self, handler, query):
+        config = json.loads(handler.read_body())
+        number = next(self.container_numbers)
+        container_id = '{id:064x}'.format(id=number)
+        name = query.get('name') or 'intermediate_{id}'.format(id=number)
+        self.containers[container_id] = {'Id': container_id, 'Name': '/' + name, 'Image': config['Image'], 'Config': config, 'State': {'Running': False}}
+        self.operations.append(('create', name))
+        handler.send_json({'Id': container_id}, 201)
+
+    def list_containers(self, handler, query):
+        handler.send_json([{'Id': c['Id'], 'Image': c['Image'], 'Names': [c['Name']]} for c in self.containers.values() if query.get('all') == '1' or c['State']['Running']])
+
+    def inspect_container(self, handler, query, container_id):
+        if container_id in self.containers:
+            handler.send_json(self.containers[container_id])
+        else:
+            handler.send_json({'message': 'No such container: ' + container_id}, 404)
+
+    def container_operation(self, handler, query, container_id, operation):
+        container = self.containers[container_id]
+        handler.read_body()
+        self.operations.append((operation, container['Name'][1:]))
+        container['State']['Running'] = operation == 'start'
+        if operation == 'wait':
+            handler.send_json({'StatusCode': 0})
+        else:
+            handler.send_json({})
+
+    def remove_container(self, handler, query, container_id):
+        self.operations.append(('remove', self.containers.pop(container_id)['Name'][1:]))
+        handler.send_json({})
+
+    def get_images_json(self, handler, query):
+        name = query.get('filter')
+        handler.send_json([{'Id': image['Id'], 'RepoTags': [tag]} for tag, image in self.images.items() if name is None or tag == name])
+
+    def get_version(self, handler, query):
+        handler.send_json({'ApiVersion': self.api_version, 'Version': '1.6.0'})
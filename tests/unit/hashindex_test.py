@@ -0,0 +1,91 @@
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+from mock import patch
+from camp2docker.hashindex import HashIndex, file_digest, tree_files
+
+class HashIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump = os.path.join(self.directory, 'dump')
+        os.makedirs(os.path.join(self.dump, 'db'))
+        self.index_file = os.path.join(self.directory, 'hashes')
+        self.write(os.path.join(self.dump, 'db', 'collection.bson'), 'documents' * 1000)
+        self.write(os.path.join(self.dump, 'db', 'collection.metadata.json'), '{}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, content, mtime=1000000000):
+        with open(filename, 'w') as f:
+            f.write(content)
+        os.utime(filename, (mtime, mtime))
+
+    def test_file_digest(self):
+        self.assertEqual(file_digest(os.path.join(self.dump, 'db', 'collection.bson')), hashlib.sha1('documents' * 1000).hexdigest())
+
+    @patch('camp2docker.hashindex.CHUNK_SIZE', 100)
+    @patch('camp2docker.hashindex.MMAP_THRESHOLD', 10)
+    def test_file_digest_mmap(self):
+        self.assertEqual(file_digest(os.path.join(self.dump, 'db', 'collection.bson')), hashlib.sha1('documents' * 1000).hexdigest())
+
+    def test_cached_digest(self):
+        index = HashIndex(self.index_file)
+        filename = os.path.join(self.dump, 'db', 'collection.bson')
+        digest = index.file_digest(filename)
+        index.save()
+        with patch('camp2docker.hashindex.file_digest') as digest_mock:
+            self.assertEqual(HashIndex(self.index_file).file_digest(filename), digest)
+            self.assertFalse(digest_mock.called)
+
+    def test_modified_file(self):
+        index = HashIndex(self.index_file)
+        filename = os.path.join(self.dump, 'db', 'collection.bson')
+        index.file_digest(filename)
+        self.write(filename, 'other documents', mtime=1000000001)
+        self.assertEqual(index.file_digest(filename), hashlib.sha1('other documents').hexdigest())
+
+    def test_racy_file_not_cached(self):
+        index = HashIndex(self.index_file)
+        filename = os.path.join(self.dump, 'recent')
+        with open(filename, 'w') as f:
+            f.write('recent')
+        index.file_digest(filename)
+        self.assertNotIn(os.path.abspath(filename), index.entries)
+
+    def test_tree_digest(self):
+        index = HashIndex()
+        digest = index.tree_digest(self.dump)
+        self.assertEqual(index.tree_digest(self.dump), digest)
+        os.rename(os.path.join(self.dump, 'db', 'collection.metadata.json'), os.path.join(self.dump, 'db', 'metadata.json'))
+        self.assertNotEqual(index.tree_digest(self.dump), digest)
+
+    def test_tree_digest_symlink_cycle(self):
+        os.symlink('..', os.path.join(self.dump, 'db', 'parent'))
+        os.symlink('db', os.path.join(self.dump, 'same'))
+        self.assertEqual(tree_files(self.dump), [os.path.join(d, name) for d in ('db', 'same') for name in ('collection.bson', 'collection.metadata.json')])
+
+    def test_tree_digest_file(self):
+        filename = os.path.join(self.dump, 'db', 'collection.metadata.json')
+        self.assertEqual(HashIndex().tree_digest(filename), hashlib.sha1('{}').hexdigest())
+
+    def test_prune(self):
+        index = HashIndex(self.index_file)
+        index.tree_digest(self.dump)
+        shutil.rmtree(os.path.join(self.dump, 'db'))
+        index.prune()
+        self.assertEqual(index.entries, {})
+        index.save()
+        self.assertEqual(HashIndex(self.index_file).entries, {})
+
+    def test_concurrent_saves(self):
+        bson = os.path.join(self.dump, 'db', 'collection.bson')
+        metadata = os.path.join(self.dump, 'db', 'collection.metadata.json')
+        first, second = HashIndex(self.index_file), HashIndex(self.index_file)
+        first.file_digest(bson)
+        second.file_digest(metadata)
+        first.save()
+        second.save()
+        self.assertEqual(sorted(HashIndex(self.index_file).entries), [os.path.abspath(bson), os.path.abspath(metadata)])
@@ -0,0 +1,67 @@
+import unittest
+from camp2docker.layers import LayerCount, merge_instructions, optimize_instructions, reorder_instructions
+from camp2docker.output import Container, Instruction, compile_instructions
+
+class MergeInstructionsTest(unittest.TestCase):
+    def test_merge_run(self):
+        instructions = compile_instructions([['RUN', 'apt-get update'], ['RUN', 'npm install || true'], ['WORKDIR', '/src'], ['RUN', 'make']])
+        self.assertEqual(merge_instructions(instructions), compile_instructions([
+            ['RUN', '(apt-get update) && (npm install || true)'], ['WORKDIR', '/src'], ['RUN', 'make']]))
+
+    def test_merge_run_keeps_shell_state(self):
+        instructions = compile_instructions([['RUN', 'cd /tmp'], ['RUN', 'export A=1'], ['RUN', 'make']])
+        self.assertEqual(merge_instructions(instructions), [Instruction('RUN', '(cd /tmp) && (export A=1) && (make)', ())])
+
+    def test_merge_env(self):
+        instructions = compile_instructions([['ENV', 'PORT 3000'], ['ENV', 'GREETING hello "world"'], ['ENV', 'A=1 B=2']])
+        self.assertEqual(merge_instructions(instructions), [Instruction('ENV', 'PORT="3000" GREETING="hello \\"world\\"" A=1 B=2', ())])
+
+    def test_env_reference_not_merged(self):
+        instructions = compile_instructions([['ENV', 'A=1'], ['ENV', 'PORT 3000'], ['ENV', 'B=$A'], ['ENV', 'C ${PORT}/x'], ['ENV', 'D ${B:-0}'], ['ENV', 'E $AB']])
+        self.assertEqual(merge_instructions(instructions), [
+            Instruction('ENV', 'A=1 PORT="3000"', ()), Instruction('ENV', 'B=$A C="${PORT}/x"', ()), Instruction('ENV', 'D="${B:-0}" E="$AB"', ())])
+
+    def test_exec_form_not_merged(self):
+        instructions = compile_instructions([['RUN', 'make'], ['RUN', '["make", "install"]']])
+        self.assertEqual(merge_instructions(instructions), instructions)
+
+class ReorderInstructionsTest(unittest.TestCase):
+    def setUp(self):
+        self.instructions = compile_instructions([['ADD', 'app /src/app/'], ['WORKDIR', '/src/app'], ['RUN', 'npm install'], ['EXPOSE', '3000']])
+        self.installs = {'app': ['npm install']}
+
+    def test_reorder(self):
+        self.assertEqual(reorder_instructions(self.instructions, {'app': ['package.json', 'config/deps.json']}, self.installs), compile_instructions([
+            ['ADD', 'app/package.json /src/app/'], ['ADD', 'app/config/deps.json /src/app/config/'],
+            ['WORKDIR', '/src/app'], ['RUN', 'npm install'], ['ADD', 'app /src/app/'], ['EXPOSE', '3000']]))
+
+    def test_source_added_before_other_run(self):
+        instructions = compile_instructions([['ADD', 'app /src/app/'], ['WORKDIR', '/src/app'], ['RUN', 'npm install'], ['ENV', 'A 1'], ['RUN', 'npm run build'], ['RUN', 'npm test']])
+        self.assertEqual(reorder_instructions(instructions, {'app': ['package.json']}, self.installs), compile_instructions([
+            ['ADD', 'app/package.json /src/app/'], ['WORKDIR', '/src/app'], ['RUN', 'npm install'], ['ENV', 'A 1'],
+            ['ADD', 'app /src/app/'], ['RUN', 'npm run build'], ['RUN', 'npm test']]))
+
+    def test_no_install(self):
+        self.assertEqual(reorder_instructions(self.instructions, {'app': ['package.json']}), self.instructions)
+
+    def test_no_dependencies(self):
+        self.assertEqual(reorder_instructions(self.instructions, {'dump': ['package.json']}, self.installs), self.instructions)
+
+    def test_relative_destination(self):
+        instructions = compile_instructions([['WORKDIR', '/src'], ['ADD', 'app app/'], ['RUN', 'npm install']])
+        self.assertEqual(reorder_instructions(instructions, {'app': ['package.json']}, self.installs), instructions)
+
+class LayerCountTest(unittest.TestCase):
+    def test_layer_count(self):
+        container = Container('nodejs', 'node')
+        for instruction in [['ADD', 'app /src/app/'], ['WORKDIR', '/src/app'], ['RUN', 'npm install'], ['ENV', 'PORT 3000'], ['ENV', 'DBNAME BGA']]:
+            container.add_instruction(instruction)
+        container.cmd = 'node app.js'
+        container.add_expose(3000)
+        count = LayerCount(container)
+        self.assertEqual((count.layers, count.volatile), (7, 7))
+        dependencies = {'app': ['package.json']}
+        container.instructions = optimize_instructions(container.instructions, dependencies, {'app': ['npm install']})
+        count = LayerCount(container, dependencies)
+        self.assertEqual((count.layers, count.volatile), (7, 3))
+        self.assertEqual(repr(count), "7 layers, 3 rebuilt when the artifacts change")
@@ -0,0 +1,81 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from mock import patch
+from camp2docker.assembly import Assembly
+from camp2docker.config import CACHE_VERSION
+from camp2docker.lockfile import LOCK_VERSION, load_assembly, lockfile_path, read_lockfile, write_lockfile
+
+class LockfileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, 'config')
+        shutil.copytree(os.path.join('tests', 'fixtures', 'config'), self.config, ignore=shutil.ignore_patterns('.camp2docker.*'))
+        with open(os.path.join('tests', 'fixtures', 'app.yaml')) as f:
+            self.plan = f.read().replace('#name: app', 'name: app')
+        self.planfile = os.path.join(self.directory, 'app.yaml')
+        with open(self.planfile, 'w') as f:
+            f.write(self.plan)
+        self.assembly = Assembly.from_plan(self.planfile, self.config)
+        write_lockfile(self.assembly, self.planfile, self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lockfile_path(self):
+        self.assertEqual(lockfile_path(self.planfile), os.path.join(self.directory, '.camp2docker.app.yaml.lock'))
+        self.assertTrue(os.path.isfile(lockfile_path(self.planfile)))
+
+    def test_read_lockfile(self):
+        assembly = read_lockfile(self.planfile, self.config)
+        self.assertEqual([c.container.name for c in assembly.components], ['nodejs', 'mongodb'])
+        nodejs, mongodb = assembly.components
+        self.assertIs(nodejs.container.links[0], mongodb.container)
+        self.assertEqual(assembly.to_service_dicts, self.assembly.to_service_dicts)
+        self.assertEqual(assembly.to_fig(), self.assembly.to_fig())
+
+    def test_lockfile_is_json(self):
+        with open(lockfile_path(self.planfile)) as f:
+            lock = json.load(f)
+        self.assertEqual(lock['version'], [LOCK_VERSION, CACHE_VERSION])
+        self.assertEqual([c['name'] for c in lock['assembly']['containers']], ['nodejs', 'mongodb'])
+        self.assertEqual(lock['assembly']['containers'][0]['links'], ['mongodb'])
+
+    def test_shared_bases(self):
+        self.assembly.share_base_images()
+        write_lockfile(self.assembly, self.planfile, self.config)
+        assembly = read_lockfile(self.planfile, self.config)
+        self.assertEqual(assembly.shared_bases, self.assembly.shared_bases)
+        self.assertEqual([c.container.base for c in assembly.components], [c.container.base for c in self.assembly.components])
+
+    def test_other_version(self):
+        with patch('camp2docker.lockfile.CACHE_VERSION', CACHE_VERSION + 1):
+            self.assertIsNone(read_lockfile(self.planfile, self.config))
+
+    def test_invalid_lockfile(self):
+        with open(lockfile_path(self.planfile)) as f:
+            lock = json.load(f)
+        del lock['assembly']['containers'][0]['links']
+        for content in ['not json', '[]', json.dumps({'version': [LOCK_VERSION, CACHE_VERSION], 'digests': None}), json.dumps(lock)]:
+            with open(lockfile_path(self.planfile), 'w') as f:
+                f.write(content)
+            self.assertIsNone(read_lockfile(self.planfile, self.config))
+
+    def test_plan_changed(self):
+        with open(self.planfile, 'w') as f:
+            f.write(self.plan.replace('dbname: BGA', 'dbname: other'))
+        self.assertIsNone(read_lockfile(self.planfile, self.config))
+
+    def test_config_changed(self):
+        with open(os.path.join(self.config, 'services', 'more.yaml'), 'w') as f:
+            f.write("-\n  name: redis\n  description: Redis\n  base: redis\n  characteristics: []\n")
+        self.assertIsNone(read_lockfile(self.planfile, self.config))
+
+    def test_load_assembly(self):
+        with patch('camp2docker.lockfile.Assembly.from_plan') as from_plan:
+            self.assertEqual(load_assembly(self.planfile, self.config).to_fig(), self.assembly.to_fig())
+            self.assertFalse(from_plan.called)
+        os.remove(lockfile_path(self.planfile))
+        self.assertEqual(load_assembly(self.planfile, self.config).to_fig(), self.assembly.to_fig())
@@ -0,0 +1,100 @@
+import unittest
+import os
+import shutil
+import tempfile
+from camp2docker.manifest import GenerationManifest, content_digest
+from camp2docker.hashindex import file_digest
+
+class GenerationManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'output')
+        self.source = os.path.join(self.directory, 'dump')
+        os.makedirs(os.path.join(self.source, 'db'))
+        os.mkdir(self.output)
+        self.write(os.path.join(self.source, 'db', 'collection.bson'), 'documents')
+        self.write(os.path.join(self.source, 'db', 'collection.metadata.json'), '{}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, content):
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def generate(self, dockerfile='FROM node\n', components=('nodejs', 'mongodb')):
+        manifest = GenerationManifest.load(self.output)
+        manifest.write_file('fig.yml', 'nodejs:\n  build: nodejs\n')
+        for component in components:
+            manifest.write_file(os.path.join(component, 'Dockerfile'), dockerfile)
+        manifest.copy_tree(self.source, os.path.join('mongodb', 'dump'))
+        return manifest.finish()
+
+    def test_digest(self):
+        self.assertEqual(file_digest(os.path.join(self.source, 'db', 'collection.bson')), content_digest('documents'))
+
+    def test_first_generation(self):
+        report = self.generate()
+        self.assertEqual(len(report.written), 5)
+        self.assertEqual(report.unchanged, [])
+        with open(os.path.join(self.output, 'mongodb', 'dump', 'db', 'collection.bson')) as f:
+            self.assertEqual(f.read(), 'documents')
+
+    def test_unchanged_generation(self):
+        self.generate()
+        dockerfile = os.path.join(self.output, 'nodejs', 'Dockerfile')
+        os.utime(dockerfile, (0, 0))
+        report = self.generate()
+        self.assertEqual(report.written, [])
+        self.assertEqual(len(report.unchanged), 5)
+        self.assertEqual(os.stat(dockerfile).st_mtime, 0)
+
+    def test_changed_generation(self):
+        self.generate()
+        self.write(os.path.join(self.source, 'db', 'collection.bson'), 'new documents')
+        report = self.generate(dockerfile='FROM node:0.10\n')
+        self.assertEqual(sorted(report.written), [os.path.join('mongodb', 'Dockerfile'), os.path.join('mongodb', 'dump', 'db', 'collection.bson'), os.path.join('nodejs', 'Dockerfile')])
+        with open(os.path.join(self.output, 'mongodb', 'dump', 'db', 'collection.bson')) as f:
+            self.assertEqual(f.read(), 'new documents')
+
+    def test_missing_file_rewritten(self):
+        self.generate()
+        os.remove(os.path.join(self.output, 'nodejs', 'Dockerfile'))
+        report = self.generate()
+        self.assertEqual(report.written, [os.path.join('nodejs', 'Dockerfile')])
+
+    def test_removed_files(self):
+        self.generate(components=('nodejs', 'mongodb', 'redis'))
+        os.remove(os.path.join(self.source, 'db', 'collection.metadata.json'))
+        report = self.generate()
+        self.assertEqual(report.removed, [os.path.join('mongodb', 'dump', 'db', 'collection.metadata.json'), os.path.join('redis', 'Dockerfile')])
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'redis')))
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'mongodb', 'dump', 'db', 'collection.metadata.json')))
+
+    def test_empty_directories_removed(self):
+        self.generate()
+        shutil.rmtree(os.path.join(self.source, 'db'))
+        self.generate()
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'mongodb', 'dump')))
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'mongodb', 'Dockerfile')))
+
+    def test_unrecorded_files_kept(self):
+        self.generate(components=('nodejs', 'mongodb', 'redis'))
+        self.write(os.path.join(self.output, 'redis', 'redis.conf'), 'maxmemory 1gb')
+        self.write(os.path.join(self.output, 'notes'), 'notes')
+        report = self.generate()
+        self.assertEqual(report.removed, [os.path.join('redis', 'Dockerfile')])
+        self.assertTrue(os.path.isfile(os.path.join(self.output, 'redis', 'redis.conf')))
+        self.assertTrue(os.path.isfile(os.path.join(self.output, 'notes')))
+
+    def test_non_utf8_file_name(self):
+        name = 'caf\xe9.bson'
+        self.write(os.path.join(self.source, 'db', name), 'documents')
+        report = self.generate()
+        self.assertIn(os.path.join('mongodb', 'dump', 'db', name), report.written)
+        report = self.generate()
+        self.assertEqual(report.written, [])
+        os.remove(os.path.join(self.source, 'db', name))
+        report = self.generate()
+        self.assertEqual(report.removed, [os.path.join('mongodb', 'dump', 'db', name)])
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'mongodb', 'dump', 'db', name)))
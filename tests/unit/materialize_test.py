@@ -0,0 +1,81 @@
+import unittest
+import errno
+import os
+import shutil
+import tempfile
+from mock import patch
+from camp2docker.materialize import Materializer, MaterializationError
+
+class MaterializerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'app.js')
+        self.target = os.path.join(self.directory, 'context.js')
+        with open(self.source, 'w') as f:
+            f.write("console.log('camp2docker');\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, filename):
+        with open(filename) as f:
+            return f.read()
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(MaterializationError):
+            Materializer('teleport')
+
+    def test_copy(self):
+        Materializer('copy').materialize(self.source, self.target)
+        self.assertEqual(self.read(self.target), self.read(self.source))
+        self.assertNotEqual(os.stat(self.target).st_ino, os.stat(self.source).st_ino)
+
+    def test_hardlink(self):
+        Materializer('hardlink').materialize(self.source, self.target)
+        self.assertEqual(os.stat(self.target).st_ino, os.stat(self.source).st_ino)
+
+    def test_symlink_followed(self):
+        os.mkdir(os.path.join(self.directory, 'artifact'))
+        link = os.path.join(self.directory, 'artifact', 'link.js')
+        os.symlink(os.path.join('..', 'app.js'), link)
+        for strategy in ('hardlink', 'copy', 'auto'):
+            Materializer(strategy).materialize(link, self.target)
+            self.assertFalse(os.path.islink(self.target))
+            self.assertEqual(self.read(self.target), self.read(self.source))
+
+    def test_replace_hardlink(self):
+        """Materializing again replaces the target instead of writing through a hardlink"""
+        with open(self.target, 'w') as f:
+            f.write('old')
+        os.link(self.target, os.path.join(self.directory, 'other.js'))
+        Materializer('copy').materialize(self.source, self.target)
+        self.assertEqual(self.read(os.path.join(self.directory, 'other.js')), 'old')
+        self.assertEqual(self.read(self.target), self.read(self.source))
+
+    def test_auto(self):
+        materializer = Materializer()
+        materializer.materialize(self.source, self.target)
+        self.assertEqual(self.read(self.target), self.read(self.source))
+        self.assertEqual(len(materializer._filesystems_strategies), 1)
+
+    @patch('camp2docker.materialize.os.link', side_effect=OSError(18, 'Invalid cross-device link'))
+    @patch('camp2docker.materialize.fcntl', None)
+    def test_auto_fallback_copy(self, link):
+        materializer = Materializer()
+        materializer.materialize(self.source, self.target)
+        self.assertEqual(self.read(self.target), self.read(self.source))
+        self.assertEqual(materializer._filesystems_strategies.values(), ['copy'])
+
+    @patch('camp2docker.materialize.fcntl', None)
+    def test_auto_file_fallback(self):
+        materializer = Materializer()
+        materializer.materialize(self.source, self.target)
+        self.assertEqual(materializer._filesystems_strategies.values(), ['hardlink'])
+        with patch('camp2docker.materialize.os.link', side_effect=OSError(errno.EMLINK, 'Too many links')):
+            materializer.materialize(self.source, self.target)
+        self.assertEqual(self.read(self.target), self.read(self.source))
+        self.assertNotEqual(os.stat(self.target).st_ino, os.stat(self.source).st_ino)
+        self.assertEqual(materializer._filesystems_strategies.values(), ['hardlink'])
+
+    def test_map(self):
+        self.assertEqual(Materializer(threads=4).map(lambda x: x * 2, range(20)), range(0, 40, 2))
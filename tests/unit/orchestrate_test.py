@@ -0,0 +1,118 @@
+import unittest
+import threading
+from mock import Mock
+from camp2docker.orchestrate import CycleException, Orchestrator, dependency_waves
+from camp2docker.output import Container
+
+class StubService(object):
+    def __init__(self, name, project):
+        self.name = name
+        self.project = project
+
+    def _record(self, operation):
+        with self.project.lock:
+            self.project.calls.append((operation, self.name))
+            self.project.running[operation] = self.project.running.get(operation, 0) + 1
+            self.project.concurrency = max(self.project.concurrency, self.project.running[operation])
+        # give the other services of the wave the time to start
+        self.project.started.wait(0.05)
+        with self.project.lock:
+            self.project.running[operation] -= 1
+
+    def recreate_containers(self):
+        self._record('up')
+
+    def start(self):
+        self._record('start')
+
+    def stop(self):
+        self._record('stop')
+
+    def remove_stopped(self):
+        self._record('rm')
+
+class StubProject(object):
+    """
+        Records the operations the orchestrator runs on the services, and how many run at once
+    """
+    def __init__(self):
+        self.calls = []
+        self.running = {}
+        self.concurrency = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+
+    def get_service(self, name):
+        return StubService(name, self)
+
+def component(name, *links):
+    container = Container(name, 'base')
+    container.links.extend(link.container for link in links)
+    return Mock(container=container)
+
+class DependencyWavesTest(unittest.TestCase):
+    def test_waves(self):
+        mongodb = component('mongodb')
+        redis = component('redis')
+        nodejs = component('nodejs', mongodb, redis)
+        proxy = component('proxy', nodejs)
+        worker = component('worker', redis)
+        self.assertEqual(dependency_waves([proxy, nodejs, worker, mongodb, redis]), [[mongodb, redis], [nodejs, worker], [proxy]])
+
+    def test_cycle(self):
+        first = component('first')
+        second = component('second', first)
+        first.container.links.append(second.container)
+        with self.assertRaises(CycleException):
+            dependency_waves([first, second, component('other')])
+
+    def test_self_link(self):
+        first = component('first')
+        first.container.links.append(first.container)
+        with self.assertRaises(CycleException):
+            dependency_waves([first])
+
+class OrchestratorTest(unittest.TestCase):
+    def setUp(self):
+        self.mongodb = component('mongodb')
+        self.redis = component('redis')
+        self.nodejs = component('nodejs', self.mongodb, self.redis)
+        self.project = StubProject()
+        self.assembly = Mock(components=[self.nodejs, self.mongodb, self.redis], shared_bases=[])
+        self.assembly.to_fig_project.return_value = self.project
+        self.client = Mock()
+        self.puller = Mock()
+        self.puller.pull_all.return_value = {'base': 'present'}
+        self.orchestrator = Orchestrator(self.assembly, self.client, 4, self.puller)
+
+    def test_up(self):
+        self.orchestrator.up()
+        self.puller.pull_all.assert_called_once_with(['base'])
+        self.assembly.build_shared_bases.assert_called_once_with(self.client)
+        self.assertEqual(sorted(self.project.calls[:2]), [('up', 'mongodb'), ('up', 'redis')])
+        self.assertEqual(self.project.calls[2], ('up', 'nodejs'))
+        self.assertEqual(self.project.concurrency, 2)
+
+    def test_stop_reverse(self):
+        self.orchestrator.stop()
+        self.assertEqual(self.project.calls[0], ('stop', 'nodejs'))
+        self.orchestrator.rm()
+        self.assertEqual(self.project.calls[3], ('rm', 'nodejs'))
+
+    def test_sequential(self):
+        Orchestrator(self.assembly, self.client, 1, self.puller).start()
+        self.assertEqual(self.project.calls, [('start', 'mongodb'), ('start', 'redis'), ('start', 'nodejs')])
+        self.assertEqual(self.project.concurrency, 1)
+
+    def test_build(self):
+        self.orchestrator.build('plans')
+        self.assembly.build.assert_called_once_with(self.client, 'plans', None, False, 4, build_keys=None)
+
+    def test_up_after_build(self):
+        self.orchestrator.build('plans')
+        self.orchestrator.up()
+        self.assertEqual(self.puller.pull_all.call_count, 1)
+        self.assertFalse(self.assembly.build_shared_bases.called)
+        self.orchestrator.up()
+        self.assertEqual(self.puller.pull_all.call_count, 2)
+        self.assembly.build_shared_bases.assert_called_once_with(self.client)
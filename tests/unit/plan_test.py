@@ -1,6 +1,6 @@
 import unittest
 from yaml import load
-from camp2docker.plan import Plan, ServiceSpecification, ArtifactSpecification, RequirementSpecification, CharacteristicSpecification, ArtifactSpecificationSet, ServiceSpecificationSet
+from camp2docker.plan import Plan, SpecificationException, ServiceReferenceException, ServiceSpecification, ArtifactSpecification, RequirementSpecification, CharacteristicSpecification, ArtifactSpecificationSet, ServiceSpecificationSet
 
 def setUpModule():
     global plan
@@ -19,6 +19,12 @@ class PlanTest(unittest.TestCase):
         self.assertEqual(len(self.plan.artifacts), 2)
         self.assertEqual(len(self.plan.services), 1)
 
+    def test_from_yaml(self):
+        with open('tests/fixtures/app.yaml') as f:
+            content = f.read()
+        self.assertEqual(Plan.from_yaml(content, 'posted').name, 'posted')
+        self.assertEqual(Plan.from_yaml(content.replace('#name: app', 'name: app'), 'posted').name, 'app')
+
     def test_artifacts_or_empty(self):
         self.assertEqual(self.plan.artifacts_or_empty, self.plan.artifacts)
 
@@ -35,6 +41,19 @@ class PlanTest(unittest.TestCase):
         self.assertEqual(len(plan_without_services.services_or_empty), 0)
         self.assertIsInstance(plan_without_services.services_or_empty, ServiceSpecificationSet)
 
+    def test_find_service_by_id(self):
+        self.assertIs(self.plan.find_service_by_id('Nodejs.runtime'), self.plan.services[0])
+        self.assertIs(self.plan.find_service_by_id('mongo'), self.plan.artifacts[1].requirements[0].fulfillment)
+
+    def test_find_non_existing_service_by_id(self):
+        with self.assertRaises(ServiceReferenceException):
+            self.plan.find_service_by_id('Restaurant')
+
+    def test_duplicate_service_id(self):
+        services = plan["services"] + [{'id': 'mongo'}]
+        with self.assertRaises(SpecificationException):
+            Plan(**dict(plan, services=services))
+
 class ServiceSpecificationTest(unittest.TestCase):
     def runTest(self):
         service = ServiceSpecification(**plan["services"][0])
@@ -88,6 +107,17 @@ class RequirementSpecificationTest(unittest.TestCase):
         expected = p.artifacts[1].requirements[0].fulfillment
         self.assertIs(actual, expected)
 
+    def test_service_unknown_id(self):
+        p = Plan(**plan)
+        requirement = RequirementSpecification(requirement_type='ConnectTo', fulfillment='id:Restaurant')
+        with self.assertRaises(ServiceReferenceException):
+            requirement.service(p)
+
+    def test_service_no_fulfillment(self):
+        p = Plan(**plan)
+        requirement = RequirementSpecification(requirement_type='ConnectTo')
+        self.assertIsNone(requirement.service(p))
+
 class Characteristic_specification(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,48 @@
+import unittest
+from mock import Mock
+from fig.packages.docker.client import Client
+from camp2docker.pull import PullException, Puller, base_images
+from fake_daemon import FakeDaemon
+
+class BaseImagesTest(unittest.TestCase):
+    def test_base_images(self):
+        shared = Mock(base='node')
+        shared.name = 'camp2docker_base_0123456789ab'
+        components = [Mock(container=Mock(base=base)) for base in ('camp2docker_base_0123456789ab', 'dockerfile/mongodb', 'redis:2.8', 'dockerfile/mongodb')]
+        assembly = Mock(components=components, shared_bases=[shared])
+        self.assertEqual(base_images(assembly), ['node', 'dockerfile/mongodb', 'redis:2.8'])
+
+class PullerTest(unittest.TestCase):
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.client = Client(self.daemon.url)
+        self.sleeps = []
+        self.puller = Puller(self.client, workers=2, retries=3, backoff=0.5, sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.stop()
+
+    def test_pull_all(self):
+        self.daemon.images['node'] = {'Id': 'node0000'}
+        statuses = self.puller.pull_all(['node', 'dockerfile/mongodb', 'redis:2.8'])
+        self.assertEqual(statuses, {'node': 'present', 'dockerfile/mongodb': 'pulled', 'redis:2.8': 'pulled'})
+        self.assertEqual(sorted(self.daemon.pulls), ['dockerfile/mongodb:latest', 'redis:2.8'])
+
+    def test_retry_with_backoff(self):
+        self.daemon.pull_failures['redis:2.8'] = 2
+        self.assertEqual(self.puller.pull('redis:2.8'), 'pulled')
+        self.assertEqual(self.daemon.pulls, ['redis:2.8'] * 3)
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+
+    def test_retry_three_times(self):
+        self.daemon.pull_failures['redis:2.8'] = 3
+        self.assertEqual(self.puller.pull('redis:2.8'), 'pulled')
+        self.assertEqual(self.daemon.pulls, ['redis:2.8'] * 4)
+        self.assertEqual(self.sleeps, [0.5, 1.0, 2.0])
+
+    def test_give_up(self):
+        self.daemon.pull_failures['redis:2.8'] = 4
+        with self.assertRaises(PullException):
+            self.puller.pull('redis:2.8')
+        self.assertEqual(len(self.daemon.pulls), 4)
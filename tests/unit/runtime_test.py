@@ -0,0 +1,56 @@
+import unittest
+import gc
+from mock import Mock, patch
+from camp2docker.assembly import Assembly
+from camp2docker.runtime import Runtime
+
+class RuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.client = Mock()
+        self.runtime = Runtime(self.client, workers=2)
+        self.first = Mock(revision=1)
+        self.second = Mock(revision=1)
+
+    @patch('camp2docker.runtime.Orchestrator')
+    def test_orchestrator_kept_until_changed(self, Orchestrator):
+        Orchestrator.side_effect = lambda assembly, client, workers: Mock()
+        orchestrator = self.runtime.orchestrator(self.first)
+        Orchestrator.assert_called_once_with(self.first, self.client, 2)
+        self.assertIs(self.runtime.orchestrator(self.first), orchestrator)
+        self.assertIsNot(self.runtime.orchestrator(self.second), orchestrator)
+        self.first.revision = 2
+        self.assertIsNot(self.runtime.orchestrator(self.first), orchestrator)
+
+    def test_assembly_not_kept_alive(self):
+        assembly = Assembly(Mock())
+        orchestrator = self.runtime.orchestrator(assembly)
+        self.assertIs(orchestrator.assembly, assembly)
+        self.assertEqual(len(self.runtime._orchestrators), 1)
+        del assembly
+        gc.collect()
+        self.assertEqual(len(self.runtime._orchestrators), 0)
+        with self.assertRaises(ReferenceError):
+            orchestrator.assembly
+
+    @patch('camp2docker.runtime.Orchestrator')
+    def test_apply(self, Orchestrator):
+        orchestrators = {}
+        Orchestrator.side_effect = lambda assembly, client, workers: orchestrators.setdefault(assembly, Mock())
+        self.runtime.apply(['stop', 'rm'], [self.first, self.second])
+        for assembly in (self.first, self.second):
+            orchestrators[assembly].stop.assert_called_once_with()
+            orchestrators[assembly].rm.assert_called_once_with()
+        self.assertEqual(Orchestrator.call_count, 2)
+
+    def test_close(self):
+        with self.runtime:
+            pass
+        self.client.close.assert_called_once_with()
+
+    @patch('camp2docker.runtime.Deployment')
+    @patch('camp2docker.runtime.Orchestrator')
+    def test_deploy(self, Orchestrator, Deployment):
+        self.assertIs(self.runtime.deploy(self.first, 'plans', dry_run=True), Deployment.return_value.plan.return_value)
+        self.assertFalse(Deployment.return_value.apply.called)
+        self.assertIs(self.runtime.deploy(self.first, 'plans'), Deployment.return_value.apply.return_value)
+        Deployment.assert_called_with(Orchestrator.return_value, 'plans', None, None)
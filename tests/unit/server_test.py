@@ -0,0 +1,195 @@
+import unittest
+import httplib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from StringIO import StringIO
+from mock import patch
+from camp2docker.server import ConversionServer, Converter, convert
+
+def sleep_convert(plan_yaml, options):
+    time.sleep(1)
+    return convert(plan_yaml, options)
+
+class ConverterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, 'config')
+        shutil.copytree(os.path.join('tests', 'fixtures', 'config'), self.config, ignore=shutil.ignore_patterns('.camp2docker.*'))
+        with open(os.path.join('tests', 'fixtures', 'app.yaml')) as f:
+            self.plan = f.read()
+        self.options = {'name': 'app', 'directory': self.directory, 'optimize_layers': False, 'shared_bases': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def change_base(self, base):
+        services = os.path.join(self.config, 'services', 'services.yaml')
+        with open(services) as f:
+            content = f.read()
+        with open(services, 'w') as f:
+            f.write(content.replace('base: node', 'base: ' + base))
+
+    def converter(self, *args, **kwargs):
+        converter = Converter(self.config, *args, **kwargs)
+        self.addCleanup(converter.close)
+        return converter
+
+    def test_reload_when_changed(self):
+        converter = self.converter(workers=1, interval=3600)
+        converter.refresh()
+        self.assertEqual(converter.reloads, 1)
+        self.change_base('iojs')
+        converter.refresh()
+        self.assertEqual(converter.reloads, 2)
+        result, status = converter.run(convert, self.plan, self.options)
+        self.assertIn('FROM iojs', json.loads(result)['dockerfiles']['nodejs'])
+
+    def test_reload_checked_every_interval(self):
+        converter = self.converter(workers=1, interval=0.05)
+        self.change_base('iojs')
+        deadline = time.time() + 5
+        while converter.reloads < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(converter.reloads, 2)
+
+    def test_workers_reload(self):
+        converter = self.converter(workers=2, interval=3600)
+        self.change_base('iojs')
+        converter.refresh()
+        for i in range(4):
+            result, status = converter.run(convert, self.plan, self.options)
+            self.assertIn('FROM iojs', json.loads(result)['dockerfiles']['nodejs'])
+
+    def test_invalid_config_kept(self):
+        converter = self.converter(workers=1, interval=3600)
+        with open(os.path.join(self.config, 'services', 'more.yaml'), 'w') as f:
+            f.write("services: [")
+        converter.refresh()
+        self.assertEqual(converter.reloads, 1)
+        self.assertEqual(converter.run(convert, self.plan, self.options)[1], 200)
+
+    def test_timeout(self):
+        converter = self.converter(workers=2, interval=3600, timeout=0.1)
+        self.assertEqual(converter.run(sleep_convert, self.plan, self.options), ("Conversion timed out", 503))
+
+    def test_error(self):
+        converter = self.converter(workers=1)
+        result, status = converter.run(convert, self.plan.replace('characteristic_type: Nodejs', 'characteristic_type: Python'), self.options)
+        self.assertEqual(status, 400)
+        self.assertTrue(result.startswith('NoServiceException: '))
+        self.assertNotIn('Traceback', result)
+
+    def test_internal_error(self):
+        converter = self.converter(workers=1)
+        with patch('camp2docker.server.PlanProcessor', side_effect=KeyError('internal')):
+            self.assertEqual(converter.run(convert, self.plan, self.options), ("Internal error", 500))
+
+class ConversionServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.converter = Converter(os.path.join('tests', 'fixtures', 'config'), workers=2)
+        cls.server = ConversionServer(('127.0.0.1', 0), cls.converter, cls.directory)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        with open(os.path.join('tests', 'fixtures', 'app.yaml')) as f:
+            cls.plan = f.read()
+        with open(os.path.join(cls.directory, 'app.js'), 'w') as f:
+            f.write("console.log('camp2docker');\n")
+        os.mkdir(os.path.join(cls.directory, 'dump'))
+        with open(os.path.join(cls.directory, 'dump', 'collection.bson'), 'w') as f:
+            f.write('documents')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.converter.close()
+        shutil.rmtree(cls.directory)
+
+    def post(self, path, body):
+        connection = httplib.HTTPConnection('127.0.0.1', self.server.server_address[1])
+        try:
+            connection.request('POST', path, body)
+            response = connection.getresponse()
+            return response.status, response.getheader('Content-Type'), response.read()
+        finally:
+            connection.close()
+
+    def test_assembly(self):
+        status, content_type, body = self.post('/assembly?name=app', self.plan)
+        self.assertEqual((status, content_type), (200, 'application/json'))
+        result = json.loads(body)
+        self.assertEqual(result['name'], 'app')
+        self.assertEqual(sorted(result['dockerfiles']), ['mongodb', 'nodejs'])
+        self.assertIn('links:\n    - mongodb', result['fig'])
+        self.assertEqual(result['shared_bases'], {})
+
+    def test_concurrent_requests(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.post('/assembly', self.plan))) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([status for status, content_type, body in results], [200] * 4)
+        self.assertEqual(len(set(body for status, content_type, body in results)), 1)
+
+    def test_archive(self):
+        status, content_type, body = self.post('/archive?name=app', self.plan)
+        self.assertEqual((status, content_type), (200, 'application/x-gzip'))
+        names = tarfile.open(fileobj=StringIO(body)).getnames()
+        self.assertIn('app/fig.yml', names)
+        self.assertIn('app/nodejs/Dockerfile', names)
+        self.assertIn('app/nodejs/app.js', names)
+        self.assertIn('app/mongodb/dump/collection.bson', names)
+        self.assertNotIn('app/.camp2docker.manifest', names)
+
+    def test_invalid_plan(self):
+        for plan in ('services: [', 'services: []'):
+            status, content_type, body = self.post('/assembly', plan)
+            self.assertEqual(status, 400)
+            self.assertNotIn('Traceback', json.loads(body)['error'])
+
+    def test_directory_outside_root(self):
+        for directory in ('/etc', '..', 'dump/../..'):
+            status, content_type, body = self.post('/archive?directory=' + directory, self.plan)
+            self.assertEqual(status, 400)
+            self.assertIn('not under the served root', json.loads(body)['error'])
+
+    def test_artifact_outside_directory(self):
+        for href in ('/etc/passwd', '../passwd', 'dump/../../passwd'):
+            status, content_type, body = self.post('/archive', self.plan.replace('href: app.js', 'href: ' + href))
+            self.assertEqual(status, 400)
+            self.assertIn('not under the plan directory', json.loads(body)['error'])
+
+    def test_artifact_linking_outside_directory(self):
+        os.symlink('/etc/passwd', os.path.join(self.directory, 'dump', 'passwd'))
+        try:
+            status, content_type, body = self.post('/archive', self.plan)
+        finally:
+            os.remove(os.path.join(self.directory, 'dump', 'passwd'))
+        self.assertEqual(status, 400)
+        self.assertIn('dump/passwd', json.loads(body)['error'])
+
+    def test_content_length(self):
+        connection = httplib.HTTPConnection('127.0.0.1', self.server.server_address[1])
+        try:
+            for length, status in ((None, 411), ('plan', 400)):
+                connection.putrequest('POST', '/assembly')
+                if length is not None:
+                    connection.putheader('Content-Length', length)
+                connection.endheaders()
+                self.assertEqual(connection.getresponse().status, status)
+                connection.close()
+        finally:
+            connection.close()
+
+    def test_unknown_route(self):
+        self.assertEqual(self.post('/plans', self.plan)[0], 404)
@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+from mock import patch
+from camp2docker.manifest import GenerationManifest, content_digest
+from camp2docker.store import ArtifactStore
+
+class ArtifactStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'output')
+        self.source = os.path.join(self.directory, 'app.js')
+        os.mkdir(self.output)
+        self.write(self.source, "console.log('camp2docker');\n")
+        self.store = ArtifactStore(self.output)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, content):
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def generate(self, plan, components=('nodejs', 'worker')):
+        directory = os.path.join(self.output, plan)
+        os.path.isdir(directory) or os.mkdir(directory)
+        manifest = GenerationManifest.load(directory, store=self.store)
+        for component in components:
+            manifest.copy_file(self.source, os.path.join(component, 'app.js'))
+        return manifest.finish()
+
+    def test_stored_once(self):
+        self.generate('first')
+        self.generate('second')
+        digest = content_digest("console.log('camp2docker');\n")
+        stored = os.stat(self.store.object_path(digest))
+        self.assertEqual(stored.st_nlink, 5)
+        for plan in ('first', 'second'):
+            for component in ('nodejs', 'worker'):
+                self.assertEqual(os.stat(os.path.join(self.output, plan, component, 'app.js')).st_ino, stored.st_ino)
+        self.assertNotEqual(os.stat(self.source).st_ino, stored.st_ino)
+
+    def test_collect_garbage(self):
+        self.generate('first')
+        self.generate('second')
+        old_digest = content_digest("console.log('camp2docker');\n")
+        self.write(self.source, "console.log('camp2docker v2');\n")
+        self.generate('first')
+        self.assertEqual(self.store.collect_garbage(), [])
+        self.generate('second')
+        self.assertEqual(self.store.collect_garbage(), [old_digest])
+        self.assertFalse(os.path.exists(self.store.object_path(old_digest)))
+        with open(os.path.join(self.output, 'second', 'worker', 'app.js')) as f:
+            self.assertEqual(f.read(), "console.log('camp2docker v2');\n")
+
+    def test_collect_garbage_empty_store(self):
+        self.assertEqual(self.store.collect_garbage(), [])
+
+    def test_collect_garbage_skips_puts(self):
+        self.generate('first')
+        old_digest = content_digest("console.log('camp2docker');\n")
+        shutil.rmtree(os.path.join(self.output, 'first'))
+        prefix_directory = os.path.dirname(self.store.object_path(old_digest))
+        self.write(os.path.join(prefix_directory, '.tmpput'), 'being put')
+        self.write(os.path.join(self.store.directory, 'README'), 'stray file')
+        with patch('camp2docker.store.time.time', return_value=0):
+            self.assertEqual(self.store.collect_garbage(), [])
+        self.assertEqual(self.store.collect_garbage(), [old_digest])
+        self.assertTrue(os.path.isfile(os.path.join(prefix_directory, '.tmpput')))
@@ -1,6 +1,11 @@
 import unittest
+import os
+import shutil
+import tempfile
+import yaml
+from mock import patch
 
-from camp2docker.utils import mustach_dict
+from camp2docker.utils import mustach_dict, load_yaml, load_yaml_files, write_pickle, write_json
 
 class TestMustachDict(unittest.TestCase):
     def test_empty(self):
@@ -29,3 +34,52 @@ class TestMustachDict(unittest.TestCase):
         value = {'a.b':1, 'a.b.c':2, 'a.b.c.d': 3}
         with self.assertRaises(Exception):
             print mustach_dict(value)
+
+class TestLoadYaml(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.filenames = []
+        for i in range(10):
+            filename = os.path.join(cls.directory, '{0}.yaml'.format(i))
+            with open(filename, 'w') as f:
+                f.write("- name: service{0}\n  base: base{0}\n".format(i))
+            cls.filenames.append(filename)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_load_yaml(self):
+        self.assertEqual(load_yaml("a: [1, b]"), {'a': [1, 'b']})
+
+    def test_load_yaml_pure_python(self):
+        self.assertEqual(load_yaml("a: [1, b]", yaml.SafeLoader), {'a': [1, 'b']})
+
+    def test_load_yaml_str(self):
+        self.assertIs(type(load_yaml("- ADD")[0]), str)
+
+    def test_load_yaml_files(self):
+        actual = load_yaml_files(self.filenames)
+        expected = [[{'name': 'service{0}'.format(i), 'base': 'base{0}'.format(i)}] for i in range(10)]
+        self.assertEqual(actual, expected)
+
+    def test_load_yaml_files_parallel(self):
+        self.assertEqual(load_yaml_files(self.filenames, processes=3, threshold=1), load_yaml_files(self.filenames))
+
+class TestWrite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_pickle_unpicklable(self):
+        write_pickle(self.filename, lambda: None)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @patch('camp2docker.utils.json.dump', side_effect=KeyboardInterrupt)
+    def test_write_json_interrupted(self, dump):
+        self.assertRaises(KeyboardInterrupt, write_json, self.filename, [])
+        self.assertEqual(os.listdir(self.directory), [])